@@ -0,0 +1,467 @@
+#!/usr/bin/python
+
+# benchmark.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Benchmarks
+# Times the stages of a rename job on synthetic sequences: ingestion, text
+# substitution, renumbering, preview, conflict detection, dry run and
+# rename. Tasks for the in-memory stages are generated without touching the
+# disk, while a smaller tree of real files is written to a temporary
+# directory (tmpfs if available) for the others. The Qt parts run on the
+# offscreen platform, and are skipped if Qt or the UI template can't be
+# imported.
+#
+# Results are written as JSON. When compared with the results of another
+# commit, any stage slower than its threshold allows is reported, and the
+# exit code is 1.
+#
+# Example:
+#   python benchmarks/benchmark.py --scale medium --output before.json
+#   python benchmarks/benchmark.py --scale medium --baseline before.json
+
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(bench_dir), 'src')
+sys.path.insert(0, src_dir)
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+# Import custom modules
+import conflicts
+import dircache
+import frameset
+import ingest
+import rename
+import renamejob
+import taskregistry
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Problem sizes. 'tasks' and 'frames' are the number of in-memory sequences
+# and the length of the longest one, while 'disk_sequences' and
+# 'disk_frames' describe the tree of files written to disk.
+SCALES = {
+	'small': dict(tasks=1000, frames=10000, disk_sequences=20, disk_frames=100),
+	'medium': dict(tasks=10000, frames=100000, disk_sequences=200, disk_frames=250),
+	'large': dict(tasks=100000, frames=1000000, disk_sequences=1000, disk_frames=1000),
+}
+
+# Number of sequences written to each directory
+sequences_per_dir = 10
+
+# Default file of regression thresholds
+thresholds_file = os.path.join(bench_dir, 'thresholds.json')
+
+# Rename options used for every stage, as returned by get_rename_options()
+OPTIONS = dict(
+	find_str=r'_v(\d+)',
+	replace_str=r'_v\1_bench',
+	ignore_case=False,
+	regex=True,
+	start=1001,
+	step=1,
+	padding=None,
+	preserve=False,
+	autopad=False,
+	change_ext=False,
+	ext_to_change="",
+)
+
+# ----------------------------------------------------------------------------
+# Synthetic data
+# ----------------------------------------------------------------------------
+
+def synthetic_frames(rng, length, sparse):
+	"""Return a frame set of the given length, starting at frame 1001.
+
+	Sparse frame sets have frames missing at random, so they contain many
+	runs.
+	"""
+	if not sparse:
+		return frameset.FrameSet([(1001, 1000+length, 1)])
+
+	runs = []
+	start = 1001
+	remaining = length
+	while remaining > 0:
+		count = min(remaining, rng.randint(1, 20))
+		step = rng.choice((1, 1, 2))
+		runs.append((start, start + (count-1)*step, step))
+		start += count*step + rng.randint(1, 5)
+		remaining -= count
+
+	return frameset.FrameSet(runs)
+
+
+def synthetic_tasks(count, max_frames, seed=0):
+	"""Return a TaskRegistry of in-memory sequences.
+
+	Sequence lengths are spread logarithmically from 1 frame up to
+	max_frames, and every other sequence is sparse.
+	"""
+	rng = random.Random(seed)
+	tasks = taskregistry.TaskRegistry()
+
+	lengths = [1]
+	while lengths[-1]*10 <= max_frames:
+		lengths.append(lengths[-1]*10)
+
+	for i in range(count):
+		frames = synthetic_frames(rng, lengths[i % len(lengths)], sparse=i % 2)
+		path = '/bench/shot%04d' % (i // sequences_per_dir)
+		prefix = 'plate_%06d_v%03d.' % (i, rng.randint(1, 20))
+		tasks.add(path, prefix, frames.format(4), '.exr', len(frames))
+
+	return tasks
+
+
+def write_tree(root, sequences, frames, seed=0):
+	"""Write a tree of empty files for the given number of sequences.
+
+	Return the number of files written.
+	"""
+	rng = random.Random(seed)
+	written = 0
+
+	for i in range(sequences):
+		dirpath = os.path.join(root, 'shot%04d' % (i // sequences_per_dir))
+		if not os.path.isdir(dirpath):
+			os.makedirs(dirpath)
+
+		prefix = 'plate_%06d_v001.' % i
+		for frame in synthetic_frames(rng, frames, sparse=i % 2):
+			open(os.path.join(dirpath, '%s%04d.exr' % (prefix, frame)), 'w').close()
+			written += 1
+
+	return written
+
+# ----------------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------------
+
+def timed(func, repeats=1):
+	"""Return the shortest time in seconds taken to call func."""
+
+	best = None
+	for i in range(repeats):
+		start = time.perf_counter()
+		func()
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+
+	return best
+
+
+def preview(tasks, conflict_index):
+	"""Work out the rename operation for every task and check for conflicts,
+	as SequenceRenameApp.update_tasks() does for each keystroke.
+	"""
+	items = list(tasks)
+	renamed_prefixes = rename.replace_text_many(
+		[item['prefix'] for item in items],
+		OPTIONS['find_str'], OPTIONS['replace_str'],
+		OPTIONS['ignore_case'], OPTIONS['regex'])
+
+	for item, renamed_prefix in zip(items, renamed_prefixes):
+		rename.plan_task(item, renamed_prefix, OPTIONS)
+		conflict_index.update(item['id'], item['path'], item['after'])
+
+	return conflict_index.conflicting_ids()
+
+
+def bench_memory(args, metrics, info):
+	"""Time the stages which don't touch the disk."""
+
+	tasks = synthetic_tasks(args.tasks, args.frames)
+	prefixes = [item['prefix'] for item in tasks]
+	info['tasks'] = len(tasks)
+	info['task_frames'] = sum(item['count'] for item in tasks)
+
+	metrics['replace_text'] = timed(lambda: rename.replace_text_many(
+		prefixes, OPTIONS['find_str'], OPTIONS['replace_str']), args.repeats)
+
+	rng = random.Random(1)
+	dense = synthetic_frames(rng, args.frames, sparse=False)
+	sparse = synthetic_frames(rng, args.frames, sparse=True)
+	sparse_str = sparse.format(4)
+	info['sparse_runs'] = len(sparse.runs)
+
+	metrics['renumber_dense'] = timed(lambda: rename.renumber(dense, 1, 2, 4, False, False), args.repeats)
+	metrics['renumber_sparse'] = timed(lambda: rename.renumber(sparse, 1, 2, 4, False, False), args.repeats)
+	metrics['parse_sparse'] = timed(lambda: frameset.parse(sparse_str), args.repeats)
+
+	metrics['preview'] = timed(lambda: preview(tasks, conflicts.ConflictIndex()), args.repeats)
+
+	# Conflict detection from scratch, then for a single changed task
+	def full_check():
+		conflict_index = conflicts.ConflictIndex()
+		for item in tasks:
+			conflict_index.update(item['id'], item['path'], item['after'])
+		return conflict_index
+
+	metrics['conflicts_full'] = timed(full_check, args.repeats)
+
+	conflict_index = full_check()
+	item = next(iter(tasks))
+	metrics['conflicts_incremental'] = timed(lambda: (
+		conflict_index.update(item['id'], item['path'], item['after']),
+		conflict_index.conflicting_ids()), args.repeats)
+
+	return tasks
+
+
+def bench_disk(args, root, metrics, info):
+	"""Time the stages which read or rename files."""
+
+	info['files'] = write_tree(root, args.disk_sequences, args.disk_frames)
+
+	def scan():
+		return [seq for batch in ingest.walk([root], None) for seq in batch]
+
+	dircache.invalidate()
+	metrics['ingest_cold'] = timed(scan)
+	metrics['ingest_warm'] = timed(scan, args.repeats)
+
+	tasks = taskregistry.TaskRegistry()
+	for seq in scan():
+		tasks.add(*seq)
+	preview(tasks, conflicts.ConflictIndex())
+	items = [item for item in tasks if item['status'] == 'Ready']
+	info['sequences'] = len(items)
+
+	def run_job(dry_run):
+		job = renamejob.RenameJob(items, dry_run=dry_run, workers=args.jobs)
+		job.run()
+		return job
+
+	dircache.invalidate()
+	metrics['dry_run'] = timed(lambda: run_job(True))
+	metrics['rename'] = timed(lambda: run_job(False))
+
+	info['dry_run_files_per_s'] = info['files'] / max(metrics['dry_run'], 1e-9)
+	info['rename_files_per_s'] = info['files'] / max(metrics['rename'], 1e-9)
+
+
+def bench_qt(args, tasks, metrics, info, skipped):
+	"""Time the Qt parts: the task model, and the full preview update in
+	the application, on the offscreen platform.
+	"""
+	try:
+		from Qt import QtCore, QtWidgets
+		import taskmodel
+	except ImportError as e:
+		skipped['qt'] = str(e)
+		return
+
+	app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+	model = taskmodel.TaskModel(tasks)
+	metrics['model_reset'] = timed(model.refresh)
+
+	# Change the status of 1% of the tasks
+	step = max(1, len(tasks) // 100)
+	def change_status():
+		for i, item in enumerate(tasks):
+			if not i % step:
+				item['status'] = 'Complete' if item['status'] == 'Ready' else 'Ready'
+		model.refresh()
+	metrics['model_refresh'] = timed(change_status, args.repeats)
+
+	try:
+		os.environ.setdefault('IC_USERPREFSDIR', tempfile.mkdtemp(prefix='sqrn_bench_prefs_'))
+		import sequencerename
+	except ImportError as e:
+		skipped['app'] = str(e)
+		return
+
+	# Time startup until the window has been shown and painted
+	painted = []
+	class PaintFilter(QtCore.QObject):
+		def eventFilter(self, obj, event):
+			if event.type() == QtCore.QEvent.Paint and isinstance(obj, QtWidgets.QWidget):
+				painted.append(obj)
+			return False
+	paint_filter = PaintFilter()
+	app.installEventFilter(paint_filter)
+
+	start = time.perf_counter()
+	window = sequencerename.SequenceRenameApp()
+	window.show()
+	deadline = time.time() + 10
+	while not any(w.window() is window for w in painted) and time.time() < deadline:
+		app.processEvents()
+	metrics['app_init'] = time.perf_counter() - start
+
+	app.removeEventFilter(paint_filter)
+	del painted[:]
+
+	for item in tasks:
+		window.create_task(item['path'], item['prefix'], item['frames'], item['ext'], item['count'])
+	window.ui.find_comboBox.setEditText(OPTIONS['find_str'])
+	window.ui.replace_comboBox.setEditText(OPTIONS['replace_str'])
+	metrics['app_preview'] = timed(window.update_tasks, args.repeats)
+	window.preview_timer.stop()
+	app.processEvents()
+
+# ----------------------------------------------------------------------------
+# Results
+# ----------------------------------------------------------------------------
+
+def git_commit():
+	"""Return the current git commit hash, or None if unknown."""
+
+	try:
+		return subprocess.check_output(
+			['git', 'rev-parse', 'HEAD'], cwd=bench_dir,
+			stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(results, baseline, thresholds):
+	"""Compare results with a baseline.
+
+	Return a list of (metric, baseline seconds, current seconds, limit)
+	tuples for the stages which have regressed. A stage regresses if it
+	takes longer than its baseline time plus the tolerance, and by more
+	than the minimum difference, to allow for timer noise.
+	"""
+	tolerances = thresholds.get('tolerance', {})
+	default = tolerances.get('default', 0.25)
+	min_seconds = thresholds.get('min_seconds', 0.01)
+
+	regressions = []
+	for name, current in sorted(results['metrics'].items()):
+		base = baseline.get('metrics', {}).get(name)
+		if base is None:
+			continue
+		limit = max(base * (1 + tolerances.get(name, default)), base + min_seconds)
+		if current > limit:
+			regressions.append((name, base, current, limit))
+
+	return regressions
+
+
+def parse_args(argv=None):
+	"""Parse the command-line arguments."""
+
+	parser = argparse.ArgumentParser(
+		description="Benchmark the stages of a sequence rename job.")
+	parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+		help="problem size preset (default: %(default)s)")
+	parser.add_argument('--tasks', type=int,
+		help="number of in-memory sequences")
+	parser.add_argument('--frames', type=int,
+		help="length of the longest in-memory sequence")
+	parser.add_argument('--disk-sequences', type=int,
+		help="number of sequences written to disk")
+	parser.add_argument('--disk-frames', type=int,
+		help="number of frames in each sequence written to disk")
+	parser.add_argument('--repeats', type=int, default=3,
+		help="times to repeat each repeatable stage, keeping the fastest (default: %(default)s)")
+	parser.add_argument('--jobs', type=int, default=4,
+		help="files to rename concurrently (default: %(default)s)")
+	parser.add_argument('--dir',
+		help="directory in which to write files (default: tmpfs if available)")
+	parser.add_argument('--skip-disk', action='store_true',
+		help="don't run the stages which write files")
+	parser.add_argument('--skip-qt', action='store_true',
+		help="don't run the Qt stages")
+	parser.add_argument('--output',
+		help="write the results to this JSON file instead of stdout")
+	parser.add_argument('--baseline',
+		help="results of an earlier run to compare with")
+	parser.add_argument('--thresholds', default=thresholds_file,
+		help="JSON file of regression thresholds (default: %(default)s)")
+
+	args = parser.parse_args(argv)
+	for key, value in SCALES[args.scale].items():
+		if getattr(args, key) is None:
+			setattr(args, key, value)
+
+	return args
+
+
+def main(argv=None):
+	"""Run the benchmarks and report the results.
+
+	Return the exit code: 1 if any stage has regressed, otherwise 0.
+	"""
+	args = parse_args(argv)
+
+	results = dict(
+		commit=git_commit(),
+		time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+		python=platform.python_version(),
+		platform=platform.platform(),
+		scale=args.scale,
+		params=dict((key, getattr(args, key)) for key in ('tasks', 'frames', 'disk_sequences', 'disk_frames', 'jobs')),
+		metrics={},
+		info={},
+		skipped={},
+	)
+	metrics = results['metrics']
+	info = results['info']
+
+	tasks = bench_memory(args, metrics, info)
+
+	if not args.skip_disk:
+		base_dir = args.dir
+		if base_dir is None and os.access('/dev/shm', os.W_OK):
+			base_dir = '/dev/shm'
+		root = tempfile.mkdtemp(prefix='sqrn_bench_', dir=base_dir)
+		try:
+			bench_disk(args, root, metrics, info)
+		finally:
+			shutil.rmtree(root, ignore_errors=True)
+
+	if not args.skip_qt:
+		bench_qt(args, tasks, metrics, info, results['skipped'])
+
+	report = json.dumps(results, indent=2, sort_keys=True)
+	if args.output:
+		with open(args.output, 'w') as f:
+			f.write(report + "\n")
+	else:
+		sys.stdout.write(report + "\n")
+
+	if not args.baseline:
+		return 0
+
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	with open(args.thresholds) as f:
+		thresholds = json.load(f)
+
+	if baseline.get('params') != results['params']:
+		sys.stderr.write("Warning: baseline was run with different parameters.\n")
+
+	regressions = compare(results, baseline, thresholds)
+	for name, base, current, limit in regressions:
+		sys.stderr.write("Regression: %s took %.4fs, baseline %.4fs (limit %.4fs)\n" % (name, current, base, limit))
+	if not regressions:
+		sys.stderr.write("No regressions against %s\n" % (baseline.get('commit') or args.baseline))
+
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
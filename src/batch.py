@@ -0,0 +1,347 @@
+#!/usr/bin/python
+
+# batch.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Batch Mode
+# A headless command-line interface for scripted jobs, e.g. on a render farm.
+# Runs the same sequence detection, preview, conflict check and rename engine
+# as the UI, without importing Qt. Results are printed to stdout as JSON.
+#
+# Example:
+#   sqrn --batch /path/to/renders --find _v001 --replace _v002 --dry-run
+
+
+import argparse
+import json
+import os
+import signal
+import sys
+
+# Import custom modules
+import conflicts
+import fileops
+import ingest
+import jobcontrol
+import rename
+import renamejob
+import taskregistry
+import timing
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Exit codes
+EXIT_OK = 0
+EXIT_ERRORS = 1  # Some files could not be renamed
+EXIT_USAGE = 2  # Invalid command-line arguments
+EXIT_NOT_READY = 3  # Invalid expression, conflicts or failed dry run
+EXIT_CANCELLED = 130  # Interrupted by the user
+
+# ----------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------
+
+def parse_args(argv=None):
+	"""Parse the command-line arguments."""
+
+	parser = argparse.ArgumentParser(
+		prog="sqrn --batch",
+		description="Batch rename and renumber sequences of files without a UI. "
+		            "Results are printed as JSON.")
+
+	parser.add_argument('--batch', nargs='+', metavar='PATH', required=True,
+		help="directories to detect sequences in, or files belonging to sequences")
+
+	group = parser.add_argument_group("directories")
+	group.add_argument('--depth', type=int, default=0, metavar='N',
+		help="levels of subdirectories to scan for sequences (default: %(default)s)")
+	group.add_argument('--recursive', action='store_true',
+		help="scan all subdirectories")
+	group.add_argument('--include', action='append', default=[], metavar='PATTERN',
+		help="only detect files matching this glob pattern (can be repeated)")
+	group.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+		help="skip files and subdirectories matching this glob pattern (can be repeated)")
+
+	group = parser.add_argument_group("find & replace")
+	group.add_argument('--find', default="",
+		help="text to find in the filename prefix")
+	group.add_argument('--replace', default="",
+		help="text to replace the found text with")
+	group.add_argument('--ignore-case', action='store_true',
+		help="perform case-insensitive search")
+	group.add_argument('--literal', action='store_true',
+		help="don't interpret the find text as a regular expression")
+
+	group = parser.add_argument_group("renumbering")
+	group.add_argument('--start', type=int,
+		help="renumber frames starting from this number")
+	group.add_argument('--step', type=int,
+		help="renumber frames in increments of this number")
+	group.add_argument('--padding', type=int,
+		help="pad frame numbers to this many digits (default: keep existing)")
+	group.add_argument('--autopad', action='store_true',
+		help="use the minimum padding needed for the frame numbers")
+
+	group = parser.add_argument_group("other")
+	group.add_argument('--ext',
+		help="change the filename extension")
+	group.add_argument('--dest', metavar='DIR',
+		help="move the renamed files to this directory, copying them if it's on another filesystem")
+	group.add_argument('--dry-run', action='store_true',
+		help="check for problems without renaming any files")
+	group.add_argument('--validate', action='store_true',
+		help="always perform a dry run before renaming")
+	group.add_argument('--stop-on-error', action='store_true',
+		help="stop processing a task at the first error")
+	group.add_argument('--jobs', type=int, default=4, metavar='N',
+		help="number of files to rename concurrently (default: %(default)s)")
+	group.add_argument('--log-dir',
+		help="write the complete log of every task to this directory")
+	group.add_argument('--verbose', action='store_true',
+		help="print progress messages to stderr")
+	group.add_argument('--profile', metavar='PATH',
+		help="profile the job with cProfile and write the statistics to PATH in pstats format")
+
+	args = parser.parse_args(argv)
+
+	for path in args.batch:
+		if not os.path.exists(path):
+			parser.error("path does not exist: %s" % path)
+	if args.jobs < 1:
+		parser.error("--jobs must be at least 1")
+	if args.depth < 0:
+		parser.error("--depth must not be negative")
+	if args.start is not None and args.start < 0:
+		parser.error("--start must not be negative")
+	if args.step is not None and args.step < 1:
+		parser.error("--step must be at least 1")
+
+	return args
+
+
+def get_rename_options(args):
+	"""Return the rename options from the command-line arguments, in the
+	same form as SequenceRenameApp.get_rename_options().
+
+	Frames are only renumbered if a start or step is given, and the existing
+	padding is kept unless specified.
+	"""
+	return dict(
+		find_str=args.find,
+		replace_str=args.replace,
+		ignore_case=args.ignore_case,
+		regex=not args.literal,
+		start=1 if args.start is None else args.start,
+		step=1 if args.step is None else args.step,
+		padding=args.padding,
+		preserve=args.start is None and args.step is None,
+		autopad=args.autopad,
+		change_ext=bool(args.ext),
+		ext_to_change=(args.ext or "").lstrip('.'),
+		dest_dir=os.path.abspath(args.dest) if args.dest else None,
+	)
+
+
+def load_tasks(paths, max_depth=0, include=(), exclude=(), on_error=None):
+	"""Detect sequences in the given directories or files.
+
+	Return a TaskRegistry containing a task for each sequence found.
+
+	Arguments:
+		paths (list) -- directories or files belonging to sequences.
+		max_depth (int, optional) -- the number of levels of subdirectories
+			to scan, or None to scan the whole tree.
+		include (list, optional) -- file name glob patterns to include.
+		exclude (list, optional) -- file and directory name glob patterns
+			to exclude.
+		on_error (callable, optional) -- called with the path and exception
+			for each directory which can't be read.
+	"""
+	tasks = taskregistry.TaskRegistry()
+
+	def add(path, prefix, frames, ext, count):
+		if tasks.find(path, prefix, ext, ingest.padding_key(frames)) is None:
+			tasks.add(path, prefix, frames, ext, count)
+
+	dirs = []
+	for path in paths:
+		path = os.path.abspath(path)
+		if os.path.isdir(path):
+			dirs.append(path)
+		else:
+			seq = ingest.detect_file(path)
+			if seq is not None:
+				add(*seq)
+
+	# Directories are scanned concurrently, so sort the results to keep the
+	# report in a consistent order
+	found = [seq for batch in ingest.walk(dirs, max_depth, include, exclude, on_error=on_error) for seq in batch]
+	for seq in sorted(found):
+		add(*seq)
+
+	return tasks
+
+
+def plan_tasks(tasks, options):
+	"""Work out the rename operation for every task, and check for output
+	filename conflicts.
+
+	Return the number of conflicting tasks.
+	"""
+	items = list(tasks)
+	renamed_prefixes = rename.replace_text_many(
+		[item['prefix'] for item in items],
+		options['find_str'], options['replace_str'],
+		options['ignore_case'], options['regex'])
+	if renamed_prefixes is None:  # Invalid regex
+		renamed_prefixes = [None] * len(items)
+
+	conflict_index = conflicts.ConflictIndex()
+	for item, renamed_prefix in zip(items, renamed_prefixes):
+		rename.plan_task(item, renamed_prefix, options)
+		conflict_index.update(item['id'], item['dst_path'], item['after'])
+
+	for task_id in conflict_index.conflicting_ids():
+		tasks[task_id]['status'] = 'Output filename conflict'
+
+	return len(conflict_index)
+
+
+def run_job(items, dry_run, args, control):
+	"""Run a rename job on the given tasks.
+
+	Return a dict mapping task IDs to results, as described for
+	RenameJob._rename_task(), and a dict of timing statistics, as a tuple.
+	"""
+	results = {}
+
+	job = renamejob.RenameJob(
+		items,
+		dry_run=dry_run,
+		ignore_errors=not args.stop_on_error,
+		workers=args.jobs,
+		control=control,
+		log_dir=args.log_dir,
+	)
+	job.on_task_completed = lambda result: results.__setitem__(result[0], result)
+	if args.verbose:
+		job.on_message = print_message
+		job.on_error = print_message
+	job.run()
+
+	return results, job.summary()
+
+
+def print_message(message):
+	"""Print a progress message to stderr, keeping stdout for results."""
+
+	sys.stderr.write(message + "\n")
+	sys.stderr.flush()
+
+
+def task_report(item, result=None):
+	"""Return a dict describing a task and its result, for JSON output."""
+
+	report = dict(
+		id=item['id'],
+		path=item['path'],
+		before=item['before'],
+		after=item['after'],
+		count=item['count'],
+		status=item['status'],
+	)
+	if item['dst_path'] != item['path']:
+		report['dst_path'] = item['dst_path']
+
+	if result is not None:
+		task_id, status, log, filepath, remaining = result
+		report['status'] = status
+		report['succeeded'] = log.successes
+		report['failed'] = log.failures
+		report['errors'] = log.errors
+		if log.spill_path:
+			report['log'] = log.spill_path
+		if remaining is not None:
+			report['remaining'] = remaining
+
+	return report
+
+
+def main(argv=None):
+	"""Run a batch rename job from the command line.
+
+	Return the exit code.
+	"""
+	args = parse_args(argv)
+	if args.profile:
+		timing.start_profiler(args.profile)
+
+	tasks = load_tasks(args.batch, 
+		max_depth=None if args.recursive else args.depth, 
+		include=args.include, exclude=args.exclude, 
+		on_error=lambda path, e: print_message("Could not read directory: %s (%s)" % (path, e)))
+	conflict_count = plan_tasks(tasks, get_rename_options(args))
+
+	items = [item for item in tasks if item['status'] == 'Ready']
+	results = {}
+	report = dict(
+		dry_run=args.dry_run,
+		conflicts=conflict_count,
+		files=sum(item['count'] for item in items),
+	)
+	timings = {}
+
+	if any(item['status'] not in ('Ready', 'Nothing to change') for item in tasks):
+		exit_code = EXIT_NOT_READY
+
+	elif not items:
+		exit_code = EXIT_OK
+
+	else:
+		control = jobcontrol.JobControl()
+		signal.signal(signal.SIGINT, lambda signum, frame: control.cancel())
+
+		# Perform a dry run first unless every directory supports atomic
+		# no-overwrite renames
+		dirs = set(item['path'] for item in items) | set(item['dst_path'] for item in items)
+		validate = args.dry_run or args.validate \
+		        or not all(fileops.supports_noreplace(path) for path in dirs)
+
+		if validate:
+			results, timings['dry_run'] = run_job(items, True, args, control)
+			ready = all(result[1] == 'Ready' for result in results.values()) \
+			    and len(results) == len(items)
+		else:
+			ready = True
+
+		if ready and not args.dry_run and not control.is_cancelled():
+			results, timings['rename'] = run_job(items, False, args, control)
+
+		if control.is_cancelled():
+			exit_code = EXIT_CANCELLED
+		elif not ready:
+			exit_code = EXIT_NOT_READY
+		elif any(result[1] != ('Ready' if args.dry_run else 'Complete') for result in results.values()):
+			exit_code = EXIT_ERRORS
+		else:
+			exit_code = EXIT_OK
+
+	report['tasks'] = [task_report(item, results.get(item['id'])) for item in tasks]
+	report['timing'] = timings
+	report['exit_code'] = exit_code
+
+	if args.profile:
+		report['profile'] = timing.stop_profiler()
+	json.dump(report, sys.stdout, indent=2)
+	sys.stdout.write("\n")
+
+	return exit_code
+
+
+if __name__ == "__main__":
+	sys.exit(main())
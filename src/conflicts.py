@@ -0,0 +1,122 @@
+#!/usr/bin/python
+
+# conflicts.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Detection of conflicting output filenames between rename tasks.
+
+
+import os
+
+
+def output_key(path, filename):
+	"""Return a normalised key for an output file path.
+
+	Keys are lower case, as output files which differ only by case will
+	collide on case-insensitive filesystems.
+	"""
+	return os.path.normpath(os.path.join(path, filename)).lower()
+
+
+class ConflictIndex(object):
+	"""Hash-based index of task outputs.
+
+	Each task maps to a single output key. Tasks sharing a key are in
+	conflict. Updating a task only touches the entries for that task, so the
+	index can be kept up to date incrementally.
+	"""
+
+	def __init__(self):
+		self._outputs = {}  # Task ID -> (path, filename) as last given
+		self._keys = {}  # Task ID -> output key
+		self._owners = {}  # Output key -> set of task IDs
+		self._conflicts = set()  # Output keys with more than one owner
+
+
+	def __len__(self):
+		"""Return the number of conflicting outputs."""
+
+		return len(self._conflicts)
+
+
+	def update(self, task_id, path, filename):
+		"""Set the output for a task.
+
+		Return True if the output changed.
+		"""
+		output = (path, filename)
+		if self._outputs.get(task_id) == output:
+			return False
+
+		self.remove(task_id)
+		key = output_key(path, filename)
+		self._outputs[task_id] = output
+		self._keys[task_id] = key
+
+		owners = self._owners.setdefault(key, set())
+		owners.add(task_id)
+		if len(owners) > 1:
+			self._conflicts.add(key)
+
+		return True
+
+
+	def remove(self, task_id):
+		"""Remove a task from the index."""
+
+		key = self._keys.pop(task_id, None)
+		if key is None:
+			return
+
+		del self._outputs[task_id]
+		owners = self._owners[key]
+		owners.discard(task_id)
+		if not owners:
+			del self._owners[key]
+		if len(owners) < 2:
+			self._conflicts.discard(key)
+
+
+	def clear(self):
+		"""Remove all tasks from the index."""
+
+		self._outputs.clear()
+		self._keys.clear()
+		self._owners.clear()
+		self._conflicts.clear()
+
+
+	def is_conflicting(self, task_id):
+		"""Return True if the task's output collides with another task."""
+
+		return self._keys.get(task_id) in self._conflicts
+
+
+	def colliding(self, task_id):
+		"""Return a sorted list of the other task IDs sharing the output of
+		the given task.
+		"""
+		key = self._keys.get(task_id)
+		if key not in self._conflicts:
+			return []
+
+		return sorted(i for i in self._owners[key] if i != task_id)
+
+
+	def conflicts(self):
+		"""Return a dict mapping each conflicting output key to a sorted list
+		of the task IDs which share it.
+		"""
+		return dict((key, sorted(self._owners[key])) for key in self._conflicts)
+
+
+	def conflicting_ids(self):
+		"""Return a set of all task IDs involved in a conflict."""
+
+		ids = set()
+		for key in self._conflicts:
+			ids.update(self._owners[key])
+
+		return ids
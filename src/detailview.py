@@ -17,7 +17,7 @@ from Qt import QtCore, QtGui, QtWidgets
 import ui_template as UI
 
 # Import custom modules
-import sequence
+import framemodel
 
 
 # ----------------------------------------------------------------------------
@@ -35,6 +35,15 @@ cfg = dict(
 	store_window_geometry=True, 
 )
 
+# Number of lines of a full task log to load at a time
+log_page_size = 1000
+
+# Number of rows to measure when estimating column widths
+width_sample_size = 100
+
+# Delay in milliseconds after scrolling before checking files on disk
+exists_delay = 100
+
 # ----------------------------------------------------------------------------
 # Main dialog class
 # ----------------------------------------------------------------------------
@@ -55,41 +64,166 @@ class dialog(QtWidgets.QDialog, UI.TemplateUI):
 		# Restore widget state
 		self.restoreWidgetState(self.ui.splitter, "splitterSizes")
 
+		# Load more of a full log when scrolled to the bottom
+		self.log_pages = None
+		self.ui.log_plainTextEdit.verticalScrollBar().valueChanged.connect(self.load_log_page)
+
+		# Check files on disk for the visible rows once scrolling settles
+		self.model = None
+		self.exists_checker = None
+		self.exists_timer = QtCore.QTimer(self)
+		self.exists_timer.setSingleShot(True)
+		self.exists_timer.setInterval(exists_delay)
+		self.exists_timer.timeout.connect(self.check_visible_rows)
+		self.ui.frameList_treeView.verticalScrollBar().valueChanged.connect(self.exists_timer.start)
+		self.ui.exists_checkBox.toggled.connect(self.toggle_exists)
+
+		self.ui.jump_lineEdit.setValidator(QtGui.QIntValidator(self))
+		self.ui.jump_lineEdit.returnPressed.connect(self.jump_to_frame)
+
 
 	def display(self, task_id, task):
 		"""Display the dialog."""
 
 		path = task['path']
-		src_file_list = sequence.expandSeq(path, task['before'])
-		dst_file_list = sequence.expandSeq(path, task['after'])
-		try:
-			log = "\n".join(task['log'])
-		except KeyError:
-			log = None
+		log = task.get('log')
 
 		self.setWindowTitle("%s: Task %d" % (cfg['app_name'], task_id))
 		self.ui.path_lineEdit.setText(path)
 
-		self.ui.frameList_treeWidget.clear()
-		for row in range(len(src_file_list)):
-			item = QtWidgets.QTreeWidgetItem(self.ui.frameList_treeWidget)
-			item.setText(0, os.path.basename(src_file_list[row]))
-			item.setText(1, os.path.basename(dst_file_list[row]))
-
-		for col in range(self.ui.frameList_treeWidget.columnCount()):
-			self.ui.frameList_treeWidget.resizeColumnToContents(col)
+		self.stop_exists_check()
+		if self.model is not None:
+			self.model.deleteLater()
+		self.model = framemodel.FrameModel(path, task['before'], task['after'], self, 
+			dst_path=task.get('dst_path'))
+		view = self.ui.frameList_treeView
+		view.setModel(self.model)
+		view.setColumnHidden(framemodel.EXISTS, not self.ui.exists_checkBox.isChecked())
+		for col in (framemodel.BEFORE, framemodel.AFTER):
+			view.setColumnWidth(col, self.estimate_column_width(col))
+		self.ui.jump_lineEdit.clear()
+		self.exists_timer.start()
 
 		self.ui.log_plainTextEdit.setFont(QtGui.QFont("Monospace"))
-		if log:
-			self.ui.log_plainTextEdit.setPlainText(log)
-		else:
-			self.ui.log_plainTextEdit.setPlainText("")
+		self.ui.log_plainTextEdit.setPlainText("")
+		self.log_pages = None
+		if log is not None:
+			if log.spill_path and os.path.isfile(log.spill_path):
+				# Page through the full log on disk
+				self.ui.log_plainTextEdit.setPlainText("%s\nFull log: %s\n" % (log.summary(), log.spill_path))
+				self.log_pages = log.read_pages(log_page_size)
+				self.load_log_page()
+			else:
+				self.ui.log_plainTextEdit.setPlainText("\n".join(log))
 
 		return self.exec_()
 
 
+	def estimate_column_width(self, column):
+		"""Return a width for a column of the frame list, measured from a
+		sample of rows rather than every row.
+		"""
+		metrics = self.ui.frameList_treeView.fontMetrics()
+		width = metrics.boundingRect(framemodel.COLUMNS[column]).width()
+		for row in self.model.sample_rows(width_sample_size):
+			text = self.model.index(row, column).data()
+			width = max(width, metrics.boundingRect(text).width())
+
+		return width + 24  # Allow for margins
+
+
+	def jump_to_frame(self):
+		"""Scroll to and select the row of the frame number entered."""
+
+		if not self.model or not self.model.rowCount():
+			return
+
+		try:
+			frame = int(self.ui.jump_lineEdit.text())
+		except ValueError:
+			return
+
+		index = self.model.index(self.model.row_for_frame(frame), 0)
+		view = self.ui.frameList_treeView
+		view.scrollTo(index, QtWidgets.QAbstractItemView.PositionAtCenter)
+		view.setCurrentIndex(index)
+
+
+	def toggle_exists(self, checked):
+		"""Show or hide the column showing whether files exist on disk."""
+
+		self.ui.frameList_treeView.setColumnHidden(framemodel.EXISTS, not checked)
+		if checked and self.model is not None:
+			self.model.clear_exists()  # Files may have changed, so check again
+			self.exists_timer.start()
+
+
+	def visible_rows(self):
+		"""Return the first and last rows visible in the frame list."""
+
+		view = self.ui.frameList_treeView
+		viewport = view.viewport()
+		first = view.indexAt(QtCore.QPoint(0, 0)).row()
+		last = view.indexAt(QtCore.QPoint(0, viewport.height()-1)).row()
+		if last < 0:
+			last = self.model.rowCount() - 1
+		return max(first, 0), last
+
+
+	def check_visible_rows(self):
+		"""Check the visible files on disk in a background thread."""
+
+		if self.model is None or not self.ui.exists_checkBox.isChecked() \
+		or not self.ui.frameList_treeView.isVisible():
+			return
+
+		if self.exists_checker is not None and self.exists_checker.isRunning():
+			return  # Check again when the current check finishes
+
+		first, last = self.visible_rows()
+		rows = self.model.unchecked_rows(first, last)
+		if not rows:
+			return
+
+		self.exists_checker = framemodel.ExistenceChecker(
+			[(row, ) + self.model.pair(row) for row in rows], self)
+		self.exists_checker.rowsChecked.connect(self.model.set_exists)
+		self.exists_checker.finished.connect(self.check_visible_rows)
+		self.exists_checker.start()
+
+
+	def stop_exists_check(self):
+		"""Stop any existence check in progress."""
+
+		self.exists_timer.stop()
+		if self.exists_checker is not None:
+			self.exists_checker.finished.disconnect(self.check_visible_rows)
+			self.exists_checker.requestInterruption()
+			self.exists_checker.wait()
+			self.exists_checker = None
+
+
+	def load_log_page(self, value=None):
+		"""Append the next page of a full log, if scrolled to the bottom."""
+
+		if self.log_pages is None:
+			return
+
+		scrollbar = self.ui.log_plainTextEdit.verticalScrollBar()
+		if value is not None and value < scrollbar.maximum():
+			return
+
+		page = next(self.log_pages, None)
+		if page is None:
+			self.log_pages = None
+		else:
+			self.ui.log_plainTextEdit.appendPlainText("\n".join(page))
+
+
 	def hideEvent(self, event):
 		"""Event handler for when window is hidden."""
 
+		self.log_pages = None  # Close the log file
+		self.stop_exists_check()
 		self.storeWindow()  # Store window geometry
 		self.storeWidgetState(self.ui.splitter, "splitterSizes")  # Store splitter size state
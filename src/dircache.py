@@ -0,0 +1,152 @@
+#!/usr/bin/python
+
+# dircache.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# A shared cache of directory snapshots, so that each directory is only read
+# once per change, however many times it's listed. Snapshots are validated
+# against the directory's modification time and inode with a single stat
+# call, and the least recently used are evicted when the cache is full.
+
+
+import collections
+import os
+import threading
+
+# Import custom modules
+import dirsnapshot
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Maximum number of names to keep in the cache, across all directories
+cache_size = 1000000
+
+# ----------------------------------------------------------------------------
+# Directory cache class
+# ----------------------------------------------------------------------------
+
+class DirectoryCache(object):
+	"""Thread-safe LRU cache of directory snapshots, keyed by path."""
+
+	def __init__(self, max_names=None):
+		"""Initialise the cache.
+
+		Arguments:
+			max_names (int, optional) -- the maximum number of file and
+				subdirectory names to keep. Defaults to cache_size.
+		"""
+		self.max_names = cache_size if max_names is None else max_names
+		self.hits = 0
+		self.misses = 0
+
+		self._snapshots = collections.OrderedDict()  # Least recent first
+		self._names = 0
+		self._lock = threading.Lock()
+
+
+	def __len__(self):
+		return len(self._snapshots)
+
+
+	def __contains__(self, path):
+		return os.path.normpath(path) in self._snapshots
+
+
+	def _is_valid(self, snapshot):
+		"""Return True if a snapshot still matches its directory.
+
+		A snapshot taken within the modification time resolution of a
+		change is never trusted, as a further change in the same interval
+		wouldn't alter the modification time. The directory is read again
+		until a snapshot is taken after the interval has passed.
+		"""
+		return not snapshot.is_racy() and not snapshot.is_stale()
+
+
+	def _size(self, snapshot):
+		return len(snapshot.files) + len(snapshot.dirs)
+
+
+	def get(self, path, refresh=False):
+		"""Return an up to date snapshot of a directory.
+
+		Raise OSError if the directory can't be read.
+
+		Arguments:
+			path (str) -- the directory path.
+			refresh (bool, optional) -- read the directory even if the cached
+				snapshot appears to be valid.
+		"""
+		path = os.path.normpath(path)
+
+		with self._lock:
+			snapshot = self._snapshots.get(path)
+			if snapshot is not None:
+				self._snapshots.move_to_end(path)
+
+		if snapshot is not None and not refresh and self._is_valid(snapshot):
+			self.hits += 1
+			return snapshot
+
+		# Read the directory outside the lock, so other directories can be
+		# read concurrently
+		self.misses += 1
+		try:
+			snapshot = dirsnapshot.DirectorySnapshot(path)
+		except OSError:
+			self.invalidate(path)
+			raise
+
+		with self._lock:
+			old = self._snapshots.pop(path, None)
+			if old is not None:
+				self._names -= self._size(old)
+			self._snapshots[path] = snapshot
+			self._names += self._size(snapshot)
+
+			# Evict the least recently used snapshots, keeping at least the
+			# one just read
+			while self._names > self.max_names and len(self._snapshots) > 1:
+				old_path, old = self._snapshots.popitem(last=False)
+				self._names -= self._size(old)
+
+		return snapshot
+
+
+	def invalidate(self, path=None):
+		"""Discard the snapshot of a directory, or all snapshots if no path
+		is given.
+		"""
+		with self._lock:
+			if path is None:
+				self._snapshots.clear()
+				self._names = 0
+			else:
+				old = self._snapshots.pop(os.path.normpath(path), None)
+				if old is not None:
+					self._names -= self._size(old)
+
+# ----------------------------------------------------------------------------
+# Shared cache
+# ----------------------------------------------------------------------------
+
+_cache = DirectoryCache()
+
+
+def get(path, refresh=False):
+	"""Return an up to date snapshot of a directory from the shared cache.
+
+	Raise OSError if the directory can't be read.
+	"""
+	return _cache.get(path, refresh)
+
+
+def invalidate(path=None):
+	"""Discard snapshots from the shared cache."""
+
+	_cache.invalidate(path)
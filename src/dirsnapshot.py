@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+# dirsnapshot.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# In-memory snapshots of directory contents, so that the existence of many
+# files can be checked with a single directory read instead of a stat call
+# per file.
+
+
+import os
+import time
+
+
+# Resolution of directory modification times, in seconds. A change made
+# within this time of the snapshot being taken may not alter the
+# modification time, so such snapshots are suspect.
+mtime_resolution = 1.0
+
+
+class DirectorySnapshot(object):
+	"""The sets of file and subdirectory names in a directory at a point in
+	time.
+
+	The directory's modification time is recorded when the snapshot is
+	taken, so changes made afterwards can be detected.
+	"""
+
+	def __init__(self, path):
+		"""Read the contents of the directory.
+
+		Symbolic links to directories aren't counted as subdirectories.
+		Raise OSError if the directory can't be read.
+		"""
+		self.path = path
+		self.stat = os.stat(path)
+		self.files = set()
+		self.dirs = set()
+
+		for entry in os.scandir(path):
+			try:
+				if entry.is_dir(follow_symlinks=False):
+					self.dirs.add(entry.name)
+				elif entry.is_file():
+					self.files.add(entry.name)
+			except OSError:  # Entry removed or inaccessible
+				continue
+
+		self.time = time.time()
+
+
+	def __contains__(self, name):
+		return name in self.files
+
+
+	def __len__(self):
+		return len(self.files)
+
+
+	def signature(self):
+		"""Return a tuple identifying the version of the directory."""
+
+		return self.stat.st_dev, self.stat.st_ino, self.stat.st_mtime_ns
+
+
+	def is_stale(self):
+		"""Return True if the directory has changed since the snapshot was
+		taken, or can no longer be read.
+		"""
+		try:
+			st = os.stat(self.path)
+		except OSError:
+			return True
+
+		return (st.st_dev, st.st_ino, st.st_mtime_ns) != self.signature()
+
+
+	def is_racy(self):
+		"""Return True if the snapshot was taken so soon after the directory
+		was modified that a further change may not have been detected.
+		"""
+		return self.time - self.stat.st_mtime < mtime_resolution
+
+
+	def isfile(self, filepath):
+		"""Return True if the given file exists in the snapshot.
+
+		The file must be in the snapshot's directory.
+		"""
+		return os.path.basename(filepath) in self.files
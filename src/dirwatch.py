@@ -0,0 +1,298 @@
+#!/usr/bin/python
+
+# dirwatch.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Directory Watcher
+# Watches directories for files being added, removed or renamed. On Linux,
+# inotify is used directly so the names of the changed files are known, and
+# only the affected sequences need to be updated. Elsewhere, Qt's file
+# system watcher reports which directories have changed. Bursts of changes
+# are coalesced, so a render writing many frames produces a single update.
+
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+import time
+
+from Qt import QtCore
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Time in milliseconds to wait for further changes before reporting them
+watch_delay = 500
+
+# Maximum time in seconds changes are held back during a continuous burst
+watch_max_delay = 5.0
+
+# inotify constants, from <sys/inotify.h>
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+IN_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO \
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_event_header = struct.Struct('iIII')  # wd, mask, cookie, len
+
+# ----------------------------------------------------------------------------
+# inotify class
+# ----------------------------------------------------------------------------
+
+_libc = None
+
+
+def _load_libc():
+	"""Return the C library with the inotify functions, or None if it isn't
+	available.
+	"""
+	global _libc
+	if _libc is None:
+		_libc = False
+		if sys.platform.startswith('linux'):
+			try:
+				libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+				libc.inotify_init1
+			except (OSError, AttributeError):
+				pass
+			else:
+				libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+				libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+				_libc = libc
+
+	return _libc or None
+
+
+def inotify_available():
+	"""Return True if inotify can be used on this system."""
+
+	return _load_libc() is not None
+
+
+class Inotify(object):
+	"""Minimal non-blocking wrapper around a Linux inotify instance."""
+
+	def __init__(self):
+		"""Create the inotify instance. Raise OSError on failure."""
+
+		self._libc = _load_libc()
+		if self._libc is None:
+			raise OSError(errno.ENOSYS, "inotify is not available")
+
+		self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+		if self.fd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e))
+
+
+	def add_watch(self, path, mask=IN_WATCH_MASK):
+		"""Watch a directory and return the watch descriptor.
+
+		Raise OSError if the directory can't be watched, e.g. when the
+		per-user watch limit has been reached.
+		"""
+		wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+		if wd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e), path)
+		return wd
+
+
+	def rm_watch(self, wd):
+		"""Stop watching a directory. Errors are ignored, as the watch is
+		removed automatically if the directory is deleted.
+		"""
+		self._libc.inotify_rm_watch(self.fd, wd)
+
+
+	def read_events(self):
+		"""Return a list of (wd, mask, name) tuples for the events waiting
+		to be read, without blocking.
+		"""
+		events = []
+		while True:
+			try:
+				data = os.read(self.fd, 65536)
+			except BlockingIOError:
+				break
+			if not data:
+				break
+
+			offset = 0
+			while offset < len(data):
+				wd, mask, cookie, length = _event_header.unpack_from(data, offset)
+				offset += _event_header.size
+				name = data[offset:offset+length].rstrip(b'\0')
+				offset += length
+				events.append((wd, mask, os.fsdecode(name)))
+
+		return events
+
+
+	def close(self):
+		if self.fd >= 0:
+			os.close(self.fd)
+			self.fd = -1
+
+# ----------------------------------------------------------------------------
+# Directory watcher class
+# ----------------------------------------------------------------------------
+
+class DirectoryWatcher(QtCore.QObject):
+	"""Watches a set of directories and reports changes in batches."""
+
+	# Create signals
+	directoriesChanged = QtCore.Signal(tuple)
+
+	def __init__(self, parent=None):
+		"""Initialise the watcher.
+
+		The directoriesChanged signal is emitted with a tuple of (directory
+		path, names) tuples, where names is a tuple of the names of the
+		files changed, or None if they aren't known.
+		"""
+		super(DirectoryWatcher, self).__init__(parent)
+
+		self._paths = {}  # Directory path -> watch descriptor
+		self._wds = {}  # Watch descriptor -> directory path
+		self._failed = set()  # Paths which couldn't be watched
+		self._changes = {}  # Directory path -> set of names, or None
+		self._first_change = None
+
+		try:
+			self._inotify = Inotify()
+		except OSError:
+			self._inotify = None
+			self._fs_watcher = QtCore.QFileSystemWatcher(self)
+			self._fs_watcher.directoryChanged.connect(lambda path: self._add_change(path, None))
+		else:
+			self._notifier = QtCore.QSocketNotifier(self._inotify.fd, QtCore.QSocketNotifier.Read, self)
+			self._notifier.activated.connect(lambda *args: self._read_events())
+
+		self._timer = QtCore.QTimer(self)
+		self._timer.setSingleShot(True)
+		self._timer.timeout.connect(self._flush)
+
+
+	def paths(self):
+		"""Return the set of directories being watched."""
+
+		return set(self._paths)
+
+
+	def watch(self, paths):
+		"""Watch exactly the given directories.
+
+		Watches are added and removed as necessary. Return a list of the
+		directories which couldn't be watched. Each is only reported once.
+		"""
+		paths = set(paths)
+		failed = []
+
+		for path in set(self._paths) - paths:
+			wd = self._paths.pop(path)
+			if self._inotify is None:
+				self._fs_watcher.removePath(path)
+			else:
+				self._wds.pop(wd, None)
+				self._inotify.rm_watch(wd)
+		self._failed &= paths
+
+		for path in paths - set(self._paths) - self._failed:
+			if self._inotify is None:
+				ok = self._fs_watcher.addPath(path)
+				wd = path
+			else:
+				try:
+					wd = self._inotify.add_watch(path)
+					ok = True
+				except OSError:
+					ok = False
+			if ok:
+				self._paths[path] = wd
+				self._wds[wd] = path
+			else:
+				self._failed.add(path)
+				failed.append(path)
+
+		return failed
+
+
+	def close(self):
+		"""Stop watching all directories."""
+
+		self.watch(())
+		self._timer.stop()
+		self._changes.clear()
+		if self._inotify is not None:
+			self._notifier.setEnabled(False)
+			self._inotify.close()
+
+
+	def _read_events(self):
+		for wd, mask, name in self._inotify.read_events():
+			if mask & IN_Q_OVERFLOW:  # Events were lost
+				for path in self._paths:
+					self._add_change(path, None)
+				continue
+
+			path = self._wds.get(wd)
+			if path is None:
+				continue
+
+			if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+				# The watch has gone, so let it be added again if the
+				# directory reappears
+				if mask & IN_IGNORED:
+					self._wds.pop(wd, None)
+					self._paths.pop(path, None)
+				self._add_change(path, None)
+			elif name:
+				self._add_change(path, name)
+
+
+	def _add_change(self, path, name):
+		"""Record a change and (re)start the timer to report it."""
+
+		if name is None:
+			self._changes[path] = None
+		else:
+			names = self._changes.setdefault(path, set())
+			if names is not None:
+				names.add(name)
+
+		now = time.time()
+		if self._first_change is None:
+			self._first_change = now
+		if now - self._first_change < watch_max_delay:
+			self._timer.start(watch_delay)
+		elif not self._timer.isActive():
+			self._timer.start(0)
+
+
+	def _flush(self):
+		changes = tuple(
+			(path, None if names is None else tuple(sorted(names)))
+			for path, names in self._changes.items())
+		self._changes = {}
+		self._first_change = None
+
+		if changes:
+			self.directoriesChanged.emit(changes)
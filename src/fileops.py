@@ -0,0 +1,254 @@
+#!/usr/bin/python
+
+# fileops.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Low-level file operations for the rename engine.
+# On Linux, renames use renameat2() with the RENAME_NOREPLACE flag, which
+# atomically fails if the destination already exists. Other platforms, and
+# filesystems which don't support the flag, fall back to checking for the
+# destination before renaming.
+# Files moved to another filesystem are copied in the kernel where possible,
+# using copy_file_range() or sendfile(), and the source is only removed once
+# the copy has been written to disk and verified.
+
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+
+RENAME_NOREPLACE = 1
+AT_FDCWD = -100
+
+# Maximum number of bytes copied by each system call when moving a file to
+# another filesystem
+copy_chunk_size = 64 * 1024 * 1024
+
+# Errors from copy_file_range() or sendfile() before any data has been copied
+# which mean the next method should be tried
+_copy_fallback_errors = set([errno.EXDEV, errno.ENOSYS, errno.EINVAL, 
+	errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF])
+
+_renameat2 = None
+_renameat2_loaded = False
+_device_support = {}  # Device ID -> bool, whether RENAME_NOREPLACE works
+_lock = threading.Lock()
+
+
+def _get_renameat2():
+	"""Return the libc renameat2 function, or None if not available."""
+
+	global _renameat2, _renameat2_loaded
+
+	if not _renameat2_loaded:
+		with _lock:
+			if not _renameat2_loaded:
+				if sys.platform.startswith('linux'):
+					try:
+						libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+						func = libc.renameat2  # Requires glibc 2.28+
+						func.argtypes = [ctypes.c_int, ctypes.c_char_p,
+						                 ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+						func.restype = ctypes.c_int
+						_renameat2 = func
+					except (OSError, AttributeError):
+						pass
+				_renameat2_loaded = True
+
+	return _renameat2
+
+
+def rename_noreplace(src, dst):
+	"""Atomically rename a file, failing if the destination exists.
+
+	Raise FileExistsError if the destination exists, NotImplementedError if
+	the operation isn't supported by the platform or filesystem, or OSError
+	for any other failure.
+	"""
+	func = _get_renameat2()
+	if func is None:
+		raise NotImplementedError("renameat2 is not available")
+
+	if func(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) != 0:
+		err = ctypes.get_errno()
+		if err in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+			raise NotImplementedError("RENAME_NOREPLACE is not supported")
+		raise OSError(err, os.strerror(err), src, None, dst)
+
+
+def supports_noreplace(dirpath):
+	"""Return True if atomic no-clobber renames work in the given directory.
+
+	The result is cached per device. The test renames a temporary file, so
+	the directory must be writable.
+	"""
+	try:
+		dev = os.stat(dirpath).st_dev
+	except OSError:
+		return False
+
+	try:
+		return _device_support[dev]
+	except KeyError:
+		pass
+
+	supported = False
+	if _get_renameat2() is not None:
+		try:
+			fd, probe = tempfile.mkstemp(prefix='.sqrn_probe_', dir=dirpath)
+			os.close(fd)
+			try:
+				rename_noreplace(probe, probe + '~')
+				probe += '~'
+				supported = True
+			except (NotImplementedError, OSError):
+				pass
+			finally:
+				os.remove(probe)
+		except OSError:
+			return False  # Not writable, don't cache
+
+	_device_support[dev] = supported
+	return supported
+
+
+def _rename_noclobber(src, dst):
+	"""Rename a file without overwriting an existing destination, as for
+	rename(). Raise OSError on failure.
+	"""
+	try:
+		rename_noreplace(src, dst)
+	except NotImplementedError:
+		if os.path.lexists(dst):
+			raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), src, None, dst)
+		os.rename(src, dst)
+
+
+def rename(src, dst):
+	"""Rename a file without overwriting an existing destination.
+
+	Use an atomic no-clobber rename where supported, otherwise check for the
+	destination first. Return a tuple containing a success flag and a
+	message, in the same form as os_wrapper.rename().
+	"""
+	try:
+		_rename_noclobber(src, dst)
+	except OSError as e:
+		return False, "Failed to rename '%s' to '%s': %s" % (src, dst, e.strerror)
+
+	return True, "Renamed '%s' to '%s'" % (src, dst)
+
+
+def _copy_data(src_fd, dst_fd):
+	"""Copy the rest of an open file to another open file.
+
+	Try copy_file_range(), which can share blocks or copy on the server on
+	some filesystems, then sendfile(), so the data doesn't pass through user
+	space, and finally fall back to reading and writing.
+	"""
+	methods = []
+	if hasattr(os, 'copy_file_range'):  # Python 3.8+ on Linux
+		methods.append(lambda: os.copy_file_range(src_fd, dst_fd, copy_chunk_size))
+	if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+		methods.append(lambda: os.sendfile(dst_fd, src_fd, None, copy_chunk_size))
+
+	for method in methods:
+		copied = 0
+		try:
+			while True:
+				n = method()
+				if not n:
+					return
+				copied += n
+		except OSError as e:
+			if copied or e.errno not in _copy_fallback_errors:
+				raise
+
+	while True:
+		data = os.read(src_fd, 1024 * 1024)
+		if not data:
+			return
+		view = memoryview(data)
+		while view:
+			view = view[os.write(dst_fd, view):]
+
+
+def _copy_noclobber(src, dst):
+	"""Copy a file to another filesystem without overwriting an existing
+	destination. Raise OSError on failure.
+
+	The data is copied to a temporary file in the destination directory and
+	flushed to disk, then checked against the source before the temporary
+	file is renamed into place, so a partial copy is never left under the
+	destination name. The permissions and modification time are preserved.
+	"""
+	if os.path.lexists(dst):  # Fail early rather than after the copy
+		raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), src, None, dst)
+
+	src_stat = os.stat(src)
+	dst_fd, tmp = tempfile.mkstemp(prefix='.sqrn_move_', dir=os.path.dirname(dst))
+	try:
+		try:
+			src_fd = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+			try:
+				_copy_data(src_fd, dst_fd)
+			finally:
+				os.close(src_fd)
+			os.fsync(dst_fd)
+			copied = os.fstat(dst_fd).st_size
+		finally:
+			os.close(dst_fd)
+
+		# Check the copy is complete, and that the source wasn't modified
+		# while it was being copied
+		new_stat = os.stat(src)
+		if copied != src_stat.st_size or new_stat.st_size != src_stat.st_size \
+		or new_stat.st_mtime != src_stat.st_mtime:
+			raise OSError(errno.EIO, "Copy does not match source", src, None, dst)
+
+		shutil.copystat(src, tmp)
+		_rename_noclobber(tmp, dst)
+
+	except BaseException:
+		try:
+			os.remove(tmp)
+		except OSError:
+			pass
+		raise
+
+
+def move(src, dst):
+	"""Move a file to another directory without overwriting an existing
+	destination.
+
+	Files are renamed if the destination is on the same filesystem, as for
+	rename(). Otherwise the file is copied, and the source is removed once
+	the copy has been verified. Return a tuple containing a success flag and
+	a message, in the same form as rename().
+	"""
+	try:
+		try:
+			_rename_noclobber(src, dst)
+			return True, "Moved '%s' to '%s'" % (src, dst)
+		except OSError as e:
+			if e.errno != errno.EXDEV:
+				raise
+		_copy_noclobber(src, dst)
+
+	except OSError as e:
+		return False, "Failed to move '%s' to '%s': %s" % (src, dst, e.strerror)
+
+	try:
+		os.remove(src)
+	except OSError as e:
+		return False, "Copied '%s' to '%s' but failed to remove the source: %s" % (src, dst, e.strerror)
+
+	return True, "Moved '%s' to '%s' (copied across filesystems)" % (src, dst)
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+
+# framemodel.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2018-2022
+#
+# Sequence Rename Tool Frame Model
+# A table model listing the individual files of a task, before and after the
+# rename operation. File names are computed from the frame ranges when a row
+# is painted, so the cost of opening the view doesn't depend on the length of
+# the sequence. Optionally, whether the files exist on disk is checked in the
+# background for the visible rows only.
+
+
+import os
+
+from Qt import QtCore
+
+# Import custom modules
+import frameset
+import rename
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+COLUMNS = ['Before', 'After', 'On Disk']
+BEFORE, AFTER, EXISTS = range(len(COLUMNS))
+
+# Maximum number of rows whose existence on disk is remembered
+exists_cache_size = 10000
+
+# Existence column text for each (source exists, destination exists) result
+EXISTS_TEXT = {
+	(True, False): "OK",
+	(True, True): "Destination exists",
+	(False, False): "Source missing",
+	(False, True): "Source missing, destination exists",
+}
+
+# ----------------------------------------------------------------------------
+# Sequence names class
+# ----------------------------------------------------------------------------
+
+class SequenceNames(object):
+	"""Random access to the file names described by a sequence string.
+
+	The frame range is stored as a frame set, so looking up the name for a
+	row takes constant memory regardless of the number of frames.
+	"""
+
+	def __init__(self, seq_str):
+		"""Parse the sequence string.
+
+		Arguments:
+			seq_str (str) -- a sequence string, e.g. 'name.[0001-0100].exr',
+				or a single file name.
+		"""
+		self.prefix, frames, self.ext = rename.parse_seq(seq_str)
+
+		if frames is None:  # Single file
+			self.frames = None
+			self.padding = 0
+		else:
+			self.frames, self.padding = frameset.parse(frames)
+
+
+	def __len__(self):
+		if self.frames is None:
+			return 1
+		return len(self.frames)
+
+
+	def frame(self, row):
+		"""Return the frame number at the given row, or None for a single
+		file.
+		"""
+		if self.frames is None:
+			return None
+		return self.frames.frame(row)
+
+
+	def name(self, row):
+		"""Return the file name at the given row."""
+
+		if self.frames is None:
+			return self.prefix
+		return self.prefix + str(self.frames.frame(row)).zfill(self.padding) + self.ext
+
+
+	def row_for_frame(self, frame):
+		"""Return the row of the given frame number.
+
+		If the frame isn't part of the sequence, return the row of the next
+		frame after it, or the last row if there are none.
+		"""
+		if self.frames is None:
+			return 0
+		return min(self.frames.position(frame), len(self.frames)-1)
+
+# ----------------------------------------------------------------------------
+# Frame model class
+# ----------------------------------------------------------------------------
+
+class FrameModel(QtCore.QAbstractTableModel):
+	"""Flat table of the source and destination file names of a task."""
+
+	def __init__(self, path, before, after, parent=None, dst_path=None):
+		"""Initialise the model.
+
+		Arguments:
+			path (str) -- the directory containing the files.
+			before (str) -- the source sequence string.
+			after (str) -- the destination sequence string.
+			dst_path (str, optional) -- the destination directory, if
+				different from path.
+		"""
+		super(FrameModel, self).__init__(parent)
+		self.path = path
+		self.dst_path = dst_path or path
+		self.before = SequenceNames(before)
+		self.after = SequenceNames(after)
+
+		self._count = min(len(self.before), len(self.after))
+		self._exists = {}  # Row -> (source exists, destination exists)
+
+
+	def pair(self, row):
+		"""Return the source and destination file paths at the given row."""
+
+		return (os.path.join(self.path, self.before.name(row)),
+		        os.path.join(self.dst_path, self.after.name(row)))
+
+
+	def row_for_frame(self, frame):
+		"""Return the row of the given source frame number."""
+
+		return min(self.before.row_for_frame(frame), self._count-1)
+
+
+	def sample_rows(self, size):
+		"""Return up to the given number of rows, evenly spread across the
+		model and including the first and last rows.
+		"""
+		if self._count <= size:
+			return range(self._count)
+
+		step = (self._count-1) / float(size-1)
+		return sorted(set(int(round(i*step)) for i in range(size)))
+
+
+	def unchecked_rows(self, first, last):
+		"""Return the rows in the given range which haven't been checked for
+		existence on disk.
+		"""
+		return [row for row in range(max(0, first), min(last+1, self._count))
+			if row not in self._exists]
+
+
+	def set_exists(self, results):
+		"""Store the results of an existence check and update the view.
+
+		Arguments:
+			results (tuple) -- (row, (source exists, destination exists))
+				tuples.
+		"""
+		if not results:
+			return
+
+		results = dict(results)
+		if len(self._exists) + len(results) > exists_cache_size:
+			self._exists.clear()  # Only the visible rows matter
+		self._exists.update(results)
+
+		self.dataChanged.emit(
+			self.index(min(results), EXISTS), self.index(max(results), EXISTS))
+
+
+	def clear_exists(self):
+		"""Forget the results of existence checks, e.g. to check again."""
+
+		self._exists.clear()
+		if self._count:
+			self.dataChanged.emit(
+				self.index(0, EXISTS), self.index(self._count-1, EXISTS))
+
+
+	def rowCount(self, parent=QtCore.QModelIndex()):
+		if parent.isValid():
+			return 0
+		return self._count
+
+
+	def columnCount(self, parent=QtCore.QModelIndex()):
+		return len(COLUMNS)
+
+
+	def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+		if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+			return COLUMNS[section]
+
+
+	def data(self, index, role=QtCore.Qt.DisplayRole):
+		if not index.isValid() or role != QtCore.Qt.DisplayRole:
+			return None
+
+		row = index.row()
+		column = index.column()
+
+		if column == BEFORE:
+			return self.before.name(row)
+		elif column == AFTER:
+			return self.after.name(row)
+		elif column == EXISTS:
+			result = self._exists.get(row)
+			if result is not None:
+				return EXISTS_TEXT[result]
+
+		return None
+
+# ----------------------------------------------------------------------------
+# Existence checker thread class
+# ----------------------------------------------------------------------------
+
+class ExistenceChecker(QtCore.QThread):
+	"""Worker thread to check whether the files of some rows exist."""
+
+	# Create signals
+	rowsChecked = QtCore.Signal(tuple)
+
+	def __init__(self, pairs, parent=None):
+		"""Initialise thread.
+
+		Arguments:
+			pairs (list) -- list of (row, source path, destination path)
+				tuples to check.
+		"""
+		QtCore.QThread.__init__(self, parent)
+		self.pairs = pairs
+
+
+	def run(self):
+		results = []
+		for row, src, dst in self.pairs:
+			if self.isInterruptionRequested():
+				break
+			results.append((row, (os.path.isfile(src), os.path.isfile(dst))))
+
+		self.rowsChecked.emit(tuple(results))
@@ -0,0 +1,295 @@
+#!/usr/bin/python
+
+# frameset.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Run-length encoded sets of frame numbers. A frame set is stored as a sorted
+# list of disjoint (start, end, step) runs, so operations on long sequences
+# cost time in proportion to the number of runs rather than the number of
+# frames.
+
+
+import bisect
+import re
+
+
+_num_range_token = re.compile(r'^\s*(-?\d+)(?:\s*-\s*(-?\d+)(?:\s*x\s*(\d+))?)?\s*$')
+
+
+def _count(run):
+	"""Return the number of frames in a run."""
+
+	start, end, step = run
+	return (end-start)//step + 1
+
+
+def _append(runs, run):
+	"""Append a run to a normalised list of runs, merging it with the last
+	run if it continues the same progression.
+
+	The run must start after the end of the last run.
+	"""
+	if runs:
+		last_start, last_end, last_step = runs[-1]
+		start, end, step = run
+		if last_start < last_end:
+			gap = last_step
+		else:  # Single frame, so any step will do
+			gap = start - last_end
+		if start - last_end == gap and (start == end or step == gap):
+			runs[-1] = (last_start, end, gap)
+			return
+
+	runs.append(run)
+
+
+def _normalise(runs):
+	"""Return a sorted list of disjoint runs describing the same frames.
+
+	Empty runs are dropped and the end of each run is clamped to its last
+	frame. Overlapping runs are expanded and merged.
+	"""
+	clean = []
+	for start, end, step in runs:
+		if end < start:
+			continue
+		if step < 1 or start == end:
+			step = 1
+		clean.append((start, start + (end-start)//step*step, step))
+	clean.sort()
+
+	result = []
+	for run in clean:
+		if result and run[0] <= result[-1][1]:  # Overlap
+			nums = set(range(run[0], run[1]+1, run[2]))
+			while result and result[-1][1] >= run[0]:
+				start, end, step = result.pop()
+				nums.update(range(start, end+1, step))
+			for num in sorted(nums):
+				_append(result, (num, num, 1))
+		else:
+			_append(result, run)
+
+	return result
+
+
+def parse(num_range_str):
+	"""Parse a frame range string.
+
+	Return a FrameSet and the padding of the numbers, as a tuple. The padding
+	is taken from the first number. Raise ValueError if the string is
+	malformed.
+
+	Arguments:
+		num_range_str (str) -- a range string, e.g. '0001-0050, 0060-0100x2'
+	"""
+	runs = []
+	padding = None
+
+	for token in num_range_str.split(','):
+		if not token.strip():
+			continue
+
+		match = _num_range_token.match(token)
+		if not match:
+			raise ValueError("Invalid frame range: %s" % token.strip())
+
+		start, end, step = match.groups()
+		if padding is None:
+			padding = len(start.lstrip('-'))
+		start = int(start)
+		runs.append((start, int(end) if end else start, int(step) if step else 1))
+
+	return FrameSet(runs), padding or 1
+
+
+class FrameSet(object):
+	"""An immutable, sorted set of frame numbers stored as runs."""
+
+	def __init__(self, runs=()):
+		"""Initialise the frame set.
+
+		Arguments:
+			runs (iterable, optional) -- (start, end, step) tuples, in any
+				order. Overlapping runs are merged.
+		"""
+		self.runs = _normalise(runs)
+
+		self._starts = [run[0] for run in self.runs]
+		self._offsets = []  # Position of the first frame of each run
+		self._len = 0
+		for run in self.runs:
+			self._offsets.append(self._len)
+			self._len += _count(run)
+
+
+	@classmethod
+	def from_list(cls, nums):
+		"""Create a frame set from an iterable of frame numbers."""
+
+		return cls((num, num, 1) for num in nums)
+
+
+	def __len__(self):
+		return self._len
+
+
+	def __bool__(self):
+		return bool(self.runs)
+
+
+	def __iter__(self):
+		for start, end, step in self.runs:
+			for num in range(start, end+1, step):
+				yield num
+
+
+	def __contains__(self, num):
+		return self.index(num) is not None
+
+
+	def __eq__(self, other):
+		return isinstance(other, FrameSet) and self.runs == other.runs
+
+
+	def __ne__(self, other):
+		return not self == other
+
+
+	def __repr__(self):
+		return "FrameSet(%r)" % self.runs
+
+
+	def __str__(self):
+		return self.format()
+
+
+	def min(self):
+		"""Return the lowest frame number. Raise ValueError if empty."""
+
+		if not self.runs:
+			raise ValueError("Frame set is empty")
+		return self.runs[0][0]
+
+
+	def max(self):
+		"""Return the highest frame number. Raise ValueError if empty."""
+
+		if not self.runs:
+			raise ValueError("Frame set is empty")
+		return self.runs[-1][1]
+
+
+	def frame(self, position):
+		"""Return the frame number at the given position, counting from 0."""
+
+		if not 0 <= position < self._len:
+			raise IndexError("Frame set position out of range")
+		i = bisect.bisect_right(self._offsets, position) - 1
+		start, end, step = self.runs[i]
+		return start + (position-self._offsets[i])*step
+
+
+	def index(self, num):
+		"""Return the position of a frame number, or None if it isn't in the
+		set.
+		"""
+		i = bisect.bisect_right(self._starts, num) - 1
+		if i < 0:
+			return None
+		start, end, step = self.runs[i]
+		if num > end or (num-start) % step:
+			return None
+		return self._offsets[i] + (num-start)//step
+
+
+	def position(self, num):
+		"""Return the position of the first frame number greater than or
+		equal to the given number. This is len(self) if there are none.
+		"""
+		i = bisect.bisect_right(self._starts, num) - 1
+		if i < 0:
+			return 0
+		start, end, step = self.runs[i]
+		if num > end:
+			return self._offsets[i] + _count(self.runs[i])
+		return self._offsets[i] + (num-start + step-1)//step
+
+
+	def offset(self, amount):
+		"""Return a new frame set with every frame shifted by an amount."""
+
+		return FrameSet((start+amount, end+amount, step) for start, end, step in self.runs)
+
+
+	def rescale(self, factor):
+		"""Return a new frame set with every frame multiplied by a positive
+		integer factor.
+		"""
+		return FrameSet((start*factor, end*factor, step*factor) for start, end, step in self.runs)
+
+
+	def union(self, other):
+		"""Return a new frame set containing the frames of both sets."""
+
+		return FrameSet(self.runs + other.runs)
+
+
+	def renumber(self, start=1, step=1):
+		"""Return a new frame set with the same number of frames, numbered
+		consecutively from start in increments of step. Raise ValueError if
+		the step is less than 1, as the frames would collapse.
+		"""
+		if step < 1:
+			raise ValueError("Invalid renumbering step: %s" % step)
+		if not self._len:
+			return FrameSet()
+		return FrameSet([(start, start + (self._len-1)*step, step)])
+
+
+	def split(self, count):
+		"""Split the frame set after the given number of frames.
+
+		Return the frame sets of the first part and the remainder, as a tuple.
+		"""
+		head = []
+		tail = []
+		for run in self.runs:
+			start, end, step = run
+			length = _count(run)
+			if count >= length:
+				head.append(run)
+			elif count <= 0:
+				tail.append(run)
+			else:
+				split = start + count*step
+				head.append((start, split-step, step))
+				tail.append((split, end, step))
+			count -= length
+
+		return FrameSet(head), FrameSet(tail)
+
+
+	def format(self, padding=1):
+		"""Return the frame set as a frame range string, e.g.
+		'0001-0050, 0060-0100x2'.
+
+		Arguments:
+			padding (int, optional) -- min number of digits for padding
+				numbers.
+		"""
+		tokens = []
+		for start, end, step in self.runs:
+			if start == end:
+				tokens.append(str(start).zfill(padding))
+			elif end - start == step:  # Two frames
+				tokens.append(str(start).zfill(padding))
+				tokens.append(str(end).zfill(padding))
+			elif step == 1:
+				tokens.append("%s-%s" % (str(start).zfill(padding), str(end).zfill(padding)))
+			else:
+				tokens.append("%s-%sx%d" % (str(start).zfill(padding), str(end).zfill(padding), step))
+
+		return ", ".join(tokens)
@@ -0,0 +1,370 @@
+#!/usr/bin/python
+
+# ingest.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Directory Ingestion
+# Detects file sequences in a directory tree. Directories are read on a pool
+# of threads through the shared directory cache, and sequences are detected
+# from the names already read, so each directory is only listed once per
+# change. Results are yielded in batches as they're found, so the first
+# sequences can be shown before the whole tree has been scanned.
+#
+# This is the only place sequences are detected. It follows the semantics
+# of the sequence.py library it replaced, called with delimiter="" and
+# ignorePadding=False, which tests/test_ingest.py checks.
+
+
+import collections
+import concurrent.futures
+import fnmatch
+import os
+import re
+import time
+
+# Import custom modules
+import dircache
+import frameset
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Number of directories to read concurrently
+ingest_workers = 8
+
+# Maximum number of sequences in a batch
+batch_size = 500
+
+# Maximum time in seconds to hold sequences before yielding a batch
+batch_interval = 0.1
+
+_frame_pattern = re.compile(r'^(.*?)(\d+)(\.[^.]*)?$')
+
+# ----------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------
+
+def split_name(name):
+	"""Split a file name into its prefix, frame number and extension.
+
+	Return a tuple containing the prefix, the frame number as a string and
+	the extension. If the name has no frame number, e.g. 'file.txt', the
+	frame number is None.
+
+	Arguments:
+		name (str) -- the file name, e.g. 'name.0001.exr'
+	"""
+	match = _frame_pattern.match(name)
+	if match:
+		prefix, num, ext = match.groups()
+
+		# Digits at the end of an extension, e.g. 'clip.mp4', aren't a frame
+		# number
+		if ext or '.' not in prefix or not prefix.rsplit('.', 1)[1]:
+			return prefix, num, ext or ""
+
+	prefix, ext = os.path.splitext(name)
+	return prefix, None, ext
+
+
+def _is_padded(num):
+	"""Return True if a frame number string has leading zeros."""
+
+	return len(num) > 1 and num.startswith('0')
+
+
+def padding_key(frames):
+	"""Return the padding which distinguishes a sequence from others with
+	the same prefix and extension.
+
+	This is the number of digits if the frame numbers are zero-padded, 1 if
+	they aren't, or None for a single file without a frame number.
+
+	Arguments:
+		frames (str) -- the frame range string, e.g. '0001-0100'.
+	"""
+	if not frames:
+		return None
+	first = frames.split(',')[0].strip().lstrip('-').split('-')[0]
+	return len(first) if _is_padded(first) else 1
+
+
+def sequence_key(seq):
+	"""Return the (prefix, ext, padding) key identifying a sequence tuple
+	within its directory.
+	"""
+	path, prefix, frames, ext, count = seq
+	return prefix, ext, padding_key(frames)
+
+
+def _group_by_padding(nums):
+	"""Split the frame number strings of files sharing a prefix and
+	extension into sequences with consistent padding.
+
+	Zero-padded numbers with different numbers of digits belong to
+	different sequences, e.g. 'a.001' and 'a.0003'. A number without
+	leading zeros, e.g. '1000', could belong to any sequence padded to at
+	most its length, so it joins the one with the most padding.
+
+	Return a dict mapping each padding, as described for padding_key(), to
+	a list of the frame number strings.
+	"""
+	groups = {}
+	unpadded = []
+	for num in nums:
+		if _is_padded(num):
+			groups.setdefault(len(num), []).append(num)
+		else:
+			unpadded.append(num)
+
+	paddings = sorted(groups, reverse=True)
+	for num in unpadded:
+		padding = next((p for p in paddings if p <= len(num)), 1)
+		groups.setdefault(padding, []).append(num)
+
+	return groups
+
+
+def _make_sequence(dirpath, prefix, ext, padding, nums):
+	"""Return a sequence tuple for a group of frame number strings."""
+
+	if padding is None:
+		return dirpath, prefix, "", ext, 1
+	frames = frameset.FrameSet.from_list(int(num) for num in nums)
+	return dirpath, prefix, frames.format(padding), ext, len(frames)
+
+
+def _detect_groups(names):
+	"""Group file names into sequences.
+
+	Return a dict mapping (prefix, ext, padding) keys, as returned by
+	sequence_key(), to lists of frame number strings.
+	"""
+	by_name = collections.defaultdict(list)
+	for name in names:
+		prefix, num, ext = split_name(name)
+		by_name[(prefix, ext)].append(num)
+
+	groups = {}
+	for (prefix, ext), nums in by_name.items():
+		if None in nums:  # A file without a frame number
+			groups[(prefix, ext, None)] = []
+		nums = [num for num in nums if num is not None]
+		for padding, group in _group_by_padding(nums).items():
+			groups[(prefix, ext, padding)] = group
+
+	return groups
+
+
+def detect_sequences(dirpath, names):
+	"""Group file names into sequences.
+
+	Return a list of (path, prefix, frames, ext, count) tuples, as used to
+	create tasks, sorted by prefix, extension and padding. Files with the
+	same prefix and extension but differently padded frame numbers form
+	separate sequences. Files without a frame number are returned as
+	single files with an empty frame range.
+
+	Arguments:
+		dirpath (str) -- the directory containing the files.
+		names (iterable) -- the file names.
+	"""
+	groups = _detect_groups(names)
+	return [_make_sequence(dirpath, prefix, ext, padding, groups[(prefix, ext, padding)])
+		for prefix, ext, padding in sorted(groups, key=lambda key: key[:2] + (key[2] or 0, ))]
+
+
+def parse_patterns(text):
+	"""Return a list of file name patterns from a string of patterns
+	separated by spaces or commas, e.g. '*.exr, *.dpx'.
+	"""
+	return [pattern for pattern in re.split(r'[\s,]+', text) if pattern]
+
+
+def matches(name, patterns):
+	"""Return True if the name matches any of the given glob patterns."""
+
+	return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def scan_dir(dirpath, include=(), exclude=()):
+	"""Read a directory and detect the sequences in it.
+
+	Symbolic links to directories aren't followed. Raise OSError if the
+	directory can't be read.
+
+	Return a list of sequences, as described for detect_sequences(), and a
+	list of subdirectory paths, as a tuple.
+
+	Arguments:
+		dirpath (str) -- the directory to read.
+		include (list, optional) -- only detect files whose names match one
+			of these glob patterns.
+		exclude (list, optional) -- skip files and subdirectories whose
+			names match any of these glob patterns.
+	"""
+	snapshot = dircache.get(dirpath)
+
+	names = snapshot.files
+	subdirs = snapshot.dirs
+	if include:
+		names = [name for name in names if matches(name, include)]
+	if exclude:
+		names = [name for name in names if not matches(name, exclude)]
+		subdirs = [name for name in subdirs if not matches(name, exclude)]
+
+	return detect_sequences(dirpath, names), sorted(os.path.join(dirpath, name) for name in subdirs)
+
+
+def detect_file(filepath):
+	"""Detect the sequence a file belongs to.
+
+	Return a (path, prefix, frames, ext, count) tuple, as described for
+	detect_sequences(), or None if the file doesn't exist.
+
+	Arguments:
+		filepath (str) -- the path of a file in the sequence.
+	"""
+	dirpath, name = os.path.split(filepath)
+	try:
+		snapshot = dircache.get(dirpath)
+		if name not in snapshot:  # The file may have just been created
+			snapshot = dircache.get(dirpath, refresh=True)
+	except OSError:
+		return None
+	if name not in snapshot:
+		return None
+
+	prefix, num, ext = split_name(name)
+	names = [n for n in snapshot.files if n.startswith(prefix) and n.endswith(ext)]
+	for key, nums in _detect_groups(names).items():
+		if key[:2] == (prefix, ext) and (num in nums if num is not None else key[2] is None):
+			return _make_sequence(dirpath, prefix, ext, key[2], nums)
+
+
+def rescan(dirpath, names=None, known=(), include=(), exclude=()):
+	"""Detect the sequences affected by changes to files in a directory.
+
+	Return a dict mapping the (prefix, ext, padding) key of each affected
+	sequence, as returned by sequence_key(), to a sequence tuple, as
+	described for detect_sequences(), or to None if none of its files exist
+	any more. Raise OSError if the directory can't be read.
+
+	Arguments:
+		dirpath (str) -- the directory containing the changed files.
+		names (iterable, optional) -- the names of the changed files. If not
+			specified, every sequence in the directory may have changed.
+		known (set, optional) -- the keys of the sequences already known.
+			These are always detected, while new sequences are subject to
+			the include and exclude patterns.
+		include (list, optional) -- file name glob patterns to include.
+		exclude (list, optional) -- file name glob patterns to exclude.
+	"""
+	snapshot = dircache.get(dirpath)
+
+	known_names = set(key[:2] for key in known)
+	if names is None:
+		affected = known_names
+	else:
+		affected = set(split_name(name)[::2] for name in names)
+
+	# Every file sharing a prefix and extension with a changed file is
+	# needed, as the padding of the sequences may have changed
+	candidates = []
+	for name in snapshot.files:
+		prefix, num, ext = split_name(name)
+		if names is not None and (prefix, ext) not in affected:
+			continue
+		if (prefix, ext) not in known_names:
+			if include and not matches(name, include):
+				continue
+			if exclude and matches(name, exclude):
+				continue
+		candidates.append(name)
+
+	sequences = dict((key, None) for key in known if key[:2] in affected)
+	for key, nums in _detect_groups(candidates).items():
+		sequences[key] = _make_sequence(dirpath, key[0], key[1], key[2], nums)
+
+	return sequences
+
+
+def walk(roots, max_depth=0, include=(), exclude=(),
+	workers=ingest_workers, control=None, on_error=None):
+	"""Detect the sequences in one or more directory trees.
+
+	Directories are read concurrently. Yield lists of sequences, as
+	described for detect_sequences(), as they're found. The first batch is
+	yielded as soon as any sequences are found, then further batches at
+	most every batch_interval seconds, or when batch_size sequences are
+	waiting.
+
+	Arguments:
+		roots (list) -- the directories to scan.
+		max_depth (int, optional) -- the number of levels of subdirectories
+			to scan. 0 scans the given directories only, and None scans the
+			whole tree.
+		include (list, optional) -- file name glob patterns to include.
+		exclude (list, optional) -- file and directory name glob patterns
+			to exclude.
+		workers (int, optional) -- the number of directories to read
+			concurrently.
+		control (JobControl, optional) -- cancellation token. Directories
+			already being read are finished, but no more are started, and
+			no further batches are yielded.
+		on_error (callable, optional) -- called with the path and exception
+			for each directory which can't be read.
+	"""
+	pending = {}  # Future -> (directory path, depth)
+	batch = []
+	last_batch = 0.0  # Yield the first batch immediately
+
+	executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers))
+	try:
+		for root in roots:
+			future = executor.submit(scan_dir, root, include, exclude)
+			pending[future] = (root, 0)
+
+		while pending:
+			if control is not None and control.is_cancelled():
+				break
+
+			done, not_done = concurrent.futures.wait(pending,
+				timeout=batch_interval,
+				return_when=concurrent.futures.FIRST_COMPLETED)
+
+			for future in done:
+				dirpath, depth = pending.pop(future)
+				try:
+					sequences, subdirs = future.result()
+				except OSError as e:
+					if on_error is not None:
+						on_error(dirpath, e)
+					continue
+
+				batch.extend(sequences)
+				if max_depth is None or depth < max_depth:
+					for subdir in subdirs:
+						future = executor.submit(scan_dir, subdir, include, exclude)
+						pending[future] = (subdir, depth+1)
+
+			now = time.time()
+			if batch and (not pending or len(batch) >= batch_size
+			              or now - last_batch >= batch_interval):
+				yield batch
+				batch = []
+				last_batch = now
+
+		# Sequences found after a cancel are dropped, as the caller has
+		# stopped expecting them
+		if batch and not (control is not None and control.is_cancelled()):
+			yield batch
+
+	finally:
+		for future in pending:
+			future.cancel()
+		executor.shutdown(wait=True)
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+# jobcontrol.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Cooperative cancellation and pausing for rename jobs. The job checks the
+# token between files, so it never stops part way through renaming a file.
+# Parts of a job, e.g. a task which has failed, can also be aborted on their
+# own while the rest of the job continues.
+
+
+import threading
+
+
+class JobControl(object):
+	"""Thread-safe cancel / pause token shared between a job and its
+	controller.
+	"""
+
+	def __init__(self):
+		self._cancelled = threading.Event()
+		self._running = threading.Event()
+		self._running.set()
+		self._aborted = set()  # Keys of the parts of the job aborted
+		self._lock = threading.Lock()
+
+
+	def cancel(self):
+		"""Request the job to stop. A paused job is woken up to stop."""
+
+		self._cancelled.set()
+		self._running.set()
+
+
+	def pause(self):
+		"""Request the job to pause before processing the next file."""
+
+		if not self._cancelled.is_set():
+			self._running.clear()
+
+
+	def resume(self):
+		"""Resume a paused job from where it left off."""
+
+		self._running.set()
+
+
+	def abort(self, key):
+		"""Request one part of the job, identified by a key such as a task
+		ID, to stop before processing its next file. Work on it which is
+		already in progress on other threads stops too.
+		"""
+		with self._lock:
+			self._aborted.add(key)
+
+
+	def is_aborted(self, key):
+		with self._lock:
+			return key in self._aborted
+
+
+	def is_cancelled(self):
+		return self._cancelled.is_set()
+
+
+	def is_paused(self):
+		return not self._running.is_set()
+
+
+	def wait(self):
+		"""Block while the job is paused.
+
+		Return False if the job has been cancelled, otherwise True.
+		"""
+		self._running.wait()
+		return not self._cancelled.is_set()
@@ -0,0 +1,360 @@
+#!/usr/bin/python
+
+# regexsandbox.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Regex Sandbox
+# Evaluates find & replace patterns in a worker process with a time limit.
+# A pattern with catastrophic backtracking can run for practically forever,
+# and a thread can't be interrupted while it's matching, so if the limit is
+# exceeded the worker process is killed instead. A new worker is started
+# for the next pattern.
+#
+# The worker runs this module as a script with a standalone Python
+# interpreter, so it only imports what it needs, rather than the
+# application's main module as multiprocessing's spawn method would. This
+# also works when embedded in an application such as Maya, where
+# sys.executable isn't a Python interpreter. Requests and results are
+# pickled over the worker's standard input and output.
+
+
+import atexit
+import collections
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+# Import custom modules
+import rename
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Default maximum time in seconds a pattern may take to evaluate
+regex_timeout = 1.0
+
+# Maximum time in seconds to wait for a worker process to start
+start_timeout = 10.0
+
+# Interval in seconds at which to call the wait callback
+poll_interval = 0.02
+
+# Number of patterns which exceeded the time limit to remember
+slow_pattern_cache_size = 64
+
+# Names of executables which are Python interpreters, in order of preference
+python_names = ['python', 'python3', 'mayapy', 'hython']
+
+# ----------------------------------------------------------------------------
+# Exceptions
+# ----------------------------------------------------------------------------
+
+class PatternTimeout(Exception):
+	"""Raised when a pattern takes longer than the time limit."""
+
+
+class Superseded(Exception):
+	"""Raised when waiting for a result is abandoned, e.g. because the
+	pattern has been changed.
+	"""
+
+# ----------------------------------------------------------------------------
+# Worker process
+# ----------------------------------------------------------------------------
+
+def find_python():
+	"""Return the path of a Python interpreter to run the worker with, or
+	None if there isn't one.
+
+	This is the current interpreter, unless Python is embedded in another
+	application, in which case an interpreter is looked for alongside it.
+	"""
+	candidates = [sys.executable, getattr(sys, '_base_executable', None)]
+	for path in candidates[:]:
+		if path:
+			dirpath = os.path.dirname(path)
+			for name in python_names:
+				candidates.append(os.path.join(dirpath, name))
+				candidates.append(os.path.join(dirpath, name + '.exe'))
+
+	for path in candidates:
+		if not path or not os.path.isfile(path) or not os.access(path, os.X_OK):
+			continue
+		name = os.path.splitext(os.path.basename(path))[0].lower()
+		if any(name.startswith(python_name) for python_name in python_names):
+			return path
+
+
+def _worker():
+	"""Main loop of the worker process.
+
+	Receives (request ID, arguments) tuples and sends back (request ID,
+	result) tuples, where the arguments and result are as for
+	rename.replace_text_many(). Stops when its input is closed.
+	"""
+	stdin = sys.stdin.buffer
+	stdout = sys.stdout.buffer
+	pickle.dump(None, stdout)  # Ready
+	stdout.flush()
+	while True:
+		try:
+			request_id, args = pickle.load(stdin)
+		except (EOFError, OSError, pickle.UnpicklingError):
+			return
+		pickle.dump((request_id, rename.replace_text_many(*args)), stdout)
+		stdout.flush()
+
+
+_EOF = object()  # Queued when the worker's output is closed
+
+
+def _read_output(stream, messages):
+	"""Queue the messages sent by a worker process until its output is
+	closed. Runs on a background thread.
+	"""
+	while True:
+		try:
+			messages.put(pickle.load(stream))
+		except Exception:  # EOF, or the worker was killed mid-message
+			messages.put(_EOF)
+			return
+
+# ----------------------------------------------------------------------------
+# Sandbox class
+# ----------------------------------------------------------------------------
+
+class RegexSandbox(object):
+	"""Runs text substitutions in a worker process with a time limit.
+
+	Not thread-safe, but may be called again from the wait callback, in
+	which case the outer call is superseded. The worker is kept when a
+	request is superseded, and only killed if a request actually exceeds
+	the time limit.
+	"""
+
+	def __init__(self, timeout=None):
+		"""Initialise the sandbox. The worker process is started on demand.
+
+		Arguments:
+			timeout (float, optional) -- the maximum time in seconds a
+				pattern may take to evaluate. Defaults to regex_timeout.
+		"""
+		self.timeout = regex_timeout if timeout is None else timeout
+		self._process = None
+		self._messages = None  # Queue of messages from the worker
+		self._ready = False  # Whether the worker has started
+		self._request_id = 0
+		self._pending = collections.OrderedDict()  # Request ID -> (pattern key, deadline), in order sent
+		self._slow = collections.OrderedDict()  # Patterns which timed out
+		self._unavailable = False  # Whether the worker failed to start
+		atexit.register(self.stop)
+
+
+	def start(self):
+		"""Start the worker process in the background, if not running."""
+
+		if self._process is not None or self._unavailable:
+			return
+
+		python = find_python()
+		if python is None:
+			self._unavailable = True
+			return
+
+		try:
+			process = subprocess.Popen(
+				[python, os.path.abspath(__file__)],
+				stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+				creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+		except (OSError, ValueError):
+			self._unavailable = True
+			return
+
+		self._process = process
+		self._messages = queue.Queue()
+		self._ready = False
+		self._pending.clear()
+		reader = threading.Thread(target=_read_output,
+			args=(process.stdout, self._messages), name="RegexSandbox")
+		reader.daemon = True
+		reader.start()
+
+
+	def stop(self):
+		"""Kill the worker process, if running."""
+
+		if self._process is None:
+			return
+
+		self._process.kill()
+		self._process.wait()
+		try:
+			self._process.stdin.close()
+		except OSError:  # Unsent data can't be flushed
+			pass
+		self._process = None
+		self._messages = None
+		self._pending.clear()
+
+
+	def is_slow(self, find_str, ignore_case=False):
+		"""Return True if the pattern has previously exceeded the time
+		limit.
+		"""
+		return (find_str, ignore_case) in self._slow
+
+
+	def replace_many(self, input_strs, find_str, replace_str,
+		ignore_case=False, regex=True, on_wait=None):
+		"""Find and replace text in a list of strings, as for
+		rename.replace_text_many(), in the worker process.
+
+		Return a list of new strings, or None if the regular expression is
+		invalid. Raise PatternTimeout if the pattern takes longer than the
+		time limit, or has done before. If the worker process can't be
+		started, the substitution is performed in this process instead.
+
+		Arguments:
+			input_strs (list) -- the input strings to modify
+			find_str (str) -- the text to find in the input text
+			replace_str (str) -- the text to replace the find text with
+		Keyword arguments:
+			ignore_case (bool) -- perform case-insensitive search if True
+			regex (bool) -- interpret the find text string as a regular
+				expression
+			on_wait (callable) -- called repeatedly while waiting for the
+				result. If it returns False, the result is abandoned and
+				Superseded is raised.
+		"""
+		args = (list(input_strs), find_str, replace_str, ignore_case, regex)
+
+		# Literal text can't backtrack catastrophically
+		if not find_str or not regex:
+			return rename.replace_text_many(*args)
+
+		key = (find_str, ignore_case)
+		if key in self._slow:
+			raise PatternTimeout(find_str)
+
+		self.start()
+		if self._unavailable:
+			return rename.replace_text_many(*args)
+
+		self._request_id += 1
+		request_id = self._request_id
+
+		if not self._ready and not self._wait_ready(request_id, on_wait):
+			# Fall back to running in this process
+			self.stop()
+			self._unavailable = True
+			return rename.replace_text_many(*args)
+
+		# The worker handles requests in order, so the time limit starts
+		# when any superseded requests still in progress are due to finish
+		now = time.time()
+		deadline = max([now] + [d for k, d in self._pending.values()]) + self.timeout
+		self._pending[request_id] = (key, deadline)
+		try:
+			pickle.dump((request_id, args), self._process.stdin)
+			self._process.stdin.flush()
+			found, result = self._wait(request_id, on_wait)
+		except OSError:  # The worker process died
+			found = False
+		if found:
+			return result
+
+		# The request timed out, or the pattern caused the worker to die
+		slow_key = self._timed_out()
+		if slow_key == key:
+			raise PatternTimeout(find_str)
+
+		# An earlier, superseded request was to blame, so try again with a
+		# new worker
+		return self.replace_many(input_strs, find_str, replace_str,
+			ignore_case, regex, on_wait)
+
+
+	def _wait_ready(self, request_id, on_wait):
+		"""Wait for the worker to start.
+
+		Return False if it fails to start, or takes longer than
+		start_timeout. Raise Superseded as described for _wait().
+		"""
+		deadline = time.time() + start_timeout
+		while time.time() < deadline:
+			try:
+				message = self._messages.get(timeout=poll_interval)
+			except queue.Empty:
+				self._check_superseded(request_id, on_wait)
+				continue
+			if message is _EOF:  # The worker exited, e.g. an import failed
+				return False
+			self._ready = True
+			return True
+		return False
+
+
+	def _wait(self, request_id, on_wait):
+		"""Wait for the result of a request.
+
+		Return a tuple containing True and the result, or False and None if
+		the earliest request in progress exceeds its time limit or the
+		worker dies. Results of superseded requests are discarded. Raise
+		Superseded if the wait callback returns False, or the request has
+		been replaced by a call from the callback.
+		"""
+		messages = self._messages
+		while True:
+			try:
+				message = messages.get(timeout=poll_interval)
+			except queue.Empty:
+				self._check_superseded(request_id, on_wait)
+				if self._messages is not messages:  # Killed by a nested call
+					raise Superseded()
+				if time.time() > next(iter(self._pending.values()))[1]:
+					return False, None
+				continue
+
+			if message is _EOF:
+				return False, None
+
+			result_id, result = message
+			self._pending.pop(result_id, None)
+			if result_id == request_id:
+				return True, result
+
+
+	def _check_superseded(self, request_id, on_wait):
+		"""Raise Superseded if the wait callback returns False, or the
+		request has been replaced by a call from the callback.
+		"""
+		if on_wait is not None and not on_wait():
+			raise Superseded()
+		if request_id != self._request_id:
+			raise Superseded()
+
+
+	def _timed_out(self):
+		"""Kill the worker after the earliest request in progress exceeded
+		its time limit, and remember the pattern as slow.
+
+		Return the key of the slow pattern.
+		"""
+		key = next(iter(self._pending.values()))[0]
+		self.stop()
+		self._slow[key] = True
+		if len(self._slow) > slow_pattern_cache_size:
+			self._slow.popitem(last=False)
+		return key
+
+
+if __name__ == '__main__':
+	_worker()
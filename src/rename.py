@@ -8,25 +8,38 @@
 # Functions for renaming and renumbering.
 
 
+import os
 import re
 
+from collections import OrderedDict
 
-def replace_text(input_str, find_str, replace_str, 
-	ignore_case=False, regex=True, quiet=True):
-	"""Find and replace text in a string.
+# Import custom modules
+import frameset
+
+
+# Maximum number of compiled find patterns to keep in memory
+PATTERN_CACHE_SIZE = 64
+
+_pattern_cache = OrderedDict()
 
-	Return the new text as a string.
+
+def compile_pattern(find_str, ignore_case=False, regex=True):
+	"""Compile a find string into a regular expression pattern object.
+
+	Compiled patterns are kept in a bounded LRU cache keyed by the find
+	string and options, so repeated previews don't recompile the same
+	pattern. Raise re.error if the find string is not a valid regex.
 
 	Arguments:
-		input_str (str) -- the input text to modify
-		find_str (str) -- the text to find in the input text
-		replace_str (str) -- the text to replace the find text with
+		find_str (str) -- the text to find
 	Keyword arguments:
 		ignore_case (bool) -- perform case-insensitive search if True
 		regex (bool) -- interpret the find text string as a regular expression
-		quiet (bool) -- don't print any output if True
 	"""
+	key = (find_str, ignore_case, regex)
 	try:
+		pattern = _pattern_cache.pop(key)
+	except KeyError:
 		# If find_str is not designated as regex, escape all special characters
 		if not regex:
 			find_str = re.escape(find_str)
@@ -36,30 +49,77 @@ def replace_text(input_str, find_str, replace_str,
 		else:
 			pattern = re.compile(r"%s" % find_str)
 
-		# Perform replacement and return new name if input is valid
-		if find_str:
-			new_name = pattern.sub(replace_str, input_str)
-			return new_name
+		if len(_pattern_cache) >= PATTERN_CACHE_SIZE:
+			_pattern_cache.popitem(last=False)
 
-		else:
-			if not quiet:
-				print("Warning: No search string specified.")
-			return input_str
+	_pattern_cache[key] = pattern  # Most recently used goes last
+	return pattern
 
-	except:
+
+def replace_text(input_str, find_str, replace_str, 
+	ignore_case=False, regex=True, quiet=True):
+	"""Find and replace text in a string.
+
+	Return the new text as a string.
+
+	Arguments:
+		input_str (str) -- the input text to modify
+		find_str (str) -- the text to find in the input text
+		replace_str (str) -- the text to replace the find text with
+	Keyword arguments:
+		ignore_case (bool) -- perform case-insensitive search if True
+		regex (bool) -- interpret the find text string as a regular expression
+		quiet (bool) -- don't print any output if True
+	"""
+	result = replace_text_many([input_str], find_str, replace_str, 
+		ignore_case, regex, quiet)
+	if result is not None:
+		return result[0]
+
+
+def replace_text_many(input_strs, find_str, replace_str, 
+	ignore_case=False, regex=True, quiet=True):
+	"""Find and replace text in a list of strings.
+
+	The pattern is compiled once and applied to every string. Return a list
+	of new strings in the same order as the input, or None if the regular
+	expression is invalid.
+
+	Arguments:
+		input_strs (list) -- the input strings to modify
+		find_str (str) -- the text to find in the input text
+		replace_str (str) -- the text to replace the find text with
+	Keyword arguments:
+		ignore_case (bool) -- perform case-insensitive search if True
+		regex (bool) -- interpret the find text string as a regular expression
+		quiet (bool) -- don't print any output if True
+	"""
+	if not find_str:
+		if not quiet:
+			print("Warning: No search string specified.")
+		return list(input_strs)
+
+	try:
+		pattern = compile_pattern(find_str, ignore_case, regex)
+		sub = pattern.sub
+		return [sub(replace_str, input_str) for input_str in input_strs]
+
+	except (re.error, IndexError):  # IndexError from bad group references
 		if not quiet:
 			print("Warning: Regular expression is invalid.")
 
 
-def renumber(num_list, 
+def renumber(frames, 
 	start=1, step=1, padding=4, 
 	preserve=True, autopad=True):
 	"""Renumber objects.
 
-	Return a new list of integers, plus a padding value, as a tuple.
+	Return a new frame set, plus a padding value, as a tuple. The frames are
+	renumbered as runs, so the cost doesn't depend on the number of frames.
 
 	Arguments:
-		num_list (list) -- input list of integers
+		frames (FrameSet) -- input frame set. A list of integers is also
+			accepted.
 	Keyword arguments:
 		start (int) -- start number for renumbering
 		step (int) -- step / increment for renumbering
@@ -68,29 +128,242 @@ def renumber(num_list,
 		autopad (bool) -- calc the minimum padding for the number sequence
 			e.g. 1-500 will need 3-digit padding, so will become 001-500
 	"""
-	new_num_list = []
+	if not isinstance(frames, frameset.FrameSet):
+		frames = frameset.FrameSet.from_list(frames)
+
+	if preserve:
+		new_frames = frames
+	else:
+		new_frames = frames.renumber(start, step)
 
 	# Calculate padding automatically...
 	if autopad:
-		if preserve:
-			max_num = max(num_list)
-		else:
-			max_num = start + (step*(len(num_list)-1))
+		padding = len(str(new_frames.max()))
 
-		padding = len(str(max_num))
+	return new_frames, padding
 
-	# Regenerate lists
-	index = start
 
-	if preserve:
-		for num in num_list:
-			new_num_int = int(str(num).zfill(padding))
-			new_num_list.append(new_num_int)
+_seq_pattern = re.compile(r'^(.*)\[([^\[\]]*)\](.*)$')
+
+
+def parse_seq(seq_str):
+	"""Split a sequence string into its components.
+
+	Return a tuple containing the prefix, the frame range string and the
+	extension. If the string doesn't describe a sequence, e.g. 'file.txt',
+	the frame range is None and the prefix is the whole string.
 
+	Arguments:
+		seq_str (str) -- a sequence string, e.g. 'name.[0001-0100].exr'
+	"""
+	match = _seq_pattern.match(seq_str)
+	if match:
+		return match.groups()
 	else:
-		for num in num_list:
-			new_num_int = int(str(index).zfill(padding))
-			new_num_list.append(new_num_int)
-			index += step
+		return seq_str, None, ""
+
+
+def split_num_range(num_range_str, count):
+	"""Split a frame range string after the given number of frames.
+
+	Return the frame range strings of the first part and the remainder, as
+	a tuple. Either may be empty.
+
+	Arguments:
+		num_range_str (str) -- a range string, e.g. '0001-0100'
+		count (int) -- the number of frames in the first part
+	"""
+	frames, padding = frameset.parse(num_range_str)
+	head, tail = frames.split(count)
+	return head.format(padding), tail.format(padding)
+
+
+def num_range_index(num_range_str, num):
+	"""Return the position of a number in a frame range string, or None if
+	the number isn't in the range.
+	"""
+	return frameset.parse(num_range_str)[0].index(num)
+
+
+def frame_number(filename, prefix, ext):
+	"""Return the frame number of a file in a sequence, or None if the file
+	name doesn't match the prefix and extension or has no number.
+	"""
+	name = os.path.basename(filename)
+	if not name.startswith(prefix) or not name.endswith(ext):
+		return None
+	try:
+		return int(name[len(prefix):len(name)-len(ext)])
+	except ValueError:
+		return None
+
+
+def frame_pairs(path, before, after, dst_path=None):
+	"""Yield pairs of source and destination file paths for a rename.
+
+	Pairs are generated on demand, so memory use doesn't depend on the
+	length of the sequence.
+
+	Arguments:
+		path (str) -- the directory containing the source files
+		before (str) -- the source sequence string, e.g. 'a.[0001-0100].exr'
+		after (str) -- the destination sequence string
+	Keyword arguments:
+		dst_path (str) -- the destination directory, if different from path
+	"""
+	if dst_path is None:
+		dst_path = path
+
+	src_prefix, src_frames, src_ext = parse_seq(before)
+	dst_prefix, dst_frames, dst_ext = parse_seq(after)
+
+	if src_frames is None or dst_frames is None:  # Single file
+		yield os.path.join(path, before), os.path.join(dst_path, after)
+		return
+
+	src_nums, src_padding = frameset.parse(src_frames)
+	dst_nums, dst_padding = frameset.parse(dst_frames)
+	src_base = os.path.join(path, src_prefix)
+	dst_base = os.path.join(dst_path, dst_prefix)
 
-	return new_num_list, padding
+	for src_num, dst_num in zip(src_nums, dst_nums):
+		yield (src_base + str(src_num).zfill(src_padding) + src_ext, 
+		       dst_base + str(dst_num).zfill(dst_padding) + dst_ext)
+
+
+def temp_path(path):
+	"""Return the temporary path used to move a file out of the way while
+	breaking a cycle of renames.
+	"""
+	dirname, name = os.path.split(path)
+	return os.path.join(dirname, ".sqrn_tmp_%s" % name)
+
+
+def plan_renames(pairs):
+	"""Order renames so that no file is overwritten before it has been
+	renamed itself.
+
+	The destination of one rename may be the source of another, e.g. when a
+	sequence is renumbered onto an overlapping frame range. If every such
+	destination comes later in the list, the renames are done in reverse
+	order, and if every one comes earlier, in the given order. Otherwise
+	each chain of renames is done from its end. A temporary name is only
+	needed to break a cycle, costing one extra rename per cycle. Pairs
+	whose source and destination are the same are left out.
+
+	Return a list of (src, dst, final) tuples, where final is False for the
+	first half of a rename split by a temporary name.
+
+	Arguments:
+		pairs (list) -- (src, dst) file path tuples, with no two sharing a
+			destination.
+	"""
+	key = os.path.normcase
+	pairs = [(src, dst) for src, dst in pairs if key(src) != key(dst)]
+	source_index = dict((key(src), i) for i, (src, dst) in enumerate(pairs))
+
+	# Index of the pair whose source is each pair's destination, if any
+	blocker = [source_index.get(key(dst)) for src, dst in pairs]
+
+	if all(j is None or j > i for i, j in enumerate(blocker)):
+		return [(src, dst, True) for src, dst in reversed(pairs)]
+	if all(j is None or j < i for i, j in enumerate(blocker)):
+		return [(src, dst, True) for src, dst in pairs]
+
+	blocked = set(j for j in blocker if j is not None)
+	done = [False] * len(pairs)
+	plan = []
+
+	# Chains, starting from renames whose sources aren't anyone's
+	# destination
+	for i in range(len(pairs)):
+		if i in blocked:
+			continue
+		chain = [i]
+		while blocker[chain[-1]] is not None:
+			chain.append(blocker[chain[-1]])
+		for j in reversed(chain):
+			plan.append(pairs[j] + (True, ))
+			done[j] = True
+
+	# Whatever remains forms cycles
+	for i in range(len(pairs)):
+		if done[i]:
+			continue
+		cycle = [i]
+		while blocker[cycle[-1]] != i:
+			cycle.append(blocker[cycle[-1]])
+		src, dst = pairs[i]
+		tmp = temp_path(src)
+		plan.append((src, tmp, False))
+		for j in reversed(cycle[1:]):
+			plan.append(pairs[j] + (True, ))
+		plan.append((tmp, dst, True))
+		for j in cycle:
+			done[j] = True
+
+	return plan
+
+
+def plan_task(item, renamed_prefix, options, update_status=True, 
+	error_status='Invalid regular expression'):
+	"""Work out the rename operation for a single task.
+
+	Sets the task's 'before' and 'after' sequence strings, 'dst_path', the
+	directory the renamed files will be in, and 'output', a tuple
+	containing the prefix, frame range and extension of the renamed
+	sequence.
+
+	Arguments:
+		item (dict) -- the task.
+		renamed_prefix (str) -- the prefix after text substitution, or
+			None if it couldn't be worked out, e.g. if the find expression
+			is invalid.
+		options (dict) -- the renumbering and extension options: start,
+			step, padding, preserve, autopad, change_ext and ext_to_change,
+			and optionally dest_dir, a directory to move the files to. If
+			padding is None, the existing padding is kept.
+		update_status (bool, optional) -- whether to compute the status
+			of the task.
+		error_status (str, optional) -- the status to give the task if
+			renamed_prefix is None.
+	"""
+	if item['frames']:
+		file = "%s[%s]%s" % (item['prefix'], item['frames'], item['ext'])
+	else:
+		file = "%s%s" % (item['prefix'], item['ext'])
+	item['before'] = file
+	item['dst_path'] = options.get('dest_dir') or item['path']
+
+	if options['change_ext'] and options['ext_to_change']:
+		new_ext = ".%s" % options['ext_to_change']
+	else:
+		new_ext = item['ext']
+
+	if renamed_prefix is None:
+		item['after'] = file
+		item['output'] = None
+		if update_status:
+			item['status'] = error_status
+		return
+
+	if item['frames']:  # If sequence
+		frames, padding = frameset.parse(item['frames'])
+		if options['padding'] is not None:
+			padding = options['padding']
+		renumbered_frames, padding = renumber(frames, 
+			options['start'], options['step'], padding, 
+			options['preserve'], options['autopad'])
+		renumbered_range = renumbered_frames.format(padding)
+		renamed_file = "%s[%s]%s" % (renamed_prefix, renumbered_range, new_ext)
+	else:
+		renumbered_range = item['frames']
+		renamed_file = "%s%s" % (renamed_prefix, new_ext)
+	item['after'] = renamed_file
+	item['output'] = (renamed_prefix, renumbered_range, new_ext)
+
+	if update_status:
+		if file == renamed_file and item['dst_path'] == item['path']:
+			item['status'] = 'Nothing to change'
+		else:
+			item['status'] = 'Ready'
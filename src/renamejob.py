@@ -0,0 +1,743 @@
+#!/usr/bin/python
+
+# renamejob.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Rename Job
+# The batch rename engine. This doesn't depend on Qt, so it can be run from
+# a worker thread in the UI or from the command line.
+
+
+import collections
+import concurrent.futures
+import itertools
+import os
+import time
+
+# Import custom modules
+import dircache
+import fileops
+import frameset
+import jobcontrol
+import rename
+import tasklog
+import timing
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Number of files per worker thread which may be queued for renaming ahead of
+# the results being collected
+rename_lookahead = 256
+
+# Maximum number of files processed by a worker thread in one go
+rename_chunk_size = 64
+
+# Interval in seconds at which to check whether a job has been paused
+pause_poll_interval = 0.25
+
+# Minimum interval in seconds between progress updates from a job, and
+# maximum number of error messages to hold back between updates
+progress_interval = 0.1
+progress_error_batch = 100
+
+# ----------------------------------------------------------------------------
+# Rename job class
+# ----------------------------------------------------------------------------
+
+class RenameJob(object):
+	"""Batch rename job.
+
+	Progress is reported through the on_* callbacks, which by default do
+	nothing. They are always called from the thread running the job.
+	"""
+
+	def __init__(self, tasks, dry_run=True, ignore_errors=True, workers=1, 
+		control=None, log_dir=None):
+		"""Initialise the job.
+
+		Arguments:
+			tasks (list) -- list of tasks for processing.
+			dry_run (bool, optional) -- perform a dry run (don't actually
+				rename anything).
+			ignore_errors (bool, optional) -- if True, continue batch
+				processing even if errors are raised.
+			workers (int, optional) -- number of files to process
+				concurrently. If 1, tasks are processed one file at a time.
+			control (JobControl, optional) -- token used to cancel or pause
+				the job between files.
+			log_dir (str, optional) -- if specified, write the complete log
+				of each task to a file in this directory.
+		"""
+		self.tasks = tasks
+		self.dry_run = dry_run
+		self.ignore_errors = ignore_errors
+		self.workers = max(1, workers)
+		self.files_processed = 0
+		self.files_total = sum(item['count'] for item in tasks)
+		self.control = control or jobcontrol.JobControl()
+		self.log_dir = log_dir
+		self._job_id = time.strftime('%Y%m%d_%H%M%S')
+		self._paused_task = None  # ID of the task reported as paused
+		self._errors = []  # Error messages waiting to be reported
+		self._progress_time = None  # Time of the last progress update
+		self._progress_done = 0  # Files processed at the last progress update
+		self._rate = 0.0  # Smoothed files per second
+		self.latency = timing.LatencyStats()  # Time taken per file
+		self.elapsed = None  # Time taken by the whole job
+
+
+	def on_error(self, message):
+		"""Called with one or more error messages, separated by newlines."""
+
+
+	def on_message(self, message):
+		"""Called with an informational message."""
+
+
+	def on_progress(self, progress):
+		"""Called with a tuple containing the number of files done, the total
+		number of files, the throughput in files per second, and the
+		estimated time remaining in seconds (or None).
+		"""
+
+
+	def on_task_completed(self, result):
+		"""Called with the result of each task, as described for
+		_rename_task().
+		"""
+
+
+	def on_task_status(self, task_status):
+		"""Called with a (task ID, status) tuple when the status of a task in
+		progress changes, e.g. when paused.
+		"""
+
+
+	def run(self):
+		"""Process all tasks."""
+
+		self._progress_time = time.time()
+		start = time.perf_counter()
+
+		if self.workers > 1:
+			self._run_pooled()
+		else:
+			for item in self.tasks:
+				if self.control.is_cancelled():
+					break
+				new_task = self._rename_task(item)
+				self.on_task_completed(new_task)
+
+		self.elapsed = time.perf_counter() - start
+		self._report_progress(force=True)
+		self.on_message(self.summary_text())
+
+
+	def summary(self):
+		"""Return a dict of timing statistics for the job: the number of
+		files processed, the time taken in seconds, the throughput in files
+		per second, and the per-file latency percentiles in milliseconds.
+		"""
+		def ms(seconds):
+			return None if seconds is None else seconds * 1000
+
+		elapsed = self.elapsed or 0.0
+		return dict(
+			files=self.files_processed,
+			seconds=elapsed,
+			files_per_s=self.files_processed / elapsed if elapsed else None,
+			latency_p50_ms=ms(self.latency.percentile(50)),
+			latency_p99_ms=ms(self.latency.percentile(99)),
+			latency_max_ms=ms(self.latency.max if self.latency.count else None),
+		)
+
+
+	def summary_text(self):
+		"""Return the timing statistics of the job as a message."""
+
+		summary = self.summary()
+		text = "%s %d files in %.2fs" % (
+			"Validated" if self.dry_run else "Renamed", summary['files'], summary['seconds'])
+		if summary['files_per_s'] is not None:
+			text += " (%d files/s)" % summary['files_per_s']
+		if summary['latency_p50_ms'] is not None:
+			text += ", per-file latency p50 %.2fms, p99 %.2fms, max %.2fms" % (
+				summary['latency_p50_ms'], summary['latency_p99_ms'], summary['latency_max_ms'])
+		return text
+
+
+	def _run_pooled(self):
+		"""Process tasks using a pool of worker threads.
+
+		Files are renamed concurrently, and later tasks are started while
+		earlier ones are still in progress, as long as they don't involve any
+		of the same sequences. Tasks whose source and destination frames
+		overlap are processed one file at a time, in a planned order, once
+		all preceding tasks have finished. Results are reported from this thread
+		in task order.
+		"""
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+			feeder = _ChunkFeeder(self, executor)
+			for item, serial in feeder.tasks():
+				if serial:
+					new_task = self._rename_task(item)
+				else:
+					self._announce_task(item)
+					new_task = self._collect_results(item, feeder.results(item))
+					feeder.finish(item)
+				self.on_task_completed(new_task)
+
+
+	def _report_progress(self, force=False):
+		"""Report progress and any pending error messages.
+
+		Updates are coalesced so that they are reported at most once every
+		progress_interval seconds, unless forced, to avoid flooding the GUI
+		event loop. See on_progress().
+		"""
+		now = time.time()
+		elapsed = now - self._progress_time
+		if not force and elapsed < progress_interval \
+		and len(self._errors) < progress_error_batch:
+			return
+
+		if self._errors:
+			self.on_error("\n".join(self._errors))
+			self._errors = []
+
+		if elapsed >= progress_interval:
+			rate = (self.files_processed - self._progress_done) / elapsed
+			if self._progress_done:
+				self._rate = 0.7*self._rate + 0.3*rate  # Smooth fluctuations
+			else:
+				self._rate = rate
+			self._progress_time = now
+			self._progress_done = self.files_processed
+
+		remaining = max(0, self.files_total - self.files_processed)
+		if self._rate > 0:
+			eta = remaining / self._rate
+		else:
+			eta = None
+
+		self.on_progress((self.files_processed, self.files_total, self._rate, eta))
+
+
+	def _frame_pairs(self, item):
+		"""Return an iterator of source and destination file paths for a
+		task.
+		"""
+		return rename.frame_pairs(item['path'], item['before'], item['after'], item['dst_path'])
+
+
+	def _sequence_keys(self, item):
+		"""Return the set of sequences read or written by a task."""
+
+		before_prefix, before_frames, before_ext = rename.parse_seq(item['before'])
+		after_prefix, after_frames, after_ext = rename.parse_seq(item['after'])
+		return set([
+			(item['path'], before_prefix.lower(), before_ext.lower()), 
+			(item['dst_path'], after_prefix.lower(), after_ext.lower()), 
+		])
+
+
+	def _is_self_overlapping(self, item):
+		"""Return True if a task's destination frames may overwrite its own
+		source frames, so the order of the renames must be planned.
+		"""
+		if item['dst_path'] != item['path']:
+			return False
+
+		before_prefix, before_frames, before_ext = rename.parse_seq(item['before'])
+		after_prefix, after_frames, after_ext = rename.parse_seq(item['after'])
+
+		if (before_prefix.lower(), before_ext.lower()) != (after_prefix.lower(), after_ext.lower()):
+			return False
+		if before_frames is None or after_frames is None:
+			return True
+
+		# Compare the overall extent of each frame range
+		before_frames = frameset.parse(before_frames)[0]
+		after_frames = frameset.parse(after_frames)[0]
+		if not before_frames or not after_frames:
+			return False
+		return before_frames.min() <= after_frames.max() and after_frames.min() <= before_frames.max()
+
+
+	def _announce_task(self, item):
+		"""Print a message describing the task about to be processed."""
+
+		if item['dst_path'] == item['path']:
+			msg = "%s: Rename '%s' to '%s'" % (item['id'], item['before'], item['after'])
+		else:
+			msg = "%s: Move '%s' to '%s'" % (item['id'], item['before'], 
+				os.path.join(item['dst_path'], item['after']))
+		if self.dry_run:
+			self.on_message("[Dry run] %s" % msg)
+		else:
+			self.on_message(msg)
+
+
+	def _prepare_task(self, item):
+		"""Create the destination directory of a task which moves files, if
+		it doesn't exist. Failures are reported for each file instead.
+		"""
+		if self.dry_run or item['dst_path'] == item['path']:
+			return
+		try:
+			os.makedirs(item['dst_path'], exist_ok=True)
+		except OSError:
+			pass
+
+
+	def _wait_if_paused(self, item, src):
+		"""Block while the job is paused, before processing a source file.
+
+		Return False if the job has been cancelled.
+		"""
+		if self.control.is_paused():
+			self._report_paused(item, src)
+		running = self.control.wait()
+		self._report_resumed(item)
+		return running
+
+
+	def _report_paused(self, item, src):
+		"""Report that a task is paused, if not already reported."""
+
+		if self._paused_task != item['id']:
+			self._paused_task = item['id']
+			status = "Paused at frame %s" % self._frame_number(item, src)
+			self.on_message("%s: %s" % (item['id'], status))
+			self.on_task_status((item['id'], status))
+
+
+	def _report_resumed(self, item):
+		"""Report that a task previously reported as paused has resumed."""
+
+		if self._paused_task == item['id']:
+			self._paused_task = None
+			self.on_task_status((item['id'], item['status']))
+
+
+	def _frame_number(self, item, filepath):
+		"""Return the frame number of a source file of a task."""
+
+		frame = rename.frame_number(filepath, item['prefix'], item['ext'])
+		if frame is None:
+			name = os.path.basename(filepath)
+			return name[len(item['prefix']):len(name)-len(item['ext'])]
+		return frame
+
+
+	def _get_snapshots(self, item):
+		"""Return snapshots of the directories involved in a task.
+
+		Only used for dry runs, to check for the existence of files without
+		a stat call per file. Snapshots come from the shared directory
+		cache, so each directory is only read again if it has changed.
+		Return a dict mapping directory paths to snapshots. Directories which
+		can't be read are left out, so their files will be checked
+		individually.
+		"""
+		snapshots = {}
+		if not self.dry_run:
+			return snapshots
+
+		for dirpath in set([item['path'], item['dst_path']]):
+			try:
+				snapshots[dirpath] = dircache.get(dirpath)
+			except OSError:
+				pass
+
+		return snapshots
+
+
+	def _isfile(self, filepath, snapshots):
+		"""Check if a file exists, using a directory snapshot if available."""
+
+		snapshot = snapshots.get(os.path.dirname(filepath)) if snapshots else None
+		if snapshot is None:
+			return os.path.isfile(filepath)
+		return snapshot.isfile(filepath)
+
+
+	def _process_file(self, src, dst, snapshots=None, vacated=None):
+		"""Rename or validate a single file.
+
+		This may be called from any thread, so must not report progress.
+		Return a tuple containing a success flag and a list of messages.
+
+		Arguments:
+			src (str) -- the source file path.
+			dst (str) -- the destination file path.
+			snapshots (dict, optional) -- directory snapshots, as returned
+				by _get_snapshots().
+			vacated (set, optional) -- normalised paths of files which will
+				have been renamed by the time this file is, so may be
+				destinations in a dry run.
+		"""
+		start = time.perf_counter()
+
+		if self.dry_run:
+			messages = []
+			if not self._isfile(src, snapshots):
+				messages.append("Source file does not exist: %s" % src)
+			if self._isfile(dst, snapshots) \
+			and not (vacated and os.path.normcase(dst) in vacated):
+				messages.append("Destination file exists and would be overwritten: %s" % dst)
+			success = not messages
+
+		else:  # Actually perform the rename operation, never overwriting
+			if os.path.dirname(src) == os.path.dirname(dst):
+				success, msg = fileops.rename(src, dst)
+			else:
+				success, msg = fileops.move(src, dst)
+			messages = [msg]
+
+		self.latency.add(time.perf_counter() - start)
+		return success, messages
+
+
+	def _process_files(self, task_id, pairs, snapshots=None):
+		"""Rename or validate a chunk of files of a task, in order.
+
+		Return a list of results as described for _process_file(). If the job
+		was cancelled before the chunk started, every result is None. Once
+		started, a chunk always runs to completion (pausing between files if
+		requested) - as chunks are started in order, this ensures the files
+		renamed before a cancellation form an unbroken run. If the task is
+		aborted, e.g. because another chunk failed, the results of the files
+		not yet processed are None.
+		"""
+		if not self.control.wait():
+			return [None] * len(pairs)
+
+		results = []
+		for src, dst in pairs:
+			self.control.wait()
+			if self.control.is_aborted(task_id):
+				return results + [None] * (len(pairs) - len(results))
+			results.append(self._process_file(src, dst, snapshots))
+
+		return results
+
+
+	def _rename_task(self, item):
+		"""Perform the file rename operation(s), one file at a time.
+
+		Return a tuple containing the following items:
+		- the index of the task being processed;
+		- the status of the task;
+		- the log of the task;
+		- a filename to be processed as a new task;
+		- if the task was cancelled part way through, a source file which
+		  wasn't renamed, otherwise None.
+		"""
+		# Only go ahead and rename if the operation will make changes
+		self._announce_task(item)
+		self._prepare_task(item)
+
+		snapshots = self._get_snapshots(item)
+		if self._is_self_overlapping(item):
+			results = self._planned_results(item, snapshots)
+		else:
+			results = self._serial_results(item, snapshots)
+		return self._collect_results(item, results)
+
+
+	def _serial_results(self, item, snapshots):
+		"""Rename or validate the files of a task one at a time, in order.
+
+		Yield (src, dst, result) tuples as described for _collect_results().
+		If the job is cancelled, the first file not processed is yielded
+		with a result of None. If the task is aborted, it just stops.
+		"""
+		for src, dst in self._frame_pairs(item):
+			if not self._wait_if_paused(item, src):
+				yield src, dst, None
+				return
+			if self.control.is_aborted(item['id']):
+				return
+			yield src, dst, self._process_file(src, dst, snapshots)
+
+
+	def _planned_results(self, item, snapshots):
+		"""Rename or validate the files of a task whose destination frames
+		overlap its source frames, in an order which never overwrites a
+		file before it has been renamed. See rename.plan_renames().
+
+		Yield (src, dst, result) tuples as described for _collect_results().
+		The files are held in memory to plan the order. Once started, a real
+		rename runs to completion even if the job is cancelled, as a partly
+		renumbered sequence can't be split into separate tasks - only pausing
+		is honoured. If the task is aborted, it stops, but not before moving
+		any file renamed to a temporary name on to its destination. A dry run
+		can be cancelled as usual.
+		"""
+		pairs = list(self._frame_pairs(item))
+		sources = set(os.path.normcase(src) for src, dst in pairs)
+
+		if self.dry_run:
+			for src, dst in pairs:
+				if not self._wait_if_paused(item, src):
+					yield src, dst, None
+					return
+				if self.control.is_aborted(item['id']):
+					return
+				yield src, dst, self._process_file(src, dst, snapshots, sources)
+			return
+
+		for src, dst in pairs:  # Files left with the same name
+			if os.path.normcase(src) == os.path.normcase(dst):
+				yield src, dst, (True, ["Unchanged '%s'" % src])
+
+		split = {}  # Temporary path -> (src, result of the first half)
+		for src, dst, final in rename.plan_renames(pairs):
+			orig_src = split[src][0] if src in split else src
+			self._wait_if_paused(item, orig_src)  # Cancellation is ignored
+
+			if src in split:
+				orig_src, first_result = split.pop(src)
+				if first_result[0]:
+					success, messages = self._process_file(src, dst)
+					yield orig_src, dst, (success, first_result[1] + messages)
+				else:
+					yield orig_src, dst, first_result
+			elif self.control.is_aborted(item['id']):
+				continue  # Only finish the files with temporary names
+			elif not final:
+				split[dst] = (src, self._process_file(src, dst))
+			else:
+				yield src, dst, self._process_file(src, dst)
+
+
+	def _collect_results(self, item, results):
+		"""Gather the per-file results of a task, in order.
+
+		The results are an iterable of (src, dst, result) tuples, where
+		result is as described for _process_files(). Return a tuple as
+		described for _rename_task(). If errors are not being ignored, the
+		task is aborted at the first error, and only the results of the files
+		already being processed are consumed.
+		"""
+		spill_path = None
+		if self.log_dir:
+			spill_path = os.path.join(self.log_dir, "%s_task%d%s.log" % (
+				self._job_id, item['id'], "_dryrun" if self.dry_run else ""))
+
+		log = tasklog.TaskLog(spill_path=spill_path)
+		try:
+			return self._gather_results(item, results, log)
+		finally:
+			log.close()
+
+
+	def _gather_results(self, item, results, log):
+		"""Consume the per-file results of a task, recording them in the
+		given log. See _collect_results().
+		"""
+		task_id = item['id']
+		errors = 0
+		last_renamed = None
+		remaining = None
+		interrupted_at = None  # Source file of the first error
+
+		for src, dst, result in results:
+			if result is None:
+				if interrupted_at is not None:  # Skipped as the task stopped
+					continue
+				remaining = src  # Skipped as the job was cancelled
+				break
+
+			success, messages = result
+
+			if success:
+				last_renamed = dst
+				log.success(messages)
+			else:
+				errors += 1
+				log.error(messages)
+				self._errors.extend(messages)
+				if not self.ignore_errors and interrupted_at is None:
+					# Stop the task, but record the files which were already
+					# being processed on other threads
+					interrupted_at = src
+					self.control.abort(task_id)
+
+			self.files_processed += 1
+			self._report_progress()
+
+		if interrupted_at is not None:  # Task stopped due to error
+			log.note("Interrupted")
+			return task_id, "Interrupted", log, interrupted_at, None
+
+		if remaining is not None:  # Task cancelled part way through
+			if self.dry_run:
+				return task_id, 'Cancelled', log, None, None
+			elif last_renamed is None:
+				status = 'Cancelled'
+			else:
+				status = "Cancelled at frame %s" % self._frame_number(item, remaining)
+			self.on_message("%s: %s" % (task_id, status))
+			log.note(status)
+			return task_id, status, log, last_renamed, remaining
+
+		if errors == 0:  # Task completed successfully
+			if self.dry_run:
+				status = 'Ready'
+			else:
+				status = 'Complete'
+			log.note(status)
+			return task_id, status, log, last_renamed, None
+
+		else:  # Task completed with errors, which were ignored
+			if errors == 1:
+				status = '1 error'
+			else:
+				status = '%d errors' % errors
+			self.on_message("Task generated %s." % status)
+			log.note(status)
+			return task_id, status, log, last_renamed, None
+
+
+class _ChunkFeeder(object):
+	"""Submits chunks of files from a sequence of tasks to a job pool.
+
+	Only a bounded window of chunks is in flight at any time, so memory use
+	is independent of the number of files. Chunks from later tasks are
+	submitted ahead while earlier tasks are still being collected, as long as
+	they don't involve any of the same sequences.
+	"""
+
+	def __init__(self, job, executor):
+		self.job = job
+		self.executor = executor
+		self.max_window = job.workers * rename_lookahead
+
+		self._tasks = iter(job.tasks)
+		self._next_item = None  # Task not yet started, waiting on a barrier
+		self._started = collections.deque()  # Tasks started, not yet yielded
+		self._window = collections.deque()  # (item, pairs, future) in order
+		self._current = None  # (item, pair iterator, snapshots) being fed
+		self._keys = {}  # Task ID -> sequence keys, for tasks in progress
+
+
+	def _peek(self):
+		"""Return the next task not yet started, or None."""
+
+		if self._next_item is None:
+			self._next_item = next(self._tasks, None)
+		return self._next_item
+
+
+	def _start(self, item):
+		"""Start feeding the chunks of a task."""
+
+		self._next_item = None
+		self._keys[item['id']] = self.job._sequence_keys(item)
+		self.job._prepare_task(item)
+		self._current = (item, self.job._frame_pairs(item), self.job._get_snapshots(item))
+		self._started.append(item)
+
+
+	def _fill(self):
+		"""Submit chunks until the window is full or a barrier is reached."""
+
+		job = self.job
+		while len(self._window) < self.max_window // rename_chunk_size + 1:
+			if self._current is None:
+				item = self._peek()
+				if item is None or job.control.is_cancelled():
+					return
+				if job._is_self_overlapping(item):
+					return  # Must run on its own, after all preceding tasks
+				keys = job._sequence_keys(item)
+				if any(not keys.isdisjoint(k) for k in self._keys.values()):
+					return  # Depends on a task in progress
+				self._start(item)
+
+			item, pairs, snapshots = self._current
+			if job.control.is_aborted(item['id']):
+				chunk = None
+			else:
+				chunk = list(itertools.islice(pairs, rename_chunk_size))
+			if not chunk:
+				self._current = None
+				continue
+
+			future = self.executor.submit(job._process_files, item['id'], chunk, snapshots)
+			self._window.append((item, chunk, future))
+
+
+	def tasks(self):
+		"""Yield tasks in order, with a flag indicating whether each one must
+		be processed serially.
+
+		Each task must be finished with before the next is requested.
+		"""
+		while True:
+			if self._started:
+				yield self._started.popleft(), False
+				continue
+
+			item = self._peek()
+			if item is None or self.job.control.is_cancelled():
+				return
+
+			# Nothing is in progress at this point
+			if self.job._is_self_overlapping(item):
+				self._next_item = None
+				yield item, True
+			else:
+				self._start(item)
+
+
+	def results(self, item):
+		"""Yield (src, dst, result) tuples for a task, in order.
+
+		While waiting for results, periodically check if the job has been
+		paused, so the task status can be updated. If the job is cancelled,
+		the first file not processed is yielded with a result of None. If
+		the task is aborted, no more of its chunks are submitted, but the
+		results of those already submitted are still yielded.
+		"""
+		job = self.job
+		while True:
+			self._fill()
+			if not self._window or self._window[0][0] is not item:
+				if self._current is not None and self._current[0] is item:
+					# Job was cancelled before all files were submitted
+					src, dst = next(self._current[1], (None, None))
+					if src is not None:
+						yield src, dst, None
+				return
+
+			item, chunk, future = self._window.popleft()
+			while True:
+				try:
+					chunk_results = future.result(timeout=pause_poll_interval)
+					break
+				except concurrent.futures.TimeoutError:
+					if job.control.is_paused():
+						job._report_paused(item, chunk[0][0])
+			job._report_resumed(item)
+
+			for (src, dst), result in zip(chunk, chunk_results):
+				yield src, dst, result
+
+
+	def finish(self, item):
+		"""Clean up after a task has been collected.
+
+		If the task was interrupted, its remaining chunks are abandoned.
+		"""
+		while self._window and self._window[0][0] is item:
+			self._window.popleft()[2].cancel()
+		if self._current is not None and self._current[0] is item:
+			self._current = None
+		self._keys.pop(item['id'], None)
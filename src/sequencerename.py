@@ -15,15 +15,38 @@
 import os
 import re
 import sys
+import time
+
+launch_time = time.time()  # For measuring startup time
+
+# Profile the whole session if requested
+if __name__ == "__main__":
+	import timing
+	if os.environ.get(timing.profile_env_var):
+		timing.start_profiler(os.environ[timing.profile_env_var])
+
+# Run in headless batch mode without importing Qt
+if __name__ == "__main__" and "--batch" in sys.argv[1:]:
+	import batch
+	sys.exit(batch.main(sys.argv[1:]))
 
 from Qt import QtCore, QtGui, QtWidgets
 import ui_template as UI
 
 # Import custom modules
-import detailview
+import conflicts
+import dirwatch
+import fileops
+import frameset
+import ingest
+import jobcontrol
 import os_wrapper
+import regexsandbox
 import rename
-import sequence
+import renamejob
+import taskmodel
+import taskregistry
+import timing
 import verbose
 # from pprint import pprint
 
@@ -32,8 +55,19 @@ import verbose
 # ----------------------------------------------------------------------------
 
 prefs_location = os.getenv('IC_USERPREFSDIR', os.path.expanduser('~/.sequencerename'))
-if not os.path.isdir(prefs_location):
-	os.makedirs(prefs_location)
+
+# Delay in milliseconds to wait for further input before updating the preview
+preview_delay = 150
+
+# Number of tasks to compute between checks for newer input
+preview_chunk_size = 1000
+
+# Maximum time in seconds the find pattern may take to evaluate for the
+# preview before it's abandoned
+preview_regex_timeout = 1.0
+
+# Target time in seconds from launch until the window is first painted
+startup_budget = 1.0
 
 cfg = dict(
 	app_id="ic_seqrename",  # This should match the Rez package name
@@ -65,6 +99,11 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		super(SequenceRenameApp, self).__init__(parent)
 		self.parent = parent
 
+		self.startup_time = None  # Set when the window is first painted
+
+		if not os.path.isdir(prefs_location):
+			os.makedirs(prefs_location)
+
 		# UI template setup
 		self.setupUI(**cfg)
 		self.conformFormLayoutLabels(self.ui.sidebar_frame)
@@ -73,16 +112,19 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.setWindowFlags(QtCore.Qt.Window)
 		# self.setAttribute(QtCore.Qt.WA_DeleteOnClose, True)
 
-		# Restore widget state
-		self.restoreWidgetState(self.ui.splitter, "splitterSizes")
-		self.ui.taskList_treeWidget.header().restoreState(self.settings.value("taskView")) #.toByteArray())
-
-		self.tasks = []  # This will hold a list of dicts, to store task data
+		self.tasks = taskregistry.TaskRegistry()  # Task data, stored as dicts
+		self.conflict_index = conflicts.ConflictIndex()
 		self.rename_count = 0
 		self.total_count = 0
 
 		self.last_dir = None
 		self.expert_mode = False
+		self.ingest_threads = []  # Directory scans in progress
+		self.dir_watcher = None  # Created when watching is enabled
+		self.watch_changes = {}  # Directory changes waiting to be applied
+		self.task_dirs = set()  # Directories in the task list, to watch
+		self.workerThread = None
+		self.regex_sandbox = regexsandbox.RegexSandbox(preview_regex_timeout)
 
 		# Define colours
 		# self.col = {}  # Already declared in ui_template.py
@@ -91,23 +133,35 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.col['done'] = QtGui.QColor('#6897c8')
 		self.col['error'] = QtGui.QColor('#e96168')
 
-		# Define status icons & tint with colours defined above
+		# Status icons are loaded after the window is shown
 		self.icon = {}
-		for status in ['ready', 'null', 'done', 'error']:
-			self.icon[status] = self.iconSet('status-icon-%s.png' % status, tintNormal=self.col[status])
 
-		# Add tool button icons
-		self.ui.add_toolButton.setIcon(self.iconSet('add.svg'))
-		self.ui.remove_toolButton.setIcon(self.iconSet('remove.svg'))
-		self.ui.clear_toolButton.setIcon(self.iconSet('clear.svg'))
-		self.ui.fill_toolButton.setIcon(self.iconSet('edit-find-replace.svg'))
-		self.ui.about_toolButton.setIcon(self.iconSet('help-about.svg'))
+		# Set up task list model
+		self.task_model = taskmodel.TaskModel(self.tasks, self)
+		self.task_model.icon = self.icon
+		self.task_model.col = self.col
+		self.task_model.conflicts = self.conflict_index
+		self.task_model.placeholder = "Add sequences to rename by dragging and dropping files or folders on to this window, or use the 'Add' button."
+		self.ui.taskList_treeView.setModel(self.task_model)
 
-		# Connect signals & slots
-		self.ui.taskList_treeWidget.itemSelectionChanged.connect(self.update_toolbar_ui)
-		self.ui.taskList_treeWidget.itemDoubleClicked.connect(self.expand_task)
+		# Restore widget state
+		self.restoreWidgetState(self.ui.splitter, "splitterSizes")
+		self.ui.taskList_treeView.header().restoreState(self.settings.value("taskView")) #.toByteArray())
 
-		updateTaskListViewStatus = lambda: self.update_tasks(update_status=True)  # Lambda function for PyQt5 compatibility, default keyword argument not supported
+		# Connect signals & slots
+		self.task_model.modelReset.connect(self.task_view_reset)
+		self.task_model.rowsInserted.connect(self.task_groups_inserted)
+		self.ui.taskList_treeView.selectionModel().selectionChanged.connect(lambda *args: self.update_toolbar_ui())
+		self.ui.taskList_treeView.doubleClicked.connect(self.expand_task)
+
+		# Set up preview scheduler to coalesce rapid changes to the inputs
+		self.preview_generation = 0
+		self.preview_timer = QtCore.QTimer(self)
+		self.preview_timer.setSingleShot(True)
+		self.preview_timer.setInterval(preview_delay)
+		self.preview_timer.timeout.connect(lambda: self.update_tasks(update_status=True))  # Lambda function for PyQt5 compatibility, default keyword argument not supported
+
+		updateTaskListViewStatus = lambda *args: self.schedule_preview()
 		self.ui.find_comboBox.editTextChanged.connect(updateTaskListViewStatus)
 		self.ui.replace_comboBox.editTextChanged.connect(updateTaskListViewStatus)
 		self.ui.ignoreCase_checkBox.stateChanged.connect(updateTaskListViewStatus)
@@ -119,10 +173,15 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.ui.padding_spinBox.valueChanged.connect(updateTaskListViewStatus)
 		self.ui.ext_checkBox.stateChanged.connect(updateTaskListViewStatus)
 		self.ui.ext_lineEdit.textChanged.connect(updateTaskListViewStatus)
+		self.ui.move_checkBox.stateChanged.connect(updateTaskListViewStatus)
+		self.ui.dest_lineEdit.textChanged.connect(updateTaskListViewStatus)
+		self.ui.destBrowse_toolButton.clicked.connect(self.browse_dest_dir)
+		self.ui.watch_checkBox.stateChanged.connect(lambda *args: self.update_watches())
 
 		self.ui.remove_toolButton.clicked.connect(self.remove_selected_tasks)
 		self.ui.clear_toolButton.clicked.connect(self.clear_task_list)
-		self.ui.rename_pushButton.clicked.connect(lambda: self.perform_file_rename(dry_run=True))
+		self.ui.rename_pushButton.clicked.connect(self.start_rename)
+		self.ui.pause_pushButton.clicked.connect(self.toggle_pause)
 		self.ui.cancel_pushButton.clicked.connect(self.cancel_rename)
 		self.ui.about_toolButton.clicked.connect(self.about_dialog)
 
@@ -138,6 +197,10 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.shortcutExpertMode.setKey('Ctrl+Shift+E')
 		self.shortcutExpertMode.activated.connect(self.toggle_hidden_columns)
 
+		self.shortcutSelectConflicts = QtWidgets.QShortcut(self)
+		self.shortcutSelectConflicts.setKey('Ctrl+J')
+		self.shortcutSelectConflicts.activated.connect(self.select_conflicting_tasks)
+
 		# Set input validators
 		alphanumeric_filename_validator = QtGui.QRegExpValidator(QtCore.QRegExp(r'[\w\.-]+'), self.ui.replace_comboBox)
 		self.ui.replace_comboBox.setValidator(alphanumeric_filename_validator)
@@ -146,27 +209,86 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.ui.ext_lineEdit.setValidator(alphanumeric_ext_validator)
 
 		# Get current dir in which to rename files, and update widget if
-		# running as standalone app
+		# running as standalone app. This is done once the window is shown.
 		if __name__ == "__main__":
-			self.update_task_list_dir(os.getcwd())
+			self.initial_dir = os.getcwd()
+		else:
+			self.initial_dir = None
 
-		self.update_toolbar_ui()
+		# Finish initialising after the first paint
+		self.ui.taskList_treeView.viewport().installEventFilter(self)
+
+		self.task_view_reset()
 		self.toggle_hidden_columns()
 		self.ui.rename_pushButton.show()
+		self.ui.pause_pushButton.hide()
 		self.ui.cancel_pushButton.hide()
 		self.ui.rename_progressBar.hide()
 
 
+	def eventFilter(self, watched, event):
+		"""Schedule deferred initialisation when the task view is first
+		painted.
+		"""
+		if event.type() == QtCore.QEvent.Paint and self.startup_time is None:
+			self.startup_time = time.time() - launch_time
+			QtCore.QTimer.singleShot(0, self.deferred_init)
+
+		return super(SequenceRenameApp, self).eventFilter(watched, event)
+
+
+	def deferred_init(self):
+		"""Finish setting up the UI once the window has been shown.
+
+		Work which isn't needed to show the window is done here, so it
+		appears as quickly as possible.
+		"""
+		self.ui.taskList_treeView.viewport().removeEventFilter(self)
+
+		if self.startup_time > startup_budget:
+			verbose.warning("Startup took %.2fs, exceeding the budget of %.2fs." % (self.startup_time, startup_budget))
+		else:
+			verbose.detail("Startup took %.2fs." % self.startup_time)
+
+		self.load_icons()
+		self.regex_sandbox.start()
+
+		if self.initial_dir:
+			self.update_task_list_dir(self.initial_dir)
+			self.initial_dir = None
+
+
+	def load_icons(self):
+		"""Load the status and tool button icons, tinting them as required."""
+
+		# Define status icons & tint with colours defined above
+		for status in ['ready', 'null', 'done', 'error']:
+			self.icon[status] = self.iconSet('status-icon-%s.png' % status, tintNormal=self.col[status])
+
+		# Add tool button icons
+		self.ui.add_toolButton.setIcon(self.iconSet('add.svg'))
+		self.ui.remove_toolButton.setIcon(self.iconSet('remove.svg'))
+		self.ui.clear_toolButton.setIcon(self.iconSet('clear.svg'))
+		self.ui.fill_toolButton.setIcon(self.iconSet('edit-find-replace.svg'))
+		self.ui.about_toolButton.setIcon(self.iconSet('help-about.svg'))
+
+		self.task_model.group_icon = self.iconSet('folder-open.svg')
+		self.task_model.placeholder_icon = self.iconSet('add.svg', tintNormal=self.col['warning-text'])
+		self.ui.taskList_treeView.viewport().update()
+
+
 	def update_toolbar_ui(self):
 		"""Update the toolbar UI based on the current selection."""
 
+		selected_count = len(self.get_selected_task_ids())
+
 		# No items selected...
-		if len(self.ui.taskList_treeWidget.selectedItems()) == 0:
+		if selected_count == 0:
 			self.ui.remove_toolButton.setEnabled(False)
 			self.ui.fill_toolButton.setEnabled(False)
 
 		# One item selected...
-		elif len(self.ui.taskList_treeWidget.selectedItems()) == 1:
+		elif selected_count == 1:
 			self.ui.remove_toolButton.setEnabled(True)
 			self.ui.fill_toolButton.setEnabled(True)
 
@@ -176,7 +298,7 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 			self.ui.fill_toolButton.setEnabled(False)
 
 		# List is empty...
-		if self.get_child_items(self.ui.taskList_treeWidget):
+		if self.tasks:
 			self.ui.clear_toolButton.setEnabled(True)
 		else:
 			self.ui.clear_toolButton.setEnabled(False)
@@ -190,38 +312,30 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		columns = ['Task', 'Count']
 
 		for column in columns:
-			self.ui.taskList_treeWidget.setColumnHidden(self.header(column), self.expert_mode)
+			self.ui.taskList_treeView.setColumnHidden(self.header(column), self.expert_mode)
 
 
 	def header(self, text):
 		"""Return the column number for the specified header text."""
 
-		for col in range(self.ui.taskList_treeWidget.columnCount()):
-			if text == self.ui.taskList_treeWidget.headerItem().text(col):
-				return col
-
-		return -1
-
-
-	def get_task_id(self, item):
-		"""Return the ID for the specified task item."""
+		try:
+			return taskmodel.COLUMNS.index(text)
+		except ValueError:
+			return -1
 
-		return int(item.text(self.header('Task')))
 
+	def get_task_id(self, index):
+		"""Return the ID for the specified task index."""
 
-	def get_child_items(self, widget):
-		"""Return all top-level child items of the specified widget."""
+		return self.task_model.task_id(index)
 
-		items = []
-		root = widget.invisibleRootItem()
 
-		for i in range(root.childCount()):
-			items.append(root.child(i))
+	def get_selected_task_ids(self):
+		"""Return the IDs of the selected tasks."""
 
-		if items:
-			return items
-		else:
-			return None
+		selection_model = self.ui.taskList_treeView.selectionModel()
+		ids = [self.get_task_id(index) for index in selection_model.selectedRows()]
+		return [task_id for task_id in ids if task_id is not None]
 
 
 	def get_browse_dir(self):
@@ -247,6 +361,14 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 			self.update_task_list_dir(dirname)
 
 
+	def browse_dest_dir(self):
+		"""Open a dialog to select the directory to move files to."""
+
+		dirname = self.folderDialog(self.ui.dest_lineEdit.text() or self.get_browse_dir())
+		if dirname:
+			self.ui.dest_lineEdit.setText(os_wrapper.absolute_path(dirname))
+
+
 	def add_sequence(self):
 		"""Open a dialog to select files to add."""
 
@@ -260,15 +382,158 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 	def update_task_list_dir(self, dirpath):
 		"""Update task list with detected file sequences in given directory.
 
-		Pre-existing tasks will not be added, to avoid duplication.
+		The directory, and subdirectories down to the chosen depth, are
+		scanned in a background thread. Tasks are added in batches as
+		sequences are found. Pre-existing tasks will not be added, to avoid
+		duplication.
 		"""
-		bases = sequence.getBases(dirpath, delimiter="")
+		thread = IngestThread(
+			[dirpath], 
+			max_depth=self.ui.depth_spinBox.value(), 
+			include=ingest.parse_patterns(self.ui.include_lineEdit.text()), 
+			exclude=ingest.parse_patterns(self.ui.exclude_lineEdit.text()), 
+		)
+		thread.printError.connect(verbose.warning)
+		thread.sequencesFound.connect(self.add_sequences)
+		thread.finished.connect(lambda: self.ingest_completed(thread))
+		self.ingest_threads.append(thread)
+		thread.start()
 
-		for base in bases:
-			path, prefix, frames, ext, count = sequence.getSequence(dirpath, base, delimiter="", ignorePadding=False)
-			self.create_task(path, prefix, frames, ext, count)
 
-		self.update_tasks()
+	@QtCore.Slot(tuple)
+	def add_sequences(self, sequences):
+		"""Add tasks for a batch of sequences found by a directory scan.
+
+		Only the new tasks are previewed, so they can be shown straight
+		away. The rest of the task list is updated once the input settles.
+		Batches still queued from a scan which has been cancelled or
+		superseded, e.g. by clearing the task list, are ignored.
+		"""
+		thread = self.sender()
+		if thread not in self.ingest_threads or thread.control.is_cancelled():
+			return
+
+		self.preview_tasks([self.tasks[self.create_task(*seq)] for seq in sequences])
+
+		# Don't postpone a pending update while batches keep arriving
+		if not self.preview_timer.isActive():
+			self.schedule_preview()
+
+
+	def preview_tasks(self, items):
+		"""Work out the rename operation and status of the given tasks only,
+		e.g. tasks which have just been added, and update the view.
+		"""
+		options = self.get_rename_options()
+		renamed_prefixes, error_status = self.replace_prefixes(items, options)
+
+		for item, renamed_prefix in zip(items, renamed_prefixes):
+			rename.plan_task(item, renamed_prefix, options, error_status=error_status)
+
+		self.check_for_conflicts(items)
+		self.update_task_view()
+
+
+	def update_watches(self):
+		"""Watch the directories in the task list for changes, if enabled."""
+
+		if self.getCheckBoxValue(self.ui.watch_checkBox):
+			if self.dir_watcher is None:
+				self.dir_watcher = dirwatch.DirectoryWatcher(self)
+				self.dir_watcher.directoriesChanged.connect(self.directories_changed)
+			for path in self.dir_watcher.watch(self.task_dirs):
+				verbose.warning("Unable to watch directory for changes: %s" % path)
+
+		elif self.dir_watcher is not None:
+			self.dir_watcher.watch(())
+			self.watch_changes.clear()
+
+
+	@QtCore.Slot(tuple)
+	def directories_changed(self, changes):
+		"""Update the tasks affected by changes to watched directories.
+
+		Only the sequences containing the changed files are detected again.
+		Sequences which are new are added, subject to the include and
+		exclude patterns, and tasks whose files have all gone are removed.
+		Changes made while a rename job is running are held until it
+		finishes.
+
+		Arguments:
+			changes (tuple) -- (directory path, names) tuples, where names
+				are the names of the changed files, or None if unknown.
+		"""
+		for path, names in changes:
+			if names is None or self.watch_changes.get(path, ()) is None:
+				self.watch_changes[path] = None
+			else:
+				self.watch_changes.setdefault(path, set()).update(names)
+
+		if self.workerThread is not None and self.workerThread.isRunning():
+			return
+
+		changes = self.watch_changes
+		self.watch_changes = {}
+		include = ingest.parse_patterns(self.ui.include_lineEdit.text())
+		exclude = ingest.parse_patterns(self.ui.exclude_lineEdit.text())
+
+		changed_ids = []
+		removed_ids = []
+		for path, names in changes.items():
+			known = set(self.tasks.key(item)[1:] for item in self.tasks if item['path'] == path)
+			try:
+				sequences = ingest.rescan(path, names, known, include, exclude)
+			except OSError:
+				continue
+
+			for (prefix, ext, padding), seq in sequences.items():
+				task_id = self.tasks.find(path, prefix, ext, padding)
+				if seq is None:
+					if task_id is not None:
+						removed_ids.append(task_id)
+				elif task_id is None or self.tasks[task_id]['frames'] != seq[2]:
+					changed_ids.append(self.create_task(*seq))
+
+		if not changed_ids and not removed_ids:
+			return
+
+		verbose.detail("Directory changes: %d task(s) updated, %d removed." % (len(changed_ids), len(removed_ids)))
+
+		# Tasks which collided with the changed or removed tasks may no
+		# longer be in conflict, so they're planned and checked again too
+		affected_ids = set(changed_ids)
+		for task_id in changed_ids + removed_ids:
+			affected_ids.update(self.conflict_index.colliding(task_id))
+		affected_ids.difference_update(removed_ids)
+
+		for task_id in removed_ids:
+			self.conflict_index.remove(task_id)
+		self.tasks.remove(removed_ids)
+		self.task_model.refresh()  # Before any events are processed
+		self.preview_tasks([self.tasks[task_id] for task_id in sorted(affected_ids)])
+
+		# Update the totals, unless a full update is already pending
+		if not self.preview_timer.isActive():
+			self.rename_count = sum(item['count'] for item in self.tasks if item['status'] == 'Ready')
+			self.total_count = sum(item['count'] for item in self.tasks)
+			self.update_rename_button(len(self.conflict_index))
+
+
+	def ingest_completed(self, thread):
+		"""Function to execute when a directory scan finishes."""
+
+		self.ingest_threads.remove(thread)
+		if thread.control.is_cancelled():
+			verbose.message("Directory scan cancelled.")
+		else:
+			verbose.message("Found %d sequence(s) in %s in %.2fs" % (thread.found, ", ".join(thread.roots), thread.elapsed))
+
+
+	def cancel_ingest(self):
+		"""Stop any directory scans in progress."""
+
+		for thread in self.ingest_threads:
+			thread.control.cancel()
 
 
 	def update_task_list_file(self, filepath):
@@ -276,61 +541,38 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 
 		Pre-existing tasks will not be added, to avoid duplication.
 		"""
-		if os.path.isfile(filepath):
-			path, prefix, frames, ext, count = sequence.detectSeq(filepath, delimiter="", ignorePadding=False)
-			self.create_task(path, prefix, frames, ext, count)
+		seq = ingest.detect_file(filepath)
+		if seq is not None:
+			self.create_task(*seq)
 			self.update_tasks()
 
 
 	def remove_selected_tasks(self):
 		"""Remove selected items from the task list."""
 
-		indices = [self.get_task_id(item) for item in self.ui.taskList_treeWidget.selectedItems()]
-
-		# Reverse order so indices do not change during operation
-		indices.sort(reverse=True)
+		task_ids = self.get_selected_task_ids()
 
-		for i in indices:
-			verbose.detail("Removing task id %d" % i)
-			self.tasks.pop(i)
+		for task_id in task_ids:
+			verbose.detail("Removing task id %d" % task_id)
+			self.conflict_index.remove(task_id)
 
+		self.tasks.remove(task_ids)
+		# Remove the rows before any events are processed, so the view never
+		# repaints a task which no longer exists
+		self.task_model.refresh()
 		self.update_tasks()
 
 
 	def clear_task_list(self):
 		"""Clear the task list."""
 
-		self.tasks = []
+		self.cancel_ingest()
+		self.tasks.clear()
+		self.conflict_index.clear()
+		self.task_model.refresh()  # Before any events are processed
 		self.update_tasks()
 
 
-	def create_task_group_item(self, path):
-		"""Create a task group item.
-
-		If a matching item already exists return that, otherwise create the
-		new item and return it.
-
-		Arguments:
-			path (str) -- path to a folder containing file sequences.
-		"""
-		root = self.ui.taskList_treeWidget.invisibleRootItem()
-		child_count = root.childCount()
-
-		# Check if matching item already exists
-		for i in range(child_count):
-			item = root.child(i)
-			if item.text(0) == path:
-				# verbose.detail("Task group already exists.")
-				return item
-
-		new_item = QtWidgets.QTreeWidgetItem(self.ui.taskList_treeWidget)
-		new_item.setText(0, path)
-		new_item.setIcon(0, self.iconSet('folder-open.svg'))
-		new_item.setFirstColumnSpanned(True)
-		new_item.setFlags(new_item.flags() & ~QtCore.Qt.ItemIsSelectable)
-		return new_item
-
-
 	def create_task(self, path, prefix, frames, ext, count, status=''):
 		"""Create a new task.
 
@@ -346,115 +588,217 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 			count (int) -- the number of frames in the sequence.
 			status (str, optional) -- the task status, e.g. 'Ready',
 				'Complete', etc.
+
+		Return the ID of the new or existing task.
 		"""
 
 		# Check if matching item already exists
-		for item in self.tasks:
-			if item['path'] == path \
-			and item['prefix'] == prefix \
-			and item['ext'] == ext:
-				if item['frames'] == frames:
-					verbose.detail("Task item already exists.")
-				else:
-					verbose.detail("Task item already exists but frame ranges differ. Updating item with new frame range.")
-					item['frames'] = frames
-					item['count'] = count
-				return
+		task_id = self.tasks.find(path, prefix, ext, ingest.padding_key(frames))
+		if task_id is not None:
+			if self.tasks[task_id]['frames'] == frames:
+				verbose.detail("Task item already exists.")
+			else:
+				verbose.detail("Task item already exists but frame ranges differ. Updating item with new frame range.")
+				self.tasks.update(task_id, frames=frames, count=count)
+			return task_id
 
 		# Create new item
-		new_item = {
-			'path': path, 
-			'prefix': prefix, 
-			'frames': frames, 
-			'ext': ext, 
-			'count': count, 
-			'status': status, 
-		}
-		self.tasks.append(new_item)
+		return self.tasks.add(path, prefix, frames, ext, count, status)
+
+
+	def add_completed_task(self, path, prefix, frames, ext, count):
+		"""Add the files renamed by a task which was cancelled part way
+		through as a completed task.
+
+		Unlike create_task(), if a task for the same sequence already exists,
+		e.g. from an earlier cancel, the frames are merged into it rather than
+		replacing its frame range, so its other frames aren't lost.
+
+		Arguments:
+			path (str) -- path to the folder containing the renamed files.
+			prefix (str) -- the first part of the filename.
+			frames (str) -- the frame numbers of the renamed files,
+				represented as a string.
+			ext (str) -- the filename extension.
+			count (int) -- the number of renamed files.
+
+		Return the ID of the new or existing task.
+		"""
+		task_id = self.tasks.find(path, prefix, ext, ingest.padding_key(frames))
+		if task_id is None:
+			return self.tasks.add(path, prefix, frames, ext, count, 'Complete')
+
+		if frames and self.tasks[task_id]['frames'] != frames:
+			verbose.detail("Merging renamed frames into existing task %d." % task_id)
+			self.tasks.update(task_id, **self.merge_frames(task_id, frames))
+		return task_id
+
+
+	def merge_frames(self, task_id, frames):
+		"""Return the frames and count fields of the task with the given ID
+		with the given frames added, as a dict.
+
+		Arguments:
+			task_id (int) -- the ID of the task to merge into.
+			frames (str) -- the frame numbers to add, represented as a
+				string. The padding must match the task's frames.
+		"""
+		item = self.tasks[task_id]
+		if not frames:  # A single file without a frame number
+			return dict(frames=item['frames'], count=item['count'])
+
+		existing, padding = frameset.parse(item['frames'])
+		merged = existing.union(frameset.parse(frames)[0])
+		return dict(frames=merged.format(padding), count=len(merged))
 
 
 	def update_task(self, task_id, 
 		path=None, prefix=None, frames=None, 
 		ext=None, count=None, status=None, log=None):
-		"""Update the task item at a given index."""
-
-		if path is not None:
-			self.tasks[task_id]['path'] = path
-		if prefix is not None:
-			self.tasks[task_id]['prefix'] = prefix
-		if frames is not None:
-			self.tasks[task_id]['frames'] = frames
-		if ext is not None:
-			self.tasks[task_id]['ext'] = ext
-		if count is not None:
-			self.tasks[task_id]['count'] = count
-		if status is not None:
-			self.tasks[task_id]['status'] = status
-		if log is not None:
-			self.tasks[task_id]['log'] = log
+		"""Update the task item with the given ID.
+
+		If the new path, prefix, frames or extension identify a sequence
+		which already belongs to another task, this task is merged into that
+		task and removed.
+		"""
+
+		fields = dict(path=path, prefix=prefix, frames=frames, 
+			ext=ext, count=count, status=status, log=log)
+		fields = dict((k, v) for k, v in fields.items() if v is not None)
+		try:
+			self.tasks.update(task_id, **fields)
+		except taskregistry.DuplicateTask as e:
+			# The sequence already belongs to another task, e.g. the files
+			# were renamed into an existing sequence, so merge this task
+			# into it
+			verbose.detail("Merging task %d into existing task %d." % (task_id, e.task_id))
+			fields.update(self.merge_frames(e.task_id, fields.get('frames', self.tasks[task_id]['frames'])))
+			for key in ('path', 'prefix', 'ext'):
+				fields.pop(key, None)
+			self.conflict_index.remove(task_id)
+			self.tasks.remove([task_id])
+			self.task_model.refresh()
+			task_id = e.task_id
+			self.tasks.update(task_id, **fields)
+
+		# Only this task needs to be previewed again
+		item = self.tasks[task_id]
+		options = self.get_rename_options()
+		renamed_prefixes, error_status = self.replace_prefixes([item], options)
+		rename.plan_task(item, renamed_prefixes[0], options, update_status=False)
+
+		self.check_for_conflicts([item])
+		self.update_task_view()
 
-		self.update_tasks(update_status=False)
 
+	def schedule_preview(self):
+		"""Schedule an update of the task list preview.
 
+		Rapid changes to the inputs, e.g. typing in the find field, are
+		coalesced so that only the latest set of parameters is evaluated once
+		the input settles. The rename button stays disabled until the preview
+		has caught up.
+		"""
+		self.preview_generation += 1
+		self.ui.rename_pushButton.setEnabled(False)
+		self.preview_timer.start()
+
+
+	@timing.timed("Task list update", verbose.detail)
 	def update_tasks(self, update_status=True):
 		"""Update the task list when the inputs are changed.
 
+		If the inputs change while the update is in progress, the update is
+		abandoned in favour of the newer one.
+
 		Arguments:
 		update_status (bool) -- whether to compute the status of tasks.
 		"""
+		if update_status:
+			self.preview_timer.stop()  # This update supersedes a pending one
+		self.preview_generation += 1
+		generation = self.preview_generation
+		self.ui.rename_pushButton.setEnabled(False)
+
 		self.rename_count = 0
 		self.total_count = 0
 
-		# Get find & replace options
-		find_str = self.ui.find_comboBox.currentText()
-		replace_str = self.ui.replace_comboBox.currentText()
-		ignore_case = self.getCheckBoxValue(self.ui.ignoreCase_checkBox)
-		regex = self.getCheckBoxValue(self.ui.regex_checkBox)
+		options = self.get_rename_options()
 
-		# Get renumbering options
-		start = self.ui.start_spinBox.value()
-		step = self.ui.step_spinBox.value()
-		padding = self.ui.padding_spinBox.value()
-		preserve = self.getCheckBoxValue(self.ui.preserveNumbering_checkBox)
-		autopad = self.getCheckBoxValue(self.ui.autoPadding_checkBox)
+		# Take a snapshot of the tasks, as the registry may be modified while
+		# the event loop is serviced
+		items = list(self.tasks)
 
-		# Get extension options
-		change_ext = self.getCheckBoxValue(self.ui.ext_checkBox)
-		ext_to_change = self.ui.ext_lineEdit.text()
+		# Perform text substitution on all prefixes at once, keeping the UI
+		# responsive while waiting for the result
+		def still_current():
+			QtWidgets.QApplication.processEvents()
+			return generation == self.preview_generation
 
-		for item in self.tasks:
+		try:
+			renamed_prefixes, error_status = self.replace_prefixes(items, options, still_current)
+		except regexsandbox.Superseded:
+			verbose.detail("Task list update superseded.")
+			return
 
-			if item['frames']:
-				file = "%s[%s]%s" % (item['prefix'], item['frames'], item['ext'])
-			else:
-				file = "%s%s" % (item['prefix'], item['ext'])
-			item['before'] = file
+		for i, (item, renamed_prefix) in enumerate(zip(items, renamed_prefixes)):
 
-			if change_ext and ext_to_change:
-				new_ext = ".%s" % ext_to_change
-			else:
-				new_ext = item['ext']
-
-			renamed_prefix = rename.replace_text(item['prefix'], find_str, replace_str, ignore_case, regex)
-			if item['frames']:  # If sequence
-				num_list = sequence.numList(item['frames'])
-				renumbered_list, padding = rename.renumber(num_list, start, step, padding, preserve, autopad)
-				renumbered_range = sequence.numRange(renumbered_list, padding)
-				renamed_file = "%s[%s]%s" % (renamed_prefix, renumbered_range, new_ext)
-			else:
-				renamed_file = "%s%s" % (renamed_prefix, new_ext)
-			item['after'] = renamed_file
+			# Keep the UI responsive, and abandon this update if it has been
+			# superseded by newer input
+			if i and not i % preview_chunk_size:
+				QtWidgets.QApplication.processEvents()
+				if generation != self.preview_generation:
+					verbose.detail("Task list update superseded.")
+					return
 
-			if update_status:
-				if file == renamed_file:
-					item['status'] = 'Nothing to change'
-				else:
-					item['status'] = 'Ready'
-					self.rename_count += item['count']
+			rename.plan_task(item, renamed_prefix, options, update_status, error_status)
 
+			if update_status and item['status'] == 'Ready':
+				self.rename_count += item['count']
 			self.total_count += item['count']
 
 		conflicts = self.check_for_conflicts()
+		self.update_rename_button(conflicts)
+
+		# pprint(self.tasks)
+		self.update_task_view()
+
+
+	def replace_prefixes(self, items, options, on_wait=None):
+		"""Perform text substitution on the prefixes of the given tasks.
+
+		The find pattern is evaluated in a worker process with a time limit,
+		so a pattern which takes too long can't hang the UI. Return a list
+		of renamed prefixes, or of None if they couldn't be worked out, and
+		the status to give the tasks in that case, as a tuple.
+
+		Arguments:
+			items (list) -- the tasks.
+			options (dict) -- the rename options.
+			on_wait (callable, optional) -- called repeatedly while waiting
+				for the result. If it returns False, regexsandbox.Superseded
+				is raised.
+		"""
+		known_slow = self.regex_sandbox.is_slow(options['find_str'], options['ignore_case'])
+		try:
+			renamed_prefixes = self.regex_sandbox.replace_many(
+				[item['prefix'] for item in items], 
+				options['find_str'], options['replace_str'], 
+				options['ignore_case'], options['regex'], on_wait=on_wait)
+		except regexsandbox.PatternTimeout:
+			if not known_slow:
+				verbose.warning("Find pattern took longer than %gs to evaluate." % self.regex_sandbox.timeout)
+			return [None] * len(items), 'Pattern too slow'
+
+		if renamed_prefixes is None:  # Invalid regex
+			return [None] * len(items), 'Invalid regular expression'
+		return renamed_prefixes, None
+
+
+	def update_rename_button(self, conflicts):
+		"""Update the rename button text and enable it if there are files to
+		rename and no conflicts.
+		"""
 
 		# Update button text
 		if self.rename_count:
@@ -473,149 +817,175 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		else:
 			self.ui.rename_pushButton.setEnabled(False)
 
-		# pprint(self.tasks)
-		self.update_task_view()
-
-
-	def update_task_view(self):
-		"""Populate the GUI task list tree widget with entries."""
-
-		# self.update_tasks(update_status)
-
-		self.ui.taskList_treeWidget.clear()
-		root = self.ui.taskList_treeWidget.invisibleRootItem()
-		child_count = root.childCount()
-
-		for i, item in enumerate(self.tasks):
-			group_item = self.create_task_group_item(item['path'])
-			group_item.setExpanded(True)
 
-			task_item = QtWidgets.QTreeWidgetItem(group_item)
-			task_item.setText(self.header('Task'), str(i))
-			task_item.setText(self.header('Count'), str(item['count']))
-			task_item.setText(self.header('Before'), item['before'])
-			task_item.setText(self.header('After'), item['after'])
+	def get_rename_options(self):
+		"""Return the current find & replace, renumbering, extension and
+		destination options as a dict.
+		"""
+		dest_dir = self.ui.dest_lineEdit.text().strip()
+		if dest_dir and self.getCheckBoxValue(self.ui.move_checkBox):
+			dest_dir = os_wrapper.absolute_path(dest_dir)
+		else:
+			dest_dir = None
+
+		return dict(
+			find_str=self.ui.find_comboBox.currentText(), 
+			replace_str=self.ui.replace_comboBox.currentText(), 
+			ignore_case=self.getCheckBoxValue(self.ui.ignoreCase_checkBox), 
+			regex=self.getCheckBoxValue(self.ui.regex_checkBox), 
+			start=self.ui.start_spinBox.value(), 
+			step=self.ui.step_spinBox.value(), 
+			padding=self.ui.padding_spinBox.value(), 
+			preserve=self.getCheckBoxValue(self.ui.preserveNumbering_checkBox), 
+			autopad=self.getCheckBoxValue(self.ui.autoPadding_checkBox), 
+			change_ext=self.getCheckBoxValue(self.ui.ext_checkBox), 
+			ext_to_change=self.ui.ext_lineEdit.text(), 
+			dest_dir=dest_dir, 
+		)
 
-			# Set icon to indicate status
-			# self.set_task_status(i, item['status'])
 
-			task_item.setText(self.header('Status'), item['status'])
+	@timing.timed("Task view update", verbose.detail)
+	def update_task_view(self):
+		"""Update the GUI task list view with changes to the tasks."""
 
-			if item['status'] =='Nothing to change':
-				task_item.setIcon(self.header('Status'), self.icon['null'])
-				task_item.setForeground(self.header('Status'), self.col['null'])
+		if not self.task_model.refresh():
+			# Resize columns (only visible rows are measured)
+			for col in [self.header('Before'), self.header('After'), self.header('Count')]:
+				self.ui.taskList_treeView.resizeColumnToContents(col)
 
-				task_item.setBackground(self.header('After'), QtGui.QBrush())
-				task_item.setForeground(self.header('After'), self.col['null'])
+		self.update_toolbar_ui()  # Update UI
 
-			elif item['status'] == 'Ready':
-				task_item.setIcon(self.header('Status'), self.icon['ready'])
-				task_item.setForeground(self.header('Status'), self.col['ready'])
+		# Only update the watched directories when they change
+		task_dirs = set(self.task_model.groups())
+		if task_dirs != self.task_dirs:
+			self.task_dirs = task_dirs
+			self.update_watches()
 
-				task_item.setBackground(self.header('After'), QtGui.QBrush())
-				task_item.setForeground(self.header('After'), self.col['ready'])
 
-			elif item['status'] == 'Complete':
-				task_item.setIcon(self.header('Status'), self.icon['done'])
-				task_item.setForeground(self.header('Status'), self.col['done'])
+	def task_view_reset(self):
+		"""Set up the task list view after the model has been reset."""
 
-				task_item.setBackground(self.header("After"), QtGui.QBrush())
-				task_item.setForeground(self.header("After"), self.col['null'])
+		view = self.ui.taskList_treeView
+		root = QtCore.QModelIndex()
+		for row in range(self.task_model.group_count()):
+			view.setFirstColumnSpanned(row, root, True)
+		view.expandAll()
 
-			elif item['status'] == 'Output filename conflict':
-				task_item.setIcon(self.header('Status'), self.icon['error'])
-				task_item.setForeground(self.header('Status'), self.col['error'])
+		if self.tasks:
+			for col in [self.header('Before'), self.header('After'), self.header('Count')]:
+				view.resizeColumnToContents(col)
 
-				task_item.setBackground(self.header('After'), self.col['error'])
-				task_item.setForeground(self.header('After'), self.col['highlighted-text'])
+		self.update_toolbar_ui()
 
-			else:  # General error
-				task_item.setIcon(self.header('Status'), self.icon['error'])
-				task_item.setForeground(self.header('Status'), self.col['error'])
 
-				task_item.setBackground(self.header("After"), QtGui.QBrush())
-				task_item.setForeground(self.header("After"), self.col['error'])
+	def task_groups_inserted(self, parent, first, last):
+		"""Set up new directory group rows in the task list view."""
 
-		# Resize columns
-		if self.total_count:
-			# for col in range(self.ui.taskList_treeWidget.columnCount()):
-			for col in [self.header('Before'), self.header('After'), self.header('Count')]:
-				self.ui.taskList_treeWidget.resizeColumnToContents(col)
-		else:
-			msg = "Add sequences to rename by dragging and dropping files or folders on to this window, or use the 'Add' button."
-			group_item = self.create_task_group_item(msg)
-			group_item.setBackground(0, self.col['warning-bg'])
-			group_item.setForeground(0, self.col['warning-text'])
-			group_item.setIcon(0, self.iconSet('add.svg', tintNormal=self.col['warning-text']))
+		if parent.isValid():
+			return
 
-		self.update_toolbar_ui()  # Update UI
+		view = self.ui.taskList_treeView
+		for row in range(first, last+1):
+			view.setFirstColumnSpanned(row, parent, True)
+			view.expand(self.task_model.index(row, 0, parent))
 
 
-	@QtCore.Slot(int, int)
-	def expand_task(self, item, column):
+	def expand_task(self, index):
 		"""Open a new view showing a task in more detail.
 
 		This is shown when an item is double-clicked.
 		"""
-		try:
-			task_id = self.get_task_id(item)
-		except ValueError:
+		task_id = self.get_task_id(index)
+		if task_id is None:
 			return
 
 		try:
 			self.taskDetailViewUI.display(task_id, self.tasks[task_id])
 		except AttributeError:
+			import detailview  # Imported on first use to speed up startup
 			self.taskDetailViewUI = detailview.dialog(self)
 			self.taskDetailViewUI.display(task_id, self.tasks[task_id])
 
 
-	def check_for_conflicts(self):
-		"""Check for conflicts in renamed files."""
+	@timing.timed("Conflict check", verbose.detail)
+	def check_for_conflicts(self, items=None):
+		"""Check for conflicts in renamed files.
 
-		outputs = []
-		for item in self.tasks:
-			outpath = os.path.normpath(os.path.join(item['path'], item['after']))
-			outputs.append(outpath.lower())
+		Only tasks whose output has changed are re-indexed.
+
+		Arguments:
+			items (list, optional) -- the tasks which may have changed. If
+				not specified, all tasks are checked.
+		"""
+		if items is None:
+			items = self.tasks
 
-		# Find duplicate outputs
-		conflicts = set([x for x in outputs if outputs.count(x) > 1])
+		for item in items:
+			self.conflict_index.update(item['id'], item['dst_path'], item['after'])
 
 		# Highlight duplicates in list view
-		for item in self.tasks:
-			outpath = os.path.normpath(os.path.join(item['path'], item['after']))
-			if outpath.lower() in conflicts: # and item['status'] == 'Ready':
-				item['status'] = 'Output filename conflict'
+		for task_id in self.conflict_index.conflicting_ids():
+			self.tasks[task_id]['status'] = 'Output filename conflict'
+
+		conflict_count = len(self.conflict_index)
+		if conflict_count:
+			verbose.warning("%d rename conflict(s) found." % conflict_count)
 
-		# self.ui.taskList_treeWidget.resizeColumnToContents(self.header('Status'))
+		return conflict_count
 
-		if len(conflicts):
-			verbose.warning("%d rename conflict(s) found." % len(conflicts))
 
-		return len(conflicts)
+	def select_conflicting_tasks(self):
+		"""Select the tasks which conflict with the selected tasks.
 
+		If no conflicting tasks are selected, select all conflicting tasks.
+		The view is scrolled to show the first one.
+		"""
+		task_ids = set()
+		for task_id in self.get_selected_task_ids():
+			task_ids.update(self.conflict_index.colliding(task_id))
+
+		if not task_ids:
+			task_ids = self.conflict_index.conflicting_ids()
+		if not task_ids:
+			return
 
-	def load_find_str(self, item=None, column=0):
+		view = self.ui.taskList_treeView
+		selection = QtCore.QItemSelection()
+		for task_id in task_ids:
+			index = self.task_model.index_for_task(task_id)
+			selection.select(index, index)
+
+		view.selectionModel().select(selection, 
+			QtCore.QItemSelectionModel.ClearAndSelect | QtCore.QItemSelectionModel.Rows)
+		view.scrollTo(self.task_model.index_for_task(min(task_ids)))
+
+
+	def load_find_str(self, index=None):
 		"""Copy the selected file name prefix to the 'Find' text field."""
 
-		if not item:
-			item = self.ui.taskList_treeWidget.selectedItems()[-1]
+		if isinstance(index, QtCore.QModelIndex):
+			task_id = self.get_task_id(index)
+		else:
+			task_id = self.get_selected_task_ids()[-1]
 
-		text = self.tasks[self.get_task_id(item)]['prefix']
+		text = self.tasks[task_id]['prefix']
 
 		if self.ui.find_comboBox.findText(text) == -1:
 			self.ui.find_comboBox.insertItem(0, text)
 		self.ui.find_comboBox.setCurrentIndex(self.ui.find_comboBox.findText(text))
 
 
-	def load_replace_str(self, item=None, column=0):
+	def load_replace_str(self, index=None):
 		"""Copy the selected file name prefix to the 'Replace' text field.
 
 		Non-alphanumeric characters will be replaced with underscores.
 		"""
-		if not item:
-			item = self.ui.taskList_treeWidget.selectedItems()[-1]
+		if isinstance(index, QtCore.QModelIndex):
+			task_id = self.get_task_id(index)
+		else:
+			task_id = self.get_selected_task_ids()[-1]
 
-		text = self.tasks[self.get_task_id(item)]['prefix']
+		text = self.tasks[task_id]['prefix']
 		text = os_wrapper.sanitize(text, pattern=r'[^\w\.-]', replace='_')
 
 		if self.ui.replace_comboBox.findText(text) == -1:
@@ -623,36 +993,66 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.ui.replace_comboBox.setCurrentIndex(self.ui.replace_comboBox.findText(text))
 
 
+	def start_rename(self):
+		"""Start the rename operation.
+
+		A dry run is performed first to check that no files will be
+		overwritten, unless every directory involved supports atomic
+		no-overwrite renames, in which case each rename checks for itself.
+		"""
+		items = [item for item in self.tasks if item['status'] == 'Ready']
+		dirs = set(item['path'] for item in items) | set(item['dst_path'] for item in items)
+		validate = self.getCheckBoxValue(self.ui.validate_checkBox) \
+		        or not all(fileops.supports_noreplace(path) for path in dirs)
+
+		if not validate:
+			verbose.detail("Skipping dry run, atomic no-overwrite renames are supported.")
+		self.perform_file_rename(dry_run=validate)
+
+
 	def perform_file_rename(self, dry_run=True):
 		"""Perform the file rename operation(s)."""
 
 		self.save()  # Save settings
 
 		self.ui.rename_pushButton.hide()
+		self.ui.pause_pushButton.setText("Pause")
+		self.ui.pause_pushButton.show()
 		self.ui.cancel_pushButton.show()
-		self.ui.rename_progressBar.show()
-		self.ui.rename_progressBar.setValue(0)
-
 		# Generate list of tasks for processing
 		items_to_process = []
-		for i, item in enumerate(self.tasks):
+		for item in self.tasks:
 			# Only add tasks where the operation will make changes
 			if item['status'] == 'Ready':
-				item['id'] = i  # Bit of a hack
 				items_to_process.append(item)
 
+		self.ui.rename_progressBar.show()
+		self.ui.rename_progressBar.setMaximum(sum(item['count'] for item in items_to_process))
+		self.ui.rename_progressBar.setValue(0)
+		self.ui.rename_progressBar.setFormat("%p%")
+
+		if self.getCheckBoxValue(self.ui.fullLogs_checkBox):
+			log_dir = os.path.join(prefs_location, 'logs')
+		else:
+			log_dir = None
+
 		# Initialise worker thread, connect signals & slots, start processing
+		self.job_control = jobcontrol.JobControl()
 		self.workerThread = BatchRenameThread(
 			items_to_process, 
 			# dry_run=self.getCheckBoxValue(self.ui.dryRun_checkBox), 
 			dry_run=dry_run, 
 			ignore_errors=self.getCheckBoxValue(self.ui.ignoreErrors_checkBox), 
+			workers=self.ui.workers_spinBox.value(), 
+			control=self.job_control, 
+			log_dir=log_dir, 
 		)
 		self.workerThread.printError.connect(verbose.error) #self.error
 		self.workerThread.printMessage.connect(verbose.message)
 		self.workerThread.printProgress.connect(verbose.progress)
-		self.workerThread.updateProgressBar.connect(self.update_progress_bar)
+		self.workerThread.progressUpdated.connect(self.update_progress)
 		self.workerThread.taskCompleted.connect(self.task_completed)
+		self.workerThread.taskStatus.connect(self.task_status_changed)
 		if dry_run:
 			self.workerThread.finished.connect(self.dry_run_completed)
 		else:
@@ -668,29 +1068,132 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 	# 	print('\033[38;5;197m' + "ERROR: " + message + '\033[0m')
 
 
-	@QtCore.Slot(int)
-	def update_progress_bar(self, value):
-		"""Update progress bar."""
+	@QtCore.Slot(tuple)
+	def update_progress(self, progress):
+		"""Update progress bar, showing throughput and time remaining."""
+
+		done, total, rate, eta = progress
+		self.ui.rename_progressBar.setMaximum(total)
+		self.ui.rename_progressBar.setValue(done)
 
-		self.ui.rename_progressBar.setValue(value)
+		if self.job_control.is_paused():
+			text = "Paused - %p%"
+		elif eta is None:
+			text = "%p%"
+		else:
+			m, s = divmod(int(eta), 60)
+			h, m = divmod(m, 60)
+			if h:
+				remaining = "%d:%02d:%02d" % (h, m, s)
+			else:
+				remaining = "%d:%02d" % (m, s)
+			text = "%%p%% - %d files/s - %s left" % (rate, remaining)
+		self.ui.rename_progressBar.setFormat(text)
 
 
 	@QtCore.Slot(tuple)
 	def task_completed(self, new_task):
-		"""Update task in list view."""
+		"""Update task in list view.
+
+		The renamed files are described by the task's planned output, so the
+		directory doesn't need to be read again. Unless disabled, the first
+		and last renamed files are checked to make sure they exist; if not,
+		the sequence is detected from the files on disk instead.
+		"""
+		task_id, status, log, filepath, remaining = new_task
+		item = self.tasks[task_id]
+		output = item.get('output')
+		dst_path = item['dst_path']
 
-		task_id, status, log, filepath = new_task
 		if status == 'Complete':
-			if os.path.isfile(filepath):
-				path, prefix, frames, ext, count = sequence.detectSeq(filepath, delimiter="", ignorePadding=False)
-				self.update_task(task_id, path, prefix, frames, ext, count, status, log)
+			if output is not None and self.verify_output(item, item['count'], filepath):
+				prefix, frames, ext = output
+				self.update_task(task_id, path=dst_path, prefix=prefix, frames=frames, ext=ext, status=status, log=log)
+			else:
+				seq = ingest.detect_file(filepath)
+				if seq is not None:
+					self.update_task(task_id, *seq, status=status, log=log)
+
+		elif remaining is not None:  # Cancelled part way through
+			# Add the files already renamed as a new task, and update the task
+			# to contain only the files remaining
+			done = None
+			if output is not None and item['frames']:
+				frame = rename.frame_number(remaining, item['prefix'], item['ext'])
+				if frame is not None:
+					done = rename.num_range_index(item['frames'], frame)
+
+			if done is None:  # Fall back to detecting the sequences on disk
+				seq = ingest.detect_file(filepath) if filepath else None
+				if seq is not None:
+					self.update_task(self.add_completed_task(*seq))
+				seq = ingest.detect_file(remaining)
+				if seq is not None:
+					self.update_task(task_id, *seq, status=status, log=log)
+				else:
+					self.update_task(task_id, status=status, log=log)
+				return
+
+			if done:
+				if self.verify_output(item, done, filepath):
+					prefix, frames, ext = output
+					done_frames = rename.split_num_range(frames, done)[0]
+					self.update_task(self.add_completed_task(dst_path, prefix, done_frames, ext, done))
+				else:
+					seq = ingest.detect_file(filepath)
+					if seq is not None:
+						self.update_task(self.add_completed_task(*seq))
+
+			remaining_frames = rename.split_num_range(item['frames'], done)[1]
+			self.update_task(task_id, frames=remaining_frames, count=item['count']-done, status=status, log=log)
+
 		else:
 			self.update_task(task_id, status=status, log=log)
 
 
+	def verify_output(self, item, count, last_file):
+		"""Check the files renamed by a task exist.
+
+		Only the first and last renamed files are checked. Return True if they
+		exist, or if verification is disabled.
+
+		Arguments:
+			item (dict) -- the task.
+			count (int) -- the number of files renamed.
+			last_file (str) -- the path of the last file renamed.
+		"""
+		if not self.getCheckBoxValue(self.ui.verifyRenamed_checkBox):
+			return True
+		if not count or not last_file:
+			return False
+
+		first_file = next(rename.frame_pairs(item['path'], item['before'], item['after'], item['dst_path']))[1]
+		if os.path.isfile(first_file) and os.path.isfile(last_file):
+			return True
+
+		verbose.warning("Renamed files not found, detecting sequence from disk: %s" % last_file)
+		return False
+
+
+	@QtCore.Slot(tuple)
+	def task_status_changed(self, task_status):
+		"""Update the status of a task in progress, e.g. when paused."""
+
+		task_id, status = task_status
+		if task_id in self.tasks:
+			self.tasks[task_id]['status'] = status
+			self.update_task_view()
+
+
 	def dry_run_completed(self):
 		"""Function to execute when the dry run rename operation finishes."""
 
+		if self.job_control.is_cancelled():
+			verbose.message("Dry run cancelled.")
+			self.update_tasks()  # Restore task statuses
+			self.reset_rename_ui()
+			return
+
 		verbose.message("Dry run completed.")
 
 		ready = True 
@@ -707,30 +1210,65 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 			dialog_msg = "Errors were detected during the dry run. \nExisting files could be overwritten as a result of the rename operation causing loss of data. No files have been renamed. \nPlease check the task logs (double-click the entry in the task view) for further details, resolve the problems and try again."
 			self.promptDialog(dialog_msg, title=dialog_title, conf=True, warn=True)
 
-			self.ui.rename_pushButton.show()
-			self.ui.cancel_pushButton.hide()
-			self.ui.rename_progressBar.hide()
+			self.reset_rename_ui()
 
 
 	def rename_completed(self):
 		"""Function to execute when the rename operation finishes."""
 
-		verbose.message("Batch rename job completed.")
+		if self.job_control.is_cancelled():
+			verbose.message("Batch rename job cancelled.")
+		else:
+			verbose.message("Batch rename job completed.")
+
+		self.update_tasks(update_status=False)  # Update rename button
+		self.reset_rename_ui()
+
+
+	def reset_rename_ui(self):
+		"""Restore the rename controls after a job has finished."""
 
 		self.ui.rename_pushButton.show()
+		self.ui.pause_pushButton.hide()
 		self.ui.cancel_pushButton.hide()
 		self.ui.rename_progressBar.hide()
 
+		for line in timing.summary():
+			verbose.detail(line)
+
+		# Apply directory changes held back while the job was running
+		if self.watch_changes:
+			self.directories_changed(())
+
+
+	def toggle_pause(self):
+		"""Pause or resume the rename operation.
+
+		A paused job stops before the next file and continues from there when
+		resumed, without being validated again.
+		"""
+		if self.job_control.is_paused():
+			verbose.message("Resuming rename job.")
+			self.job_control.resume()
+			self.ui.pause_pushButton.setText("Pause")
+			self.ui.rename_progressBar.setFormat("%p%")
+		else:
+			verbose.message("Pausing rename job.")
+			self.job_control.pause()
+			self.ui.pause_pushButton.setText("Resume")
+			self.ui.rename_progressBar.setFormat("Paused - %p%")
+
 
 	def cancel_rename(self):
 		"""Stop the rename operation.
 
-		TODO: need to clean up incomplete tasks
+		The job stops cleanly between files. Tasks which were part way
+		through are split into the files already renamed and the files
+		remaining.
 		"""
 		verbose.message("Aborting rename job.")
-		self.workerThread.terminate()  # Enclose in try/except?
-
-		# self.ui.taskList_treeWidget.resizeColumnToContents(self.header('Status'))
+		self.job_control.cancel()
+		self.ui.pause_pushButton.hide()
 
 
 	def dragEnterEvent(self, e):
@@ -772,7 +1310,7 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.save()  # Save settings
 		self.storeWindow()  # Store window geometry
 		self.storeWidgetState(self.ui.splitter, "splitterSizes")  # Store splitter size state
-		self.settings.setValue("taskView", self.ui.taskList_treeWidget.header().saveState())
+		self.settings.setValue("taskView", self.ui.taskList_treeView.header().saveState())
 
 # ----------------------------------------------------------------------------
 # End main application class
@@ -781,121 +1319,95 @@ class SequenceRenameApp(QtWidgets.QMainWindow, UI.TemplateUI):
 # ----------------------------------------------------------------------------
 
 class BatchRenameThread(QtCore.QThread):
-	"""Worker thread class."""
+	"""Worker thread class.
+
+	Runs a RenameJob, relaying its progress as signals.
+	"""
 
 	# Create signals
 	printError = QtCore.Signal(str)
 	printMessage = QtCore.Signal(str)
 	printProgress = QtCore.Signal(str)
 	updateProgressBar = QtCore.Signal(int)
+	progressUpdated = QtCore.Signal(tuple)
 	taskCompleted = QtCore.Signal(tuple)
+	taskStatus = QtCore.Signal(tuple)
 
-	def __init__(self, tasks, dry_run=True, ignore_errors=True):
+	def __init__(self, tasks, **kwargs):
 		"""Initialise thread.
 
 		Arguments:
 			tasks (list) -- list of tasks for processing.
-			dry_run (bool, optional) -- perform a dry run (don't actually
-				rename anything).
-			ignore_errors (bool, optional) -- if True, continue batch
-				processing even if errors are raised.
+			**kwargs -- options passed to RenameJob.
 		"""
 		QtCore.QThread.__init__(self)
-		self.tasks = tasks
-		self.dry_run = dry_run
-		self.ignore_errors = ignore_errors
-		self.files_processed = 0
+		self.job = renamejob.RenameJob(tasks, **kwargs)
+		self.job.on_error = self.printError.emit
+		self.job.on_message = self.printMessage.emit
+		self.job.on_progress = self.report_progress
+		self.job.on_task_completed = self.taskCompleted.emit
+		self.job.on_task_status = self.taskStatus.emit
 
 
 	def __del__(self):
 		self.wait()
 
 
+	def report_progress(self, progress):
+		self.updateProgressBar.emit(progress[0])
+		self.progressUpdated.emit(progress)
+
+
 	def run(self):
-		for item in self.tasks:
-			new_task = self._rename_task(item)
-			self.taskCompleted.emit(new_task)
+		with timing.thread_profile(), timing.phase("Rename job"):
+			self.job.run()
+
 
+class IngestThread(QtCore.QThread):
+	"""Worker thread class.
 
-	def _rename_task(self, item):
-		"""Perform the file rename operation(s).
+	Scans directories for sequences, relaying them in batches as signals.
+	"""
 
-		Return a tuple containing the following items:
-		- the index of the task being processed;
-		- the status of the task;
-		- the status of the task;
-		- a filename to be processed as a new task.
+	# Create signals
+	printError = QtCore.Signal(str)
+	sequencesFound = QtCore.Signal(tuple)
+
+	def __init__(self, roots, **kwargs):
+		"""Initialise thread.
+
+		Arguments:
+			roots (list) -- list of directories to scan.
+			**kwargs -- options passed to ingest.walk().
 		"""
-		errors = 0
-		last_index = 0
-		log = []
-
-		task_id = item['id']
-		task_status = item['status']
-		task_before = item['before']
-		task_after = item['after']
-		task_path = item['path']
-
-		src_file_list = sequence.expandSeq(task_path, task_before)
-		dst_file_list = sequence.expandSeq(task_path, task_after)
-
-		# Only go ahead and rename if the operation will make changes
-		msg = "%s: Rename '%s' to '%s'" % (task_id, task_before, task_after)
-		if self.dry_run:
-			self.printMessage.emit("[Dry run] %s" % msg)
-		else:
-			self.printMessage.emit(msg)
-		# self.printMessage.emit("Renaming 0%")
-
-		for i in range(len(src_file_list)):
-			if self.dry_run:
-				success = True
-				if not os.path.isfile(src_file_list[i]):
-					msg = "Source file does not exist: %s" % dst_file_list[i]
-					log.append(msg)
-					success = False
-				if os.path.isfile(dst_file_list[i]):
-					msg = "Destination file exists and would be overwritten: %s" % dst_file_list[i]
-					log.append(msg)
-					success = False
-			else:  # Actually perform the rename operation
-				success, msg = os_wrapper.rename(src_file_list[i], dst_file_list[i], quiet=True)
-				log.append(msg)
-
-			if success:
-				last_index = i
-				progress = (float(i)/float(len(src_file_list)))*100
-				# self.printProgress.emit("Renaming %d%%" % progress)
-			else:
-				errors += 1
-				self.printError.emit(msg)
-				if not self.ignore_errors:  # Task stopped due to error
-					return task_id, "Interrupted", log, src_file_list[-1]
-
-			self.files_processed += 1
-			self.updateProgressBar.emit(self.files_processed)
-
-		if errors == 0:  # Task completed successfully
-			# self.printProgress.emit("Renaming 100%")
-			if self.dry_run:
-				status = 'Ready'
-			else:
-				status = 'Complete'
-			log.append(status)
-			return task_id, status, log, dst_file_list[i]
+		QtCore.QThread.__init__(self)
+		self.roots = roots
+		self.kwargs = kwargs
+		self.control = jobcontrol.JobControl()
+		self.found = 0
+		self.elapsed = 0.0
 
-		else:  # Task completed with errors, which were ignored
-			if errors == 1:
-				status = '1 error'
-			else:
-				status = '%d errors' % errors
-			self.printMessage.emit("Task generated %s." % status)
-			log.append(status)
-			return task_id, status, log, dst_file_list[last_index]
-
-		# else:  # Task skipped
-		# 	self.printMessage.emit("%s: Rename task skipped." % task_id)
-		# 	return task_id, 'Nothing to change', "" #src_file_list[0]
+
+	def __del__(self):
+		self.wait()
+
+
+	def report_error(self, dirpath, e):
+		self.printError.emit("Could not read directory: %s (%s)" % (dirpath, e))
+
+
+	def run(self):
+		start = time.perf_counter()
+		with timing.thread_profile():
+			for chunk in ingest.walk(self.roots, control=self.control, 
+				on_error=self.report_error, **self.kwargs):
+				if self.control.is_cancelled():
+					break
+				self.found += len(chunk)
+				self.sequencesFound.emit(tuple(chunk))
+
+		self.elapsed = time.perf_counter() - start
+		timing.record("Directory scan", self.elapsed)
 
 # ----------------------------------------------------------------------------
 # End worker thread class
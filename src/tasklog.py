@@ -0,0 +1,134 @@
+#!/usr/bin/python
+
+# tasklog.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Compact, bounded logs for rename tasks. Successful operations are counted
+# and only the most recent are kept in memory, while errors are kept in full.
+# Optionally, every entry is also written to a file on disk, which can be
+# read back in pages.
+
+
+import collections
+import itertools
+import os
+
+
+# Number of recent entries to keep in memory for each task
+recent_size = 200
+
+
+class TaskLog(object):
+	"""Log of the operations performed by a task.
+
+	Iterating over the log yields lines of text for display: a summary, all
+	errors, and the most recent entries.
+	"""
+
+	def __init__(self, spill_path=None):
+		"""Initialise the log.
+
+		Arguments:
+			spill_path (str, optional) -- path to a file to write the complete
+				log to.
+		"""
+		self.successes = 0  # Number of files processed successfully
+		self.failures = 0  # Number of files which failed
+		self.errors = []  # Error messages
+		self.recent = collections.deque(maxlen=recent_size)
+		self.entries = 0
+		self.spill_path = spill_path
+
+		self._spill = None
+		if spill_path:
+			try:
+				os.makedirs(os.path.dirname(spill_path), exist_ok=True)
+				self._spill = open(spill_path, 'w')
+			except OSError:
+				self.spill_path = None
+
+
+	def __iter__(self):
+		yield self.summary()
+		if self.errors:
+			yield ""
+			yield "Errors:"
+			for message in self.errors:
+				yield message
+		if self.recent:
+			yield ""
+			if self.entries > len(self.recent):
+				yield "Last %d of %d entries:" % (len(self.recent), self.entries)
+			else:
+				yield "Entries:"
+			for message in self.recent:
+				yield message
+
+
+	def _add(self, message):
+		self.entries += 1
+		self.recent.append(message)
+		if self._spill is not None:
+			self._spill.write(message + "\n")
+
+
+	def success(self, messages=()):
+		"""Record a file processed successfully, with its messages, if any,
+		e.g. none for a file validated by a dry run.
+		"""
+		self.successes += 1
+		for message in messages:
+			self._add(message)
+
+
+	def error(self, messages):
+		"""Record a file which failed, with its error messages. However many
+		messages there are, the file counts as one error.
+		"""
+		self.failures += 1
+		for message in messages:
+			self.errors.append(message)
+			self._add(message)
+
+
+	def note(self, message):
+		"""Record an informational message, e.g. the task status."""
+
+		self._add(message)
+
+
+	def close(self):
+		"""Close the spill file, if any. The log can no longer be added to."""
+
+		if self._spill is not None:
+			self._spill.close()
+			self._spill = None
+
+
+	def summary(self):
+		"""Return a one-line summary of the log."""
+
+		if self.failures == 1:
+			errors = "1 error"
+		else:
+			errors = "%d errors" % self.failures
+
+		return "%d succeeded, %s" % (self.successes, errors)
+
+
+	def read_pages(self, page_size=1000):
+		"""Yield the complete log from the spill file, as lists of lines.
+
+		The file is read lazily, one page at a time.
+		"""
+		if not self.spill_path:
+			return
+
+		with open(self.spill_path) as f:
+			while True:
+				page = [line.rstrip("\n") for line in itertools.islice(f, page_size)]
+				if not page:
+					break
+				yield page
@@ -0,0 +1,398 @@
+#!/usr/bin/python
+
+# taskmodel.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Task Model
+# An item model exposing the task list to a tree view. Tasks are grouped by
+# directory. Data is read directly from the task store, so only rows which
+# are visible need to be painted, and updates only touch the rows which have
+# actually changed.
+
+
+import collections
+
+from Qt import QtCore, QtGui
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+COLUMNS = ['Status', 'Task', 'Before', 'After', 'Count']
+STATUS, TASK, BEFORE, AFTER, COUNT = range(len(COLUMNS))
+
+# Custom data role to retrieve the task ID for an index
+TaskIdRole = QtCore.Qt.UserRole
+
+# Status styles: status icon / status text colour / 'After' column background
+# colour / 'After' column text colour. Unlisted statuses are shown as errors.
+STATUS_STYLES = {
+	'Nothing to change': ('null', 'null', None, 'null'),
+	'Ready': ('ready', 'ready', None, 'ready'),
+	'Complete': ('done', 'done', None, 'null'),
+	'Output filename conflict': ('error', 'error', 'error', 'highlighted-text'),
+}
+ERROR_STYLE = ('error', 'error', None, 'error')
+
+# ----------------------------------------------------------------------------
+# Task model class
+# ----------------------------------------------------------------------------
+
+class TaskModel(QtCore.QAbstractItemModel):
+	"""Two-level item model: directory groups containing tasks.
+
+	Top-level indices have an internal ID of 0. Task indices store the
+	stable ID of their group as the internal ID, so the parent can be found
+	with a single lookup, and indices stay valid when groups are inserted or
+	removed above them.
+	"""
+
+	def __init__(self, tasks, parent=None):
+		"""Initialise the model.
+
+		Arguments:
+			tasks (TaskRegistry) -- the task store.
+		"""
+		super(TaskModel, self).__init__(parent)
+		self.tasks = tasks
+
+		self.icon = {}  # Status icons
+		self.col = {}  # Colours
+		self.conflicts = None  # Conflict index, to look up colliding tasks
+		self.group_icon = None
+		self.placeholder = ""
+		self.placeholder_icon = None
+
+		self._groups = []  # Group paths, in display order
+		self._group_ids = []  # Internal ID of each group, in display order
+		self._group_index = {}  # Internal ID -> group row
+		self._next_group_id = 1
+		self._rows = []  # List of task IDs for each group
+		self._task_rows = {}  # Task ID -> (group row, row)
+		self._state = []  # Displayed values for each task row, for diffing
+
+
+	def refresh(self):
+		"""Synchronise the model with the task store.
+
+		Rows are removed and inserted for tasks which have been added,
+		removed or moved between groups, and groups are removed and inserted
+		as they empty or appear. Groups which remain keep their order, and
+		new groups are added at the end. The rows whose displayed values have
+		changed are signalled. The model is only reset when the list changes
+		to or from empty, or every group is replaced. Return True if the
+		model was reset.
+		"""
+		group_tasks = collections.OrderedDict()  # Path -> task IDs
+		for item in self.tasks:
+			group_tasks.setdefault(item['path'], []).append(item['id'])
+
+		groups = [path for path in self._groups if path in group_tasks]
+		if not groups:
+			groups = list(group_tasks)
+			rows = list(group_tasks.values())
+			if groups != self._groups:  # Including the placeholder changing
+				self._reset(groups, rows)
+				return True
+		else:
+			remaining = set(groups)
+			groups.extend(path for path in group_tasks if path not in remaining)
+			rows = [group_tasks[path] for path in groups]
+
+		if groups == self._groups and rows == self._rows:
+			self._emit_changed_rows()
+			return False
+
+		task_groups = dict((task_id, path) 
+			for path, ids in zip(groups, rows) for task_id in ids)
+
+		# Remove tasks which have gone or moved to another group, then groups
+		# which are left empty
+		for group_row in reversed(range(len(self._groups))):
+			path = self._groups[group_row]
+			ids = self._rows[group_row]
+			keep = [task_groups.get(task_id) == path for task_id in ids]
+			for first, last in reversed(_runs(keep, False)):
+				self.beginRemoveRows(self.index(group_row, 0), first, last)
+				del ids[first:last+1]
+				del self._state[group_row][first:last+1]
+				self.endRemoveRows()
+
+			if path not in group_tasks:
+				self.beginRemoveRows(QtCore.QModelIndex(), group_row, group_row)
+				del self._groups[group_row]
+				del self._group_ids[group_row]
+				del self._rows[group_row]
+				del self._state[group_row]
+				self._update_group_index()
+				self.endRemoveRows()
+
+		# Insert new groups, with their tasks, and tasks added to existing
+		# groups. The remaining tasks are already in order, as the task store
+		# is never reordered.
+		for group_row, (path, new_ids) in enumerate(zip(groups, rows)):
+			if group_row == len(self._groups):
+				self.beginInsertRows(QtCore.QModelIndex(), group_row, group_row)
+				self._groups.append(path)
+				self._group_ids.append(self._next_group_id)
+				self._next_group_id += 1
+				self._rows.append(list(new_ids))
+				self._state.append([self._task_state(i) for i in new_ids])
+				self._update_group_index()
+				self.endInsertRows()
+				continue
+
+			ids = self._rows[group_row]
+			existing = set(ids)
+			is_new = [task_id not in existing for task_id in new_ids]
+			for first, last in _runs(is_new, True):
+				added = new_ids[first:last+1]
+				self.beginInsertRows(self.index(group_row, 0), first, last)
+				ids[first:first] = added
+				self._state[group_row][first:first] = [self._task_state(i) for i in added]
+				self.endInsertRows()
+
+		self._task_rows = self._map_task_rows()
+		self._emit_changed_rows()
+		return False
+
+
+	def _reset(self, groups, rows):
+		"""Reset the model with the given groups and rows."""
+
+		self.beginResetModel()
+		self._groups = groups
+		self._group_ids = list(range(self._next_group_id, self._next_group_id+len(groups)))
+		self._next_group_id += len(groups)
+		self._update_group_index()
+		self._rows = rows
+		self._task_rows = self._map_task_rows()
+		self._state = [[self._task_state(i) for i in ids] for ids in rows]
+		self.endResetModel()
+
+
+	def _update_group_index(self):
+		"""Update the lookup of group rows by internal ID."""
+
+		self._group_index = dict(
+			(group_id, group_row) 
+			for group_row, group_id in enumerate(self._group_ids))
+
+
+	def _map_task_rows(self):
+		"""Return a dict mapping each task ID to its (group row, row)."""
+
+		return dict(
+			(task_id, (group_row, row)) 
+			for group_row, ids in enumerate(self._rows) 
+			for row, task_id in enumerate(ids))
+
+
+	def _emit_changed_rows(self):
+		"""Signal runs of rows whose displayed values have changed."""
+
+		for group_row, ids in enumerate(self._rows):
+			state = self._state[group_row]
+			first = None
+			for row, task_id in enumerate(ids):
+				new_state = self._task_state(task_id)
+				if new_state != state[row]:
+					state[row] = new_state
+					if first is None:
+						first = row
+				elif first is not None:
+					self._emit_rows_changed(group_row, first, row-1)
+					first = None
+			if first is not None:
+				self._emit_rows_changed(group_row, first, len(ids)-1)
+
+
+	def _task_state(self, task_id):
+		"""Return the displayed values for a task, for change detection."""
+
+		item = self.tasks[task_id]
+		return item.get('before'), item.get('after'), item['status'], item['count']
+
+
+	def _emit_rows_changed(self, group_row, first, last):
+		"""Emit a data changed signal for a range of rows in a group."""
+
+		group_id = self._group_ids[group_row]
+		top_left = self.createIndex(first, 0, group_id)
+		bottom_right = self.createIndex(last, len(COLUMNS)-1, group_id)
+		self.dataChanged.emit(top_left, bottom_right)
+
+
+	def groups(self):
+		"""Return a list of the group paths, in display order."""
+
+		return list(self._groups)
+
+
+	def group_count(self):
+		"""Return the number of top-level rows, including the placeholder."""
+
+		return len(self._groups) or (1 if self.placeholder else 0)
+
+
+	def is_group(self, index):
+		"""Return True if the index refers to a top-level group row."""
+
+		return index.isValid() and index.internalId() == 0
+
+
+	def task_id(self, index):
+		"""Return the task ID for the given index, or None for groups."""
+
+		if not index.isValid() or index.internalId() == 0:
+			return None
+		return self._rows[self._group_index[index.internalId()]][index.row()]
+
+
+	def index_for_task(self, task_id, column=0):
+		"""Return the model index of the given task ID."""
+
+		group_row, row = self._task_rows[task_id]
+		return self.createIndex(row, column, self._group_ids[group_row])
+
+
+	# ------------------------------------------------------------------------
+	# Reimplemented methods
+
+	def index(self, row, column, parent=QtCore.QModelIndex()):
+		if not self.hasIndex(row, column, parent):
+			return QtCore.QModelIndex()
+		if parent.isValid():
+			return self.createIndex(row, column, self._group_ids[parent.row()])
+		return self.createIndex(row, column, 0)
+
+
+	def parent(self, index):
+		if not index.isValid() or index.internalId() == 0:
+			return QtCore.QModelIndex()
+		return self.createIndex(self._group_index[index.internalId()], 0, 0)
+
+
+	def rowCount(self, parent=QtCore.QModelIndex()):
+		if not parent.isValid():
+			return self.group_count()
+		if parent.internalId() == 0 and parent.column() == 0 and self._groups:
+			return len(self._rows[parent.row()])
+		return 0
+
+
+	def columnCount(self, parent=QtCore.QModelIndex()):
+		return len(COLUMNS)
+
+
+	def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+		if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+			return COLUMNS[section]
+
+
+	def flags(self, index):
+		if not index.isValid():
+			return QtCore.Qt.NoItemFlags
+		if index.internalId() == 0:  # Groups are not selectable
+			return QtCore.Qt.ItemIsEnabled
+		return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+
+	def data(self, index, role=QtCore.Qt.DisplayRole):
+		if not index.isValid():
+			return None
+
+		if index.internalId() == 0:
+			return self._group_data(index, role)
+
+		task_id = self.task_id(index)
+		if role == TaskIdRole:
+			return task_id
+
+		item = self.tasks[task_id]
+		column = index.column()
+
+		if role == QtCore.Qt.DisplayRole:
+			if column == STATUS:
+				return item['status']
+			elif column == TASK:
+				return str(task_id)
+			elif column == BEFORE:
+				return item.get('before')
+			elif column == AFTER:
+				return item.get('after')
+			elif column == COUNT:
+				return str(item['count'])
+
+		elif role == QtCore.Qt.ToolTipRole:
+			if column == STATUS and self.conflicts is not None:
+				colliding = self.conflicts.colliding(task_id)
+				if colliding:
+					return "Conflicts with task %s" % ", ".join(str(i) for i in colliding)
+			elif column == AFTER and item.get('dst_path', item['path']) != item['path']:
+				return "Move to %s" % item['dst_path']
+
+		elif column in (STATUS, AFTER):
+			icon, status_fg, after_bg, after_fg = STATUS_STYLES.get(item['status'], ERROR_STYLE)
+
+			if column == STATUS:
+				if role == QtCore.Qt.DecorationRole:
+					return self.icon.get(icon)
+				elif role == QtCore.Qt.ForegroundRole:
+					return self.col.get(status_fg)
+
+			else:
+				if role == QtCore.Qt.BackgroundRole and after_bg:
+					return QtGui.QBrush(self.col[after_bg])
+				elif role == QtCore.Qt.ForegroundRole:
+					return self.col.get(after_fg)
+
+		return None
+
+
+	def _group_data(self, index, role):
+		"""Return data for a top-level group row or the placeholder."""
+
+		if index.column() != 0:
+			return None
+
+		if not self._groups:  # Placeholder message
+			if role == QtCore.Qt.DisplayRole:
+				return self.placeholder
+			elif role == QtCore.Qt.DecorationRole:
+				return self.placeholder_icon
+			elif role == QtCore.Qt.BackgroundRole and 'warning-bg' in self.col:
+				return QtGui.QBrush(self.col['warning-bg'])
+			elif role == QtCore.Qt.ForegroundRole:
+				return self.col.get('warning-text')
+			return None
+
+		if role == QtCore.Qt.DisplayRole:
+			return self._groups[index.row()]
+		elif role == QtCore.Qt.DecorationRole:
+			return self.group_icon
+		return None
+
+# ----------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------
+
+def _runs(flags, value):
+	"""Return a list of (first, last) tuples for each run of consecutive
+	items in a list of flags equal to the given value.
+	"""
+	runs = []
+	first = None
+	for i, flag in enumerate(flags):
+		if flag == value:
+			if first is None:
+				first = i
+		elif first is not None:
+			runs.append((first, i-1))
+			first = None
+	if first is not None:
+		runs.append((first, len(flags)-1))
+	return runs
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+
+# taskregistry.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Sequence Rename Tool Task Registry
+# Storage for rename tasks. Each task is a dict, identified by a stable
+# integer ID which doesn't change when other tasks are added or removed.
+# Tasks are also indexed by (path, prefix, ext, padding) so that matching
+# sequences can be found without scanning the whole list.
+
+
+# Import custom modules
+import ingest
+
+
+class DuplicateTask(ValueError):
+	"""Raised when a task would be given the key of another task.
+
+	The ID of the other task is stored in the task_id attribute.
+	"""
+
+	def __init__(self, task_id):
+		super(DuplicateTask, self).__init__(
+			"Sequence already belongs to task %d" % task_id)
+		self.task_id = task_id
+
+
+class TaskRegistry(object):
+	"""Ordered store of task dicts keyed by stable task ID.
+
+	Iterating over the registry yields the task dicts in the order they were
+	added.
+	"""
+
+	def __init__(self):
+		self._tasks = {}  # Task ID -> task dict (insertion ordered)
+		self._keys = {}  # (path, prefix, ext, padding) -> task ID
+		self._next_id = 0
+
+
+	def __len__(self):
+		return len(self._tasks)
+
+
+	def __iter__(self):
+		return iter(self._tasks.values())
+
+
+	def __contains__(self, task_id):
+		return task_id in self._tasks
+
+
+	def __getitem__(self, task_id):
+		return self._tasks[task_id]
+
+
+	@staticmethod
+	def key(item):
+		"""Return the identifying key for a task dict. Sequences which differ
+		only in the padding of their frame numbers are separate tasks.
+		"""
+		return item['path'], item['prefix'], item['ext'], ingest.padding_key(item['frames'])
+
+
+	def ids(self):
+		"""Return a list of all task IDs."""
+
+		return list(self._tasks)
+
+
+	def find(self, path, prefix, ext, padding):
+		"""Return the ID of the task matching the given sequence, or None.
+
+		Arguments:
+			padding (int) -- the padding of the frame numbers, as returned
+				by ingest.padding_key().
+		"""
+		return self._keys.get((path, prefix, ext, padding))
+
+
+	def add(self, path, prefix, frames, ext, count, status=''):
+		"""Create a new task and return its ID."""
+
+		task_id = self._next_id
+		self._next_id += 1
+
+		self._tasks[task_id] = {
+			'id': task_id,
+			'path': path,
+			'prefix': prefix,
+			'frames': frames,
+			'ext': ext,
+			'count': count,
+			'status': status,
+		}
+		self._keys[self.key(self._tasks[task_id])] = task_id
+		return task_id
+
+
+	def update(self, task_id, **fields):
+		"""Update the fields of an existing task.
+
+		The task is re-indexed if its path, prefix, extension or padding
+		change. Raise DuplicateTask, leaving the task unchanged, if the new
+		key already belongs to another task.
+		"""
+		item = self._tasks[task_id]
+		old_key = self.key(item)
+		new_key = self.key(dict(item, **fields))
+
+		if new_key != old_key:
+			other_id = self._keys.get(new_key)
+			if other_id is not None:
+				raise DuplicateTask(other_id)
+
+		item.update(fields)
+		if new_key != old_key:
+			self._unindex(task_id, old_key)
+			self._keys[new_key] = task_id
+
+
+	def remove(self, task_ids):
+		"""Remove the tasks with the given IDs."""
+
+		for task_id in task_ids:
+			item = self._tasks.pop(task_id, None)
+			if item is not None:
+				self._unindex(task_id, self.key(item))
+
+
+	def clear(self):
+		"""Remove all tasks."""
+
+		self._tasks.clear()
+		self._keys.clear()
+
+
+	def _unindex(self, task_id, key):
+		"""Remove a key from the index if it refers to the given task."""
+
+		if self._keys.get(key) == task_id:
+			del self._keys[key]
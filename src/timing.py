@@ -0,0 +1,246 @@
+#!/usr/bin/python
+
+# timing.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Lightweight timing instrumentation. Named phases record how often they run
+# and how long they take, per-file latencies are sampled into a bounded
+# reservoir for percentiles, and a whole session can optionally be profiled
+# with cProfile, including worker threads, and saved in pstats format.
+
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import pstats
+import random
+import threading
+import time
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+# Environment variable naming a file to write a session profile to
+profile_env_var = 'IC_SQRN_PROFILE'
+
+# Maximum number of latency samples kept for computing percentiles
+latency_samples = 100000
+
+# ----------------------------------------------------------------------------
+# Phase timers
+# ----------------------------------------------------------------------------
+
+_phases = {}  # Name -> [count, total seconds, max seconds]
+_phases_lock = threading.Lock()
+
+
+def record(name, elapsed):
+	"""Add a duration in seconds to the statistics for a phase."""
+
+	with _phases_lock:
+		stats = _phases.setdefault(name, [0, 0.0, 0.0])
+		stats[0] += 1
+		stats[1] += elapsed
+		stats[2] = max(stats[2], elapsed)
+
+
+@contextlib.contextmanager
+def phase(name, report=None):
+	"""Context manager timing a phase of work.
+
+	Arguments:
+		name (str) -- the name of the phase.
+		report (callable, optional) -- called with a message giving the time
+			taken, e.g. verbose.detail.
+	"""
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		elapsed = time.perf_counter() - start
+		record(name, elapsed)
+		if report is not None:
+			report("%s took %.3fs" % (name, elapsed))
+
+
+def timed(name, report=None):
+	"""Decorator timing every call of a function as a phase. See phase()."""
+
+	def decorator(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with phase(name, report):
+				return func(*args, **kwargs)
+		return wrapper
+	return decorator
+
+
+def summary():
+	"""Return a list of lines summarising the phases timed so far."""
+
+	with _phases_lock:
+		phases = sorted(_phases.items(), key=lambda item: -item[1][1])
+
+	return ["%s: %d call(s), %.3fs total, %.3fs mean, %.3fs max" % (
+		name, count, total, total/count, longest)
+		for name, (count, total, longest) in phases]
+
+
+def reset():
+	"""Forget the phases timed so far."""
+
+	with _phases_lock:
+		_phases.clear()
+
+# ----------------------------------------------------------------------------
+# Latency statistics class
+# ----------------------------------------------------------------------------
+
+class LatencyStats(object):
+	"""Thread-safe statistics of a series of durations.
+
+	The count, total and maximum are exact. Percentiles are estimated from a
+	uniform random sample of bounded size, so memory use doesn't depend on
+	the number of durations recorded.
+	"""
+
+	def __init__(self, max_samples=None):
+		self.max_samples = latency_samples if max_samples is None else max_samples
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+		self._samples = []
+		self._random = random.Random(0)
+		self._lock = threading.Lock()
+
+
+	def add(self, elapsed):
+		"""Record a duration in seconds."""
+
+		with self._lock:
+			self.count += 1
+			self.total += elapsed
+			if elapsed > self.max:
+				self.max = elapsed
+
+			# Reservoir sampling
+			if len(self._samples) < self.max_samples:
+				self._samples.append(elapsed)
+			else:
+				i = self._random.randrange(self.count)
+				if i < self.max_samples:
+					self._samples[i] = elapsed
+
+
+	def percentile(self, p):
+		"""Return the estimated p-th percentile in seconds, or None if no
+		durations have been recorded.
+		"""
+		with self._lock:
+			samples = sorted(self._samples)
+		if not samples:
+			return None
+		return samples[min(len(samples)-1, int(p / 100.0 * len(samples)))]
+
+# ----------------------------------------------------------------------------
+# Session profiler
+# ----------------------------------------------------------------------------
+
+_profiles = []  # Profiles of every thread in the session
+_profile_path = None
+_profile_lock = threading.Lock()
+
+
+def _enable_profile():
+	"""Start profiling the current thread.
+
+	Return the profile, or None if the thread is already covered. From
+	Python 3.12, a single profile covers every thread.
+	"""
+	profile = cProfile.Profile()
+	try:
+		profile.enable()
+	except ValueError:  # Another profile is active
+		return None
+
+	with _profile_lock:
+		_profiles.append(profile)
+	return profile
+
+
+def _profile_new_thread(frame, event, arg):
+	"""Profile function installed in new threads by threading.setprofile().
+	It replaces itself with a profiler for the thread.
+	"""
+	_enable_profile()
+
+
+def start_profiler(path):
+	"""Profile the rest of the session, and save the combined statistics of
+	all threads to the given path in pstats format when it ends.
+
+	Threads started with the threading module are profiled automatically.
+	Other threads, e.g. QThreads, should use thread_profile().
+	"""
+	global _profile_path
+	if _profile_path is not None:
+		return
+
+	_profile_path = path
+	threading.setprofile(_profile_new_thread)
+	_enable_profile()
+	atexit.register(stop_profiler)
+
+
+def stop_profiler():
+	"""Stop profiling the session and save the statistics.
+
+	Return the path written, or None if the session wasn't being profiled.
+	"""
+	global _profile_path
+	if _profile_path is None:
+		return None
+
+	path = _profile_path
+	_profile_path = None
+	threading.setprofile(None)
+
+	with _profile_lock:
+		profiles = list(_profiles)
+		del _profiles[:]
+
+	stats = None
+	for profile in profiles:
+		profile.disable()
+		if stats is None:
+			stats = pstats.Stats(profile)
+		else:
+			stats.add(profile)
+	if stats is None:
+		return None
+	stats.dump_stats(path)
+
+	return path
+
+
+@contextlib.contextmanager
+def thread_profile():
+	"""Context manager profiling the current thread as part of the session,
+	if it's being profiled.
+	"""
+	if _profile_path is None:
+		yield
+		return
+
+	profile = _enable_profile()
+	try:
+		yield
+	finally:
+		if profile is not None:
+			profile.disable()
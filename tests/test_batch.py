@@ -0,0 +1,49 @@
+#!/usr/bin/python
+
+# test_batch.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Tests for the command line interface.
+
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import batch
+
+
+class ParseArgsTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dirpath = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.dirpath)
+
+	def assertRejected(self, *argv):
+		with contextlib.redirect_stderr(io.StringIO()):
+			with self.assertRaises(SystemExit) as cm:
+				batch.parse_args(['--batch', self.dirpath] + list(argv))
+		self.assertEqual(cm.exception.code, 2)
+
+	def test_step(self):
+		self.assertRejected('--step', '0', '--start', '10')
+		self.assertRejected('--step', '-1')
+		self.assertEqual(batch.parse_args(['--batch', self.dirpath, '--step', '2']).step, 2)
+
+	def test_start(self):
+		self.assertRejected('--start', '-1')
+		self.assertEqual(batch.parse_args(['--batch', self.dirpath, '--start', '0']).start, 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+
+# test_dircache.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Tests for the directory snapshot cache.
+
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import dircache
+import dirsnapshot
+
+
+class DirectoryCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dirpath = tempfile.mkdtemp()
+		self.cache = dircache.DirectoryCache()
+
+	def tearDown(self):
+		shutil.rmtree(self.dirpath)
+
+	def touch(self, name):
+		open(os.path.join(self.dirpath, name), 'w').close()
+
+	def test_racy_snapshot_is_read_again(self):
+		"""A change within the modification time resolution of the
+		snapshot is still detected.
+		"""
+		self.touch('a.0001.exr')
+		snapshot = self.cache.get(self.dirpath)
+		self.assertTrue(snapshot.is_racy())
+
+		# Keep the modification time the same, as a coarse timestamp would
+		st = os.stat(self.dirpath)
+		self.touch('a.0002.exr')
+		os.utime(self.dirpath, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+		self.assertIn('a.0002.exr', self.cache.get(self.dirpath).files)
+		self.assertEqual(self.cache.hits, 0)
+
+	def test_settled_snapshot_is_reused(self):
+		self.touch('a.0001.exr')
+		past = time.time() - 2*dirsnapshot.mtime_resolution
+		os.utime(self.dirpath, (past, past))
+
+		snapshot = self.cache.get(self.dirpath)
+		self.assertFalse(snapshot.is_racy())
+		self.assertIs(self.cache.get(self.dirpath), snapshot)
+		self.assertEqual(self.cache.hits, 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,33 @@
+#!/usr/bin/python
+
+# test_frameset.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Tests for frame sets.
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import frameset
+
+
+class RenumberTest(unittest.TestCase):
+
+	def test_renumber(self):
+		frames, padding = frameset.parse('1-3, 7')
+		self.assertEqual(frames.renumber(10, 2).format(4), '0010-0016x2')
+
+	def test_invalid_step(self):
+		frames, padding = frameset.parse('1-3')
+		for step in (0, -1):
+			self.assertRaises(ValueError, frames.renumber, 10, step)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+# test_ingest.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Tests for sequence detection in the ingest module.
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import dircache
+import ingest
+
+
+class DetectSequencesTest(unittest.TestCase):
+
+	def test_mixed_padding(self):
+		"""Differently padded frame numbers form separate sequences."""
+
+		names = ['a.001.exr', 'a.002.exr', 'a.0003.exr', 'a.0004.exr']
+		self.assertEqual(ingest.detect_sequences('/d', names), [
+			('/d', 'a.', '001, 002', '.exr', 2),
+			('/d', 'a.', '0003, 0004', '.exr', 2),
+		])
+
+	def test_unpadded_numbers_join_padded_sequence(self):
+		"""Numbers too long to need padding stay with the padded sequence."""
+
+		names = ['a.0998.exr', 'a.0999.exr', 'a.1000.exr', 'a.1001.exr']
+		self.assertEqual(ingest.detect_sequences('/d', names), [
+			('/d', 'a.', '0998-1001', '.exr', 4),
+		])
+
+	def test_unpadded_sequence(self):
+		names = ['a.8.exr', 'a.9.exr', 'a.10.exr']
+		self.assertEqual(ingest.detect_sequences('/d', names), [
+			('/d', 'a.', '8-10', '.exr', 3),
+		])
+
+
+class SequenceSemanticsTest(unittest.TestCase):
+	"""Detection matches the sequence.py library used previously, i.e.
+	sequence.getSequence(dirpath, base, delimiter="", ignorePadding=False).
+	"""
+
+	def detect(self, names):
+		return [seq[1:] for seq in ingest.detect_sequences('/d', names)]
+
+	def test_frame_ranges(self):
+		names = ['a.0001.exr', 'a.0002.exr', 'a.0003.exr', 'a.0005.exr', 'a.0007.exr', 'a.0008.exr']
+		self.assertEqual(self.detect(names), [('a.', '0001-0003, 0005, 0007, 0008', '.exr', 6)])
+
+	def test_no_delimiter(self):
+		"""The frame number is the last run of digits before the extension,
+		whatever precedes it.
+		"""
+		names = ['c7.tif', 'c8.tif', 'shot010_v002_0010.dpx', 'shot010_v002_0011.dpx']
+		self.assertEqual(self.detect(names), [
+			('c', '7, 8', '.tif', 2),
+			('shot010_v002_', '0010, 0011', '.dpx', 2),
+		])
+
+	def test_extensions_are_separate(self):
+		names = ['a.0001.exr', 'a.0001.jpg', 'a.0002.jpg']
+		self.assertEqual(self.detect(names), [
+			('a.', '0001', '.exr', 1),
+			('a.', '0001, 0002', '.jpg', 2),
+		])
+
+	def test_padding_is_not_ignored(self):
+		names = ['a.1.exr', 'a.2.exr', 'a.01.exr', 'a.02.exr']
+		self.assertEqual(self.detect(names), [
+			('a.', '1, 2', '.exr', 2),
+			('a.', '01, 02', '.exr', 2),
+		])
+
+	def test_files_without_frame_numbers(self):
+		names = ['readme.txt', 'clip.mp4', 'a.0001.exr', 'a.exr']
+		self.assertEqual(self.detect(names), [
+			('a', '', '.exr', 1),
+			('a.', '0001', '.exr', 1),
+			('clip', '', '.mp4', 1),
+			('readme', '', '.txt', 1),
+		])
+
+
+class RescanTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dirpath = tempfile.mkdtemp()
+		for name in ['a.001.exr', 'a.002.exr', 'a.0003.exr', 'a.0004.exr']:
+			open(os.path.join(self.dirpath, name), 'w').close()
+		dircache.invalidate()
+
+	def tearDown(self):
+		shutil.rmtree(self.dirpath)
+
+	def test_detect_file_mixed_padding(self):
+		seq = ingest.detect_file(os.path.join(self.dirpath, 'a.0003.exr'))
+		self.assertEqual(seq, (self.dirpath, 'a.', '0003, 0004', '.exr', 2))
+
+	def test_rescan_removed_sequence(self):
+		"""A sequence whose files have all gone is reported as None, while
+		the differently padded one is unaffected.
+		"""
+		known = set([('a.', '.exr', 3), ('a.', '.exr', 4)])
+		os.remove(os.path.join(self.dirpath, 'a.001.exr'))
+		os.remove(os.path.join(self.dirpath, 'a.002.exr'))
+		dircache.invalidate()
+		sequences = ingest.rescan(self.dirpath, ['a.001.exr', 'a.002.exr'], known)
+		self.assertEqual(sequences, {
+			('a.', '.exr', 3): None,
+			('a.', '.exr', 4): (self.dirpath, 'a.', '0003, 0004', '.exr', 2),
+		})
+
+
+if __name__ == '__main__':
+	unittest.main()
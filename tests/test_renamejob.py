@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+# test_renamejob.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Tests for the rename job engine.
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import batch
+import renamejob
+
+
+class TaskLogCountTest(unittest.TestCase):
+	"""The log of a task counts files, not messages."""
+
+	def setUp(self):
+		self.dirpath = tempfile.mkdtemp()
+		for name in ['a.0001.exr', 'a.0002.exr', 'a.0003.exr', 'a.0004.exr', 'b.0003.exr']:
+			open(os.path.join(self.dirpath, name), 'w').close()
+
+		args = batch.parse_args(['--batch', self.dirpath, '--include', 'a.*', 
+			'--find', 'a', '--replace', 'b', '--literal'])
+		self.tasks = batch.load_tasks(args.batch, include=args.include)
+		batch.plan_tasks(self.tasks, batch.get_rename_options(args))
+
+		# The source of the conflicting frame goes missing too, so it fails
+		# with two messages
+		os.remove(os.path.join(self.dirpath, 'a.0003.exr'))
+
+	def tearDown(self):
+		shutil.rmtree(self.dirpath)
+
+	def run_job(self, **kwargs):
+		results = []
+		job = renamejob.RenameJob(list(self.tasks), **kwargs)
+		job.on_task_completed = results.append
+		job.run()
+		return results[0]
+
+	def test_dry_run(self):
+		for workers in (1, 4):
+			task_id, status, log, filepath, remaining = self.run_job(dry_run=True, workers=workers)
+			self.assertEqual(status, '1 error')
+			self.assertEqual(log.successes, 3)
+			self.assertEqual(log.failures, 1)
+			self.assertEqual(len(log.errors), 2)
+			self.assertEqual(log.summary(), "3 succeeded, 1 error")
+
+	def test_rename(self):
+		task_id, status, log, filepath, remaining = self.run_job(dry_run=False, workers=4)
+		self.assertEqual(status, '1 error')
+		self.assertEqual(log.successes, 3)
+		self.assertEqual(log.failures, 1)
+
+
+
+class _CancellingJob(renamejob.RenameJob):
+	"""Rename job which cancels itself after processing a number of files."""
+
+	cancel_after = 3
+
+	def _process_file(self, src, dst, snapshots=None, vacated=None):
+		self.cancel_after -= 1
+		if self.cancel_after == 0:
+			self.control.cancel()
+		return super(_CancellingJob, self)._process_file(src, dst, snapshots, vacated)
+
+
+class PlannedRenameCancelTest(unittest.TestCase):
+	"""A renumber whose frames overlap runs to completion once started."""
+
+	def setUp(self):
+		self.dirpath = tempfile.mkdtemp()
+		for frame in range(1, 11):
+			open(os.path.join(self.dirpath, 'a.%04d.exr' % frame), 'w').close()
+
+		args = batch.parse_args(['--batch', self.dirpath, '--start', '5'])
+		self.tasks = batch.load_tasks(args.batch)
+		batch.plan_tasks(self.tasks, batch.get_rename_options(args))
+
+	def tearDown(self):
+		shutil.rmtree(self.dirpath)
+
+	def test_cancel(self):
+		results = []
+		job = _CancellingJob(list(self.tasks), dry_run=False)
+		job.on_task_completed = results.append
+		job.run()
+
+		task_id, status, log, filepath, remaining = results[0]
+		self.assertEqual(status, 'Complete')
+		self.assertEqual(log.successes, 10)
+		self.assertEqual(sorted(os.listdir(self.dirpath)), 
+			['a.%04d.exr' % frame for frame in range(5, 15)])
+
+	def test_cancel_dry_run(self):
+		results = []
+		job = _CancellingJob(list(self.tasks), dry_run=True)
+		job.on_task_completed = results.append
+		job.run()
+
+		self.assertEqual(results[0][1], 'Cancelled')
+
+
+if __name__ == '__main__':
+	unittest.main()
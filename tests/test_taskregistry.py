@@ -0,0 +1,45 @@
+#!/usr/bin/python
+
+# test_taskregistry.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2016-2022
+#
+# Tests for the task registry.
+
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import taskregistry
+
+
+class UpdateTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tasks = taskregistry.TaskRegistry()
+		self.a = self.tasks.add('/src', 'a.', '0001-0010', '.exr', 10)
+		self.b = self.tasks.add('/dst', 'b.', '0001-0005', '.exr', 5)
+
+	def test_reindex(self):
+		self.tasks.update(self.a, path='/other')
+		self.assertEqual(self.tasks.find('/other', 'a.', '.exr', 4), self.a)
+		self.assertIsNone(self.tasks.find('/src', 'a.', '.exr', 4))
+
+	def test_collision(self):
+		with self.assertRaises(taskregistry.DuplicateTask) as cm:
+			self.tasks.update(self.a, path='/dst', prefix='b.', status='Complete')
+		self.assertEqual(cm.exception.task_id, self.b)
+
+		# Both tasks are unchanged and can still be found
+		self.assertEqual(self.tasks[self.a]['path'], '/src')
+		self.assertEqual(self.tasks[self.a]['status'], '')
+		self.assertEqual(self.tasks.find('/src', 'a.', '.exr', 4), self.a)
+		self.assertEqual(self.tasks.find('/dst', 'b.', '.exr', 4), self.b)
+
+
+if __name__ == '__main__':
+	unittest.main()